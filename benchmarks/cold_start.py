@@ -0,0 +1,120 @@
+"""
+Break a deploy script's cold start into import time, CPU-side weight loading
+and device placement, using a stub pipeline instead of a GPU.
+
+Import time is measured for each module in a fresh interpreter, since that is
+what a new container pays. The stub pipeline is staged with the deploy scripts'
+own `stage_pipeline` helper, then loaded either by reading every file into
+memory or by memory-mapping it (what safetensors does). `to()` copies every
+buffer, standing in for the host-to-device transfer.
+
+With memory snapshots the imports and the CPU load are restored from the
+snapshot, so a restored container only pays for placement. Files are read from
+the page cache after the first run; drop it between runs for disk-bound numbers.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/cold_start.py --modules torch,diffusers --weights-mb 1024 --components 4
+"""
+import argparse
+import mmap
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from tensorquick.scripts.deploy.weights import LoadTimer, is_staged, stage_pipeline
+
+class StubPipeline:
+    """Mimics the parts of a diffusers pipeline the deploy scripts use at start-up"""
+
+    def __init__(self, components: dict):
+        self.components = components
+
+    @classmethod
+    def random(cls, num_components: int, total_mb: int) -> "StubPipeline":
+        size = total_mb * 1024 * 1024 // num_components
+        return cls({f"component_{i}": os.urandom(size) for i in range(num_components)})
+
+    def save_pretrained(self, path, safe_serialization: bool = True) -> None:
+        for name, weights in self.components.items():
+            (Path(path) / name).mkdir(parents=True, exist_ok=True)
+            (Path(path) / name / "model.safetensors").write_bytes(weights)
+
+    @classmethod
+    def from_pretrained(cls, path, use_mmap: bool = True) -> "StubPipeline":
+        components = dict()
+        for file in sorted(Path(path).glob("*/model.safetensors")):
+            with open(file, "rb") as f:
+                if use_mmap:
+                    components[file.parent.name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    components[file.parent.name] = f.read()
+        return cls(components)
+
+    def to(self, device: str) -> "StubPipeline":
+        # Copying touches every page, like a host-to-device transfer
+        self.components = {name: bytearray(weights) for name, weights in self.components.items()}
+        return self
+
+def import_seconds(module: str, repeat: int) -> float:
+    """Median time to import `module` in a fresh interpreter"""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise ImportError(result.stderr.strip().splitlines()[-1])
+        timings.append(float(result.stdout))
+    return statistics.median(timings)
+
+def measure_load(path: Path, use_mmap: bool, repeat: int) -> LoadTimer:
+    """Median CPU load and placement times over `repeat` starts"""
+    loads, placements = [], []
+    for _ in range(repeat):
+        timer = LoadTimer()
+        with timer.phase("load"):
+            pipe = StubPipeline.from_pretrained(path, use_mmap=use_mmap)
+        with timer.phase("to_gpu"):
+            pipe.to("cuda")
+        loads.append(timer.phases["load"])
+        placements.append(timer.phases["to_gpu"])
+
+    timer = LoadTimer()
+    timer.phases = {"load": statistics.median(loads), "to_gpu": statistics.median(placements)}
+    return timer
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", default="torch,diffusers", help="Comma-separated modules to time")
+    parser.add_argument("--weights-mb", type=int, default=512)
+    parser.add_argument("--components", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    total_import = 0.0
+    for module in filter(None, args.modules.split(",")):
+        try:
+            seconds = import_seconds(module, args.repeat)
+        except ImportError as e:
+            print(f"import {module:<20} skipped ({e})")
+            continue
+        total_import += seconds
+        print(f"import {module:<20} {seconds:6.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "stub"
+        stage_pipeline(StubPipeline.random(args.components, args.weights_mb), path, "stub")
+        assert is_staged(path)
+
+        for name, use_mmap in (("read", False), ("mmap", True)):
+            timer = measure_load(path, use_mmap, args.repeat)
+            print(
+                f"{name:<5} load={timer.phases['load']:6.2f}s to_gpu={timer.phases['to_gpu']:6.2f}s "
+                f"cold start={total_import + timer.total:6.2f}s "
+                f"snapshot restore={timer.phases['to_gpu']:6.2f}s (+ restore I/O)"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Replay a synthetic `modal deploy` log through the deploy progress parser.
+
+The log mimics a first deploy: mounts uploaded in chunks, an image build with
+apt and pip layers, the image save, then function creation. It is replayed on
+a simulated clock, first without history, then again with the stage durations
+the first run recorded, so the ETA can be compared against the real remaining
+time.
+
+It prints the progress at a few points of each replay, whether progress ever
+went backwards and the mean absolute ETA error.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/deploy_progress.py --build-seconds 240 --pip-packages 120
+"""
+import argparse
+import random
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from tensorquick.backend.deploy_progress import DeployHistory, DeployProgress
+
+def synthetic_log(build_seconds: float, pip_packages: int, jitter: float, seed: int) -> List[Tuple[float, str]]:
+    """(seconds since start, line) pairs of one deploy"""
+    rng = random.Random(seed)
+    scale = lambda seconds: seconds * rng.uniform(1 - jitter, 1 + jitter)
+    t, log = 0.0, []
+
+    def emit(seconds: float, line: str) -> None:
+        nonlocal t
+        t += scale(seconds)
+        log.append((t, line))
+
+    emit(1.0, "✓ Initialized. View run at https://modal.com/apps/ws/main/ap-fake")
+    emit(1.0, "├── 🔨 Created mount /root/tensorquick/scripts/deploy/fake.py")
+    for done in range(0, 41, 4):
+        emit(0.5, f"Uploading model files {done}.0 MiB / 40.0 MiB")
+    emit(0.5, "Building image im-fake")
+    emit(1.0, "=> Step 0: FROM base")
+    emit(1.0, "=> Step 1: RUN apt-get update && apt-get install -y git ffmpeg")
+    for i in range(30):
+        emit(build_seconds * 0.1 / 30, f"Get:{i + 1} http://archive.ubuntu.com/ubuntu jammy/main amd64 pkg{i}")
+    emit(1.0, "=> Step 2: RUN python -m pip install torch diffusers transformers")
+    for i in range(pip_packages):
+        emit(build_seconds * 0.8 / pip_packages, f"Collecting package{i}==1.0")
+    emit(build_seconds * 0.1, "Installing collected packages: " + ", ".join(f"package{i}" for i in range(5)))
+    emit(1.0, "Successfully installed package0 package1")
+    emit(1.0, "Saving image...")
+    emit(20.0, "Image saved, took 20.1s")
+    emit(1.0, "Built image im-fake in 290.2s")
+    emit(5.0, "├── 🔨 Created function Model.*.")
+    emit(1.0, "├── 🔨 Created web function Model.web_inference => https://ws--fake-model-web-inference.modal.run")
+    emit(1.0, "✓ App deployed in 300.0s! 🎉")
+    return log
+
+def replay(log: List[Tuple[float, str]], expected: Optional[dict]) -> Tuple[DeployProgress, List[float], bool]:
+    now = 0.0
+    tracker = DeployProgress(expected=expected, clock=lambda: now)
+    errors, last, monotonic = [], 0.0, True
+    checkpoints = {0.1, 0.25, 0.5, 0.75, 0.9}
+    end = log[-1][0]
+    for now, line in log:
+        tracker.feed(line)
+        monotonic &= tracker.progress >= last
+        last = tracker.progress
+        eta = tracker.eta()
+        if eta is not None:
+            errors.append(abs(eta - (end - now)))
+        for point in sorted(checkpoints):
+            if now >= point * end:
+                checkpoints.discard(point)
+                print(f"    at {point:4.0%} of the time: {tracker.stage:<12} progress {tracker.progress:5.1%} "
+                      f"eta {'-' if eta is None else f'{eta:6.1f}s'} (actual {end - now:6.1f}s)")
+    return tracker, errors, monotonic
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--build-seconds", type=float, default=240)
+    parser.add_argument("--pip-packages", type=int, default=120)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Random variation of every step between runs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = DeployHistory(str(Path(tmp) / "history.json"))
+        for run, seed in (("first deploy", 1), ("with history", 2)):
+            log = synthetic_log(args.build_seconds, args.pip_packages, args.jitter, seed)
+            print(f"{run}:")
+            tracker, errors, monotonic = replay(log, history.expected("fake") or None)
+            history.record("fake", tracker.finish())
+            mean_error = sum(errors) / len(errors) if errors else float("nan")
+            print(f"    monotonic={monotonic} mean ETA error={mean_error:.1f}s over {len(errors)} updates")
+        print(f"recorded stage durations: {history.expected('fake')}")
+
+if __name__ == "__main__":
+    main()
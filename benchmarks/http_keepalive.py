@@ -0,0 +1,113 @@
+"""
+Compare per-request latency of one-off `requests.post` calls against the
+pooled keep-alive async `HttpTransport` used by the inference pipeline.
+
+A local HTTP/1.1 server stands in for the deployed Modal endpoint and
+answers every POST with a fixed JPEG-sized payload. By default connections
+are served straight away, so the result is what keep-alive measurably saves
+on loopback, which is close to nothing.
+
+`--handshake-ms` adds a simulated setup delay to every new connection,
+standing in for the DNS, TCP and TLS cost of a real HTTPS endpoint. The
+saving reported then mostly reflects that injected delay, not a measurement.
+
+Usage (from the repository root):
+    # Measured, bare loopback
+    PYTHONPATH=. python benchmarks/http_keepalive.py --requests 200 --payload-kb 256
+
+    # Simulated 20 ms connection handshake
+    PYTHONPATH=. python benchmarks/http_keepalive.py --requests 200 --payload-kb 256 --handshake-ms 20
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from tensorquick.backend.transport import HttpTransport
+
+def make_handler(payload: bytes, handshake_delay: float):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Like the real endpoint, send responses without waiting on delayed ACKs
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            # Simulate connection setup cost (DNS/TCP/TLS) once per connection
+            if handshake_delay:
+                time.sleep(handshake_delay)
+            super().setup()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+def measure(send, url: str, n: int) -> list:
+    timings = []
+    for i in range(n):
+        start = time.perf_counter()
+        response = send(url, json={"prompt": f"benchmark {i}"})
+        response.content
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+async def measure_async(transport: HttpTransport, url: str, n: int) -> list:
+    timings = []
+    for i in range(n):
+        start = time.perf_counter()
+        response = await transport.post(url, json={"prompt": f"benchmark {i}"})
+        response.content
+        timings.append((time.perf_counter() - start) * 1000)
+    await transport.close()
+    return timings
+
+def report(name: str, timings: list) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{name:<12} mean={statistics.mean(timings):7.2f}ms "
+        f"median={statistics.median(timings):7.2f}ms p95={p95:7.2f}ms"
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--payload-kb", type=int, default=256)
+    parser.add_argument(
+        "--handshake-ms", type=float, default=0.0,
+        help="Simulated per-connection setup delay standing in for DNS/TCP/TLS (default: none)",
+    )
+    args = parser.parse_args()
+
+    payload = b"\xff" * (args.payload_kb * 1024)
+    handler = make_handler(payload, args.handshake_ms / 1000)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/web-inference"
+
+    try:
+        baseline = measure(requests.post, url, args.requests)
+        pooled = asyncio.run(measure_async(HttpTransport(), url, args.requests))
+    finally:
+        server.shutdown()
+
+    report("requests.post", baseline)
+    report("pooled", pooled)
+    saved = statistics.mean(baseline) - statistics.mean(pooled)
+    print(f"saved per request: {saved:.2f}ms")
+
+if __name__ == "__main__":
+    main()
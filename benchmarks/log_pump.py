@@ -0,0 +1,130 @@
+"""
+Stress the deploy log pump with a fake `modal` that floods stdout and stderr.
+
+The fake CLI interleaves deployment stage markers and endpoint URLs on stdout
+with a flood of build logs on stderr, spinner redraws separated by `\\r` and
+one very long line, the way `modal deploy` does while it builds an image.
+
+Two readers are compared. The old one read stdout line by line and only
+drained stderr once the process exited. Once the stderr pipe buffer fills up,
+the child blocks and that reader never finishes, so it is run with a timeout.
+`LogPump` drains both pipes as data arrives. It should finish, see every line
+and report each stage and URL while the process is still running.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/log_pump.py --stderr-mb 32 --stdout-lines 20000
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from tensorquick.backend.deploy_progress import DeployProgress
+from tensorquick.backend.logpump import LogPump
+
+# Lines `modal deploy` prints as it moves from one stage to the next
+MARKERS = [
+    "✓ Initialized. View run at https://modal.com/apps/ws/main/ap-fake",
+    "├── 🔨 Created mount /root/tensorquick/scripts/deploy/fake.py",
+    "Building image im-fake",
+    "=> Step 0: FROM base",
+    "Saving image...",
+    "Built image im-fake in 93.12s",
+]
+
+FAKE_MODAL = r"""
+import sys
+stderr_mb, stdout_lines = float(sys.argv[1]), int(sys.argv[2])
+stages = {markers!r}
+out, err = sys.stdout, sys.stderr
+block = ("building layer " + "x" * 100 + "\n") * 512
+blocks = max(1, int(stderr_mb * 1024 * 1024 / len(block)))
+step = max(1, stdout_lines // len(stages))
+for i in range(stdout_lines):
+    if i % step == 0 and i // step < len(stages):
+        out.write(stages[i // step] + "\n")
+        out.flush()
+    out.write(f"\r⠋ step {{i}}")
+    if i % max(1, stdout_lines // blocks) == 0:
+        err.write(block)
+out.write("\n" + "y" * 1_000_000 + "\n")
+out.write("└── 🔨 Created web function Model.web_inference => https://ws--fake-model-web-inference.modal.run\n")
+out.write("└── 🔨 Created web function Model.health => https://ws--fake-model-health.modal.run\n")
+out.write("✓ App deployed in 120.3s! 🎉\n")
+"""
+
+async def spawn(args) -> asyncio.subprocess.Process:
+    script = FAKE_MODAL.format(markers=MARKERS)
+    return await asyncio.create_subprocess_exec(
+        sys.executable, "-c", script, str(args.stderr_mb), str(args.stdout_lines),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+async def old_reader(args) -> str:
+    """The previous `_execute_deployment` loop: stdout lines first, stderr after exit"""
+    process = await spawn(args)
+    start = time.perf_counter()
+    lines = 0
+    try:
+        async def read():
+            nonlocal lines
+            while True:
+                raw_line = await process.stdout.readline()
+                if not raw_line:
+                    break
+                lines += 1
+            await process.wait()
+            await process.stderr.read()
+
+        await asyncio.wait_for(read(), timeout=args.timeout)
+        return f"finished in {time.perf_counter() - start:.2f}s, {lines} stdout lines"
+    except asyncio.TimeoutError:
+        return f"stalled after {args.timeout:g}s with {lines} stdout lines read (stderr pipe full)"
+    except ValueError as e:
+        return f"failed after {lines} stdout lines: {e}"
+    finally:
+        # asyncio only reaps the process once both pipes are closed, so drain them after the kill
+        if process.returncode is None:
+            process.kill()
+        await asyncio.gather(process.stdout.read(), process.stderr.read())
+        await process.wait()
+
+async def pumped(args) -> str:
+    process = await spawn(args)
+    start = time.perf_counter()
+    events = []
+    tracker = DeployProgress()
+
+    def on_line(stream: str, line: str) -> None:
+        stage = tracker.stage
+        if tracker.feed(line) and tracker.stage != stage:
+            events.append((time.perf_counter() - start, f"{tracker.stage} at {tracker.progress:.0%}"))
+        if "=> https://" in line:
+            events.append((time.perf_counter() - start, line.rsplit(" ", 1)[-1]))
+
+    pump = LogPump(process, on_line=on_line)
+    returncode = await asyncio.wait_for(pump.run(), timeout=args.timeout)
+    elapsed = time.perf_counter() - start
+    for seconds, event in events:
+        print(f"    {seconds:6.2f}s {event}")
+    buffered = {stream: len(pump.tail(stream)) for stream in LogPump.STREAMS}
+    longest = max(len(line) for stream in LogPump.STREAMS for line in pump.tail(stream))
+    return (
+        f"exit {returncode} in {elapsed:.2f}s, lines {pump.line_counts}, "
+        f"buffered {buffered}, longest kept line {longest} chars"
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stderr-mb", type=float, default=16)
+    parser.add_argument("--stdout-lines", type=int, default=20000)
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"old reader: {asyncio.run(old_reader(args))}")
+    print("log pump events:")
+    print(f"log pump: {asyncio.run(pumped(args))}")
+
+if __name__ == "__main__":
+    main()
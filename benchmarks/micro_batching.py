@@ -0,0 +1,71 @@
+"""
+Measure the throughput gained by the deploy scripts' `MicroBatcher` with a
+CPU stub standing in for the diffusion pipeline.
+
+The stub sleeps for a fixed per-call overhead plus a per-image cost, which is
+roughly how a batched GPU forward pass behaves. Concurrent callers are fired
+at the batcher and compared against a batch limit of 1 (no batching). It also
+checks that every caller gets back exactly its own outputs.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/micro_batching.py --callers 32 --overhead-ms 200 --per-image-ms 40
+"""
+import argparse
+import asyncio
+import time
+
+from tensorquick.scripts.deploy.batching import MicroBatcher
+
+def make_stub_pipeline(overhead: float, per_image: float):
+    calls = []
+
+    def run_batch(batch):
+        # Mirrors Model._run_batch: items are (prompts, num_images_per_prompt, params, seeds)
+        num_images_per_prompt = batch[0][1]
+        prompts = [prompt for request_prompts, _, _, _ in batch for prompt in request_prompts]
+        time.sleep(overhead + per_image * len(prompts) * num_images_per_prompt)
+        calls.append(len(prompts))
+        return [
+            [f"{prompt}#{i}" for prompt in request_prompts for i in range(n)]
+            for request_prompts, n, _, _ in batch
+        ]
+
+    return run_batch, calls
+
+async def run(callers: int, max_batch_size: int, wait_ms: float, overhead: float, per_image: float):
+    run_batch, calls = make_stub_pipeline(overhead, per_image)
+    batcher = MicroBatcher(run_batch, max_batch_size=max_batch_size, max_wait_ms=wait_ms)
+
+    async def caller(i: int):
+        start = time.perf_counter()
+        result = await batcher.submit(([f"prompt {i}"], 1, None, [i]), size=1, key=1)
+        assert result == [f"prompt {i}#0"], result
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(caller(i) for i in range(callers)))
+    elapsed = time.perf_counter() - start
+    return elapsed, sorted(latencies), calls
+
+def report(name: str, elapsed: float, latencies: list, calls: list) -> None:
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<10} wall={elapsed:6.2f}s images/s={len(latencies) / elapsed:6.2f} "
+        f"p95 latency={p95:6.2f}s forward passes={len(calls)}"
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--wait-ms", type=float, default=15)
+    parser.add_argument("--overhead-ms", type=float, default=200)
+    parser.add_argument("--per-image-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    overhead, per_image = args.overhead_ms / 1000, args.per_image_ms / 1000
+    report("unbatched", *asyncio.run(run(args.callers, 1, args.wait_ms, overhead, per_image)))
+    report("batched", *asyncio.run(run(args.callers, args.max_batch_size, args.wait_ms, overhead, per_image)))
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,42 @@
 import os
 import re
-import subprocess
-from typing import Optional
+import json
+import asyncio
+import concurrent.futures
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
 from pathlib import Path
 
+import httpx
 from loguru import logger
 from PySide6.QtCore import (
     QObject,
     Slot,
     Signal,
     Property,
-    QThread,
 )
+from tensorquick.backend.deploy_progress import DeployHistory, DeployProgress
+from tensorquick.backend.engine import get_engine
+from tensorquick.backend.logpump import LogPump
+from tensorquick.backend.manifest import DeployManifest
 from tensorquick.backend.types import WorkerStatus
+from tensorquick.backend.workspace import DeployWorkspace
+from tensorquick.config import default_settings
 
 class ModelBuilder(QObject):
-    """Handler for model deployment operations"""
+    """
+    Handler for model deployment operations
+
+    Deployments are queued and up to `deploy.max_concurrent` of them run at once, each
+    in its own `modal deploy` process. Every model reports its own state and progress.
+    """
     deployingChanged = Signal(bool)
     deployedChanged = Signal(bool)
     deployedModelsChanged = Signal(list)
-    progressChanged = Signal(int)
+    progressChanged = Signal(int)  # average over the active deployments
+    deploymentStateChanged = Signal(str, str)  # code_name, queued/deploying/deployed/failed/cancelled
+    deploymentProgressChanged = Signal(str, int)  # code_name, 0-100
+    deploymentQueueChanged = Signal(list)
 
     stoppingChanged = Signal(bool)
     stoppedChanged = Signal(bool)
@@ -29,10 +46,15 @@ class ModelBuilder(QObject):
     def __init__(self) -> None:
         super().__init__()
         self._deploying: bool = False
-        self._worker: Optional[ModelDeployWorker] = None
-        self._stop_worker: Optional[ModelStopWorker] = None
+        self._workers: Dict[str, ModelDeployWorker] = dict()  # running deployments by code name
+        self._queue: Deque[Tuple[dict, dict, bool]] = deque()  # (model, envs, force) waiting for a slot
+        self._deployments: Dict[str, dict] = dict()  # state and progress of active deployments
+        self._stop_workers: List[ModelStopWorker] = []
         self._deployed_models = []
 
+        deploy_settings = default_settings.get("deploy") or dict()
+        self._max_concurrent = max(1, int(deploy_settings.get("max_concurrent", 3)))
+
     @Property(list, notify=deployedModelsChanged)
     def deployedModels(self):
         return self._deployed_models
@@ -51,6 +73,13 @@ class ModelBuilder(QObject):
         self._deploying = value
         self.deployingChanged.emit(value)
 
+    @Property(list, notify=deploymentQueueChanged)
+    def deploymentQueue(self) -> List[dict]:
+        """Running deployments followed by queued ones, each with code_name, name, state, stage, progress and eta"""
+        running = [entry for entry in self._deployments.values() if entry["state"] == "deploying"]
+        queued = [self._deployments[model["code_name"]] for model, _, _ in self._queue]
+        return [dict(entry) for entry in running + queued]
+
     def _modelExists(self, model):
         for deployed_model in self._deployed_models:
             if model["code_name"] == deployed_model["code_name"]:
@@ -58,113 +87,288 @@ class ModelBuilder(QObject):
         return False
 
     def _replaceByCodeName(self, model):
-        for deployed_model in self._deployed_models:
+        for i, deployed_model in enumerate(self._deployed_models):
             if model["code_name"] == deployed_model["code_name"]:
-                deployed_model = model
+                self._deployed_models[i] = model
+
+    def _setState(self, code_name: str, state: str, progress: Optional[int] = None) -> None:
+        entry = self._deployments.get(code_name)
+        if entry is None:
+            return
+        entry["state"] = state
+        if progress is not None:
+            entry["progress"] = progress
+        self.deploymentStateChanged.emit(code_name, state)
+        if state not in ("queued", "deploying"):
+            # Finished deployments leave the queue
+            del self._deployments[code_name]
+        self.deploymentQueueChanged.emit(self.deploymentQueue)
+
+    def _updateDeploying(self) -> None:
+        deploying = bool(self._workers or self._queue)
+        if deploying != self._deploying:
+            self.deploying = deploying
 
     def _onDeploymentCompleted(self, success: bool, model: dict, error_message: str) -> None:
-        self.deploying = False
-        self.deployedChanged.emit(True)
+        worker = self.sender()
+        code_name = getattr(worker, "code_name", model.get("code_name", ""))
+        if self._workers.get(code_name) is not worker:
+            # Cancelled deployments were accounted for when they were stopped
+            return
+        del self._workers[code_name]
 
         if not success:
-            self.errorOccurred.emit(error_message)
+            cancelled = worker.status == WorkerStatus.CANCELLED
+            self._setState(code_name, "cancelled" if cancelled else "failed")
+            if not cancelled:
+                self.errorOccurred.emit(error_message)
             self.deployedModels = self._deployed_models
-            return
-
-        if not self._modelExists(model):
-            self._deployed_models.append(model)
         else:
-            self._replaceByCodeName(model)
-        self.deployedModels = self._deployed_models
+            self._setState(code_name, "deployed", 100)
+            if not self._modelExists(model):
+                self._deployed_models.append(model)
+            else:
+                self._replaceByCodeName(model)
+            self.deployedModels = self._deployed_models
 
-        # Cleanup worker
-        if self._worker:
-            self._worker.deleteLater()
-            self._worker = None
+        self.deployedChanged.emit(True)
+        self._dispatch()
 
     def _onProgressUpdate(self, progress: int) -> None:
-        self.progressChanged.emit(progress)
+        entry = self._activeEntry()
+        if entry is None or entry["progress"] == progress:
+            return
+        entry["progress"] = progress
+        self.deploymentProgressChanged.emit(entry["code_name"], progress)
+        self.deploymentQueueChanged.emit(self.deploymentQueue)
+
+        # Queued deployments have not started, so they would hold the average at 0
+        active = [entry["progress"] for entry in self._deployments.values() if entry["state"] == "deploying"]
+        self.progressChanged.emit(sum(active) // len(active))
+
+    def _activeEntry(self) -> Optional[dict]:
+        """Queue entry of the running deployment that sent the current signal"""
+        worker = self.sender()
+        code_name = getattr(worker, "code_name", "")
+        if self._workers.get(code_name) is not worker:
+            return None
+        return self._deployments.get(code_name)
+
+    def _onStageChanged(self, stage: str) -> None:
+        entry = self._activeEntry()
+        if entry is not None:
+            entry["stage"] = stage
+            self.deploymentQueueChanged.emit(self.deploymentQueue)
+
+    def _onEtaChanged(self, eta: float) -> None:
+        entry = self._activeEntry()
+        if entry is not None:
+            entry["eta"] = eta
+
+    def _dispatch(self) -> None:
+        """Start queued deployments until the concurrency cap is reached"""
+        while self._queue and len(self._workers) < self._max_concurrent:
+            model, envs, force = self._queue.popleft()
+            code_name = model["code_name"]
+            try:
+                worker = ModelDeployWorker(model, envs, force=force)
+                worker.finished.connect(self._onDeploymentCompleted)
+                worker.progress.connect(self._onProgressUpdate)
+                worker.stageChanged.connect(self._onStageChanged)
+                worker.etaChanged.connect(self._onEtaChanged)
+                self._workers[code_name] = worker
+                self._setState(code_name, "deploying", 0)
+                worker.start()
+            except Exception as e:
+                logger.error(f"Error starting deployment of {code_name}: {str(e)}", exc_info=True)
+                self._workers.pop(code_name, None)
+                self._setState(code_name, "failed")
+                self.errorOccurred.emit(str(e))
+
+        if self._workers or self._queue:
+            logger.info(f"{len(self._workers)} deployment(s) running, {len(self._queue)} queued")
+        self._updateDeploying()
 
     @Slot(dict)
-    def deploy(self, model: dict) -> None:
-        """Start model deployment process"""
+    @Slot(dict, bool)
+    def deploy(self, model: dict, force: bool = False) -> None:
+        """
+        Queue a model deployment; it starts as soon as fewer than `deploy.max_concurrent` run
+
+        Args:
+            model: Model card; an optional `compile` flag overrides `deploy.compile` and
+                deploys the model with `torch.compile` enabled
+            force: Run `modal deploy` even if nothing changed since the last successful deploy
+        """
         try:
-            if self._worker and self._worker._status == WorkerStatus.RUNNING:
-                logger.warning("Deployment already in progress")
+            code_name = model["code_name"]
+            if code_name in self._deployments:
+                logger.warning(f"Deployment of {code_name} is already {self._deployments[code_name]['state']}")
                 return
 
-            self._deploying = True
-            self.deployingChanged.emit(True)
-
             gpu_type = model.get("gpu_type", "A100-40GB")
             model["gpu_type"] = gpu_type
+            deploy_settings = default_settings.get("deploy") or dict()
+            compile_model = bool(model.get("compile", deploy_settings.get("compile", False)))
+            model["compile"] = compile_model
+            # Video models answer `web_inference` with a job id, see `VideoJobWorker`
+            catalog = {entry["code_name"]: entry for entry in default_settings.get("models") or []}
+            model["async_jobs"] = bool(catalog.get(code_name, dict()).get("async_jobs", False))
             envs = {
-                "BUNCHA_GPU_TYPE": gpu_type
+                "BUNCHA_GPU_TYPE": gpu_type,
+                "BUNCHA_COMPILE": "1" if compile_model else "0",
             }
-            self._worker = ModelDeployWorker(model, envs)
-            self._worker.finished.connect(self._onDeploymentCompleted)
-            self._worker.progress.connect(self._onProgressUpdate)
-            self._worker.start()
+
+            self._deployments[code_name] = {
+                "code_name": code_name,
+                "name": model.get("name", code_name),
+                "state": "queued",
+                "stage": "",
+                "progress": 0,
+                "eta": -1.0,  # seconds left, -1 while unknown
+            }
+            self._queue.append((model, envs, force))
+            self.deploymentStateChanged.emit(code_name, "queued")
+            self.deploymentQueueChanged.emit(self.deploymentQueue)
+            self._dispatch()
 
         except Exception as e:
             logger.error(f"Error starting deployment: {str(e)}", exc_info=True)
-            self._deploying = False
-            self.deployingChanged.emit(False)
+            self._updateDeploying()
             self.deployedChanged.emit(False)
             self.errorOccurred.emit(str(e))
 
     @Slot()
-    def stopCurrentDeployment(self) -> None:
-        if self._worker and self._deploying:
-            self._worker.stop()
-            self._deploying = False
-
-    def _onStopAppCompleted(self, success: bool, model: dict, error_message: str) -> None:
-        self.stoppingChanged.emit(False)
-        self.stoppedChanged.emit(True)
-        if not success:
+    @Slot(str)
+    def stopCurrentDeployment(self, code_name: str = "") -> None:
+        """Cancel one deployment by code name, or every running and queued one when no name is given"""
+        for queued in list(self._queue):
+            if not code_name or queued[0]["code_name"] == code_name:
+                self._queue.remove(queued)
+                self._setState(queued[0]["code_name"], "cancelled")
+
+        for running_name in list(self._workers):
+            if not code_name or running_name == code_name:
+                self._workers.pop(running_name).stop()
+                self._setState(running_name, "cancelled")
+
+        self._dispatch()
+
+    def _dropDeployedModels(self, models: List[dict]) -> None:
+        code_names = {model["code_name"] for model in models}
+        self.deployedModels = [
+            deployed_model for deployed_model in self._deployed_models
+            if deployed_model["code_name"] not in code_names
+        ]
+
+    def _finishStopWorker(self) -> None:
+        worker = self.sender()
+        if worker in self._stop_workers:
+            self._stop_workers.remove(worker)
+        if worker.stopping and not any(other.stopping for other in self._stop_workers):
+            self.stoppingChanged.emit(False)
+
+    def _onStopAppCompleted(self, stopped: List[dict], running: List[dict], error_message: str) -> None:
+        self._finishStopWorker()
+        if stopped:
+            self._dropDeployedModels(stopped)
+            self.stoppedChanged.emit(True)
+        if error_message:
             self.errorOccurred.emit(error_message)
             self.deployedModels = self._deployed_models
-            return
 
-        new_deployed_models = []
-        for deployed_model in self._deployed_models:
-            if deployed_model["code_name"] != model["code_name"]:
-                new_deployed_models.append(deployed_model)
-
-        self.deployedModels = new_deployed_models
-
-        # Cleanup worker
-        if self._worker:
-            self._worker.deleteLater()
-            self._worker = None
+    def _onReconciled(self, gone: List[dict], running: List[dict], error_message: str) -> None:
+        self._finishStopWorker()
+        if error_message:
+            # Listing apps fails when offline or logged out; keep the saved models then
+            logger.warning(error_message)
+            return
+        # A model that is being redeployed gets its new URL when the deployment finishes
+        gone = [model for model in gone if model["code_name"] not in self._deployments]
+        if gone:
+            logger.info(f"Dropping models whose app is no longer deployed: {', '.join(m['code_name'] for m in gone)}")
+            self._dropDeployedModels(gone)
+
+    def _startStopWorker(self, worker: "ModelStopWorker", on_finished) -> None:
+        worker.finished.connect(on_finished)
+        self._stop_workers.append(worker)
+        if worker.stopping:
+            self.stoppingChanged.emit(True)
+        worker.start()
 
     @Slot(dict)
     def stopApp(self, model: dict) -> None:
+        self.stopApps([model])
+
+    @Slot(list)
+    def stopApps(self, models: list) -> None:
+        """Stop the Modal apps of `models` in one batch, cancelling their deployments first"""
         try:
-            self._stop_worker = ModelStopWorker(model)
-            self._stop_worker.finished.connect(self._onStopAppCompleted)
-            self._stop_worker.start()
+            for model in models:
+                if model.get("code_name") in self._deployments:
+                    self.stopCurrentDeployment(model["code_name"])
+            self._startStopWorker(ModelStopWorker(models), self._onStopAppCompleted)
         except Exception as e:
-            logger.error(f"Error stopping model: {model}", exc_info=True)
+            logger.opt(exception=True).error(f"Error stopping models: {', '.join(str(m.get('code_name')) for m in models)}")
             self.errorOccurred.emit(str(e))
 
-class ModelDeployWorker(QThread):
-    """Worker thread for model deployment"""
+    @Slot()
+    def reconcileDeployments(self) -> None:
+        """Drop deployed models whose app was stopped outside of the app, e.g. from the Modal dashboard"""
+        if not self._deployed_models:
+            return
+        try:
+            self._startStopWorker(ModelStopWorker(list(self._deployed_models), stop=False), self._onReconciled)
+        except Exception as e:
+            logger.opt(exception=True).error(f"Error checking deployed apps: {str(e)}")
+
+class ModelDeployWorker(QObject):
+    """Deployment job run as a coroutine on the shared engine loop"""
     finished = Signal(bool, dict, str)  # success, error_message
     progress = Signal(int)
+    stageChanged = Signal(str)  # stage name, as soon as `modal deploy` reports it
+    etaChanged = Signal(float)  # seconds left, -1 while unknown
+    urlFound = Signal(str, str)  # endpoint, url
 
-    def __init__(self, model: dict, envs: dict = dict()) -> None:
+    scripts_dir = "scripts/deploy"
+    # Whether runs are recorded in the deploy manifest and history, and skipped when unchanged
+    tracks_deploys = True
+
+    def __init__(self, model: dict, envs: dict = dict(), force: bool = False) -> None:
         super().__init__()
         self._model = model or dict()
         self._envs = envs
+        self._force = force
         self._status = WorkerStatus.IDLE
-        self._process: Optional[subprocess.Popen] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._future: Optional[concurrent.futures.Future] = None
+        self._health_url: str = ""
+        self._urls: dict = dict()
+        deploy_settings = default_settings.get("deploy") or dict()
+        self._history = DeployHistory.from_settings(deploy_settings)
+        self._tracker = DeployProgress()
+        self._manifest = DeployManifest.from_settings(deploy_settings)
+        self._health_timeout = float(deploy_settings.get("health_timeout", 10))
 
         # Define paths
         self._base_path = Path(__file__).parents[1]
-        self._scripts_path = self._base_path / "scripts/deploy"
+        self._scripts_path = self._base_path / self.scripts_dir
         self._deploy_script = self._scripts_path / f"{self._model['code_name']}.py"
+        # Script handed to `modal deploy`, the rendered copy once the workspace is set up
+        self._script = self._deploy_script
+        self._workspace: Optional[DeployWorkspace] = None
+
+    @property
+    def code_name(self) -> str:
+        return self._model.get("code_name", "")
+
+    @property
+    def status(self) -> WorkerStatus:
+        return self._status
+
+    def start(self) -> None:
+        """Schedule the job on the engine loop"""
+        self._future = get_engine().submit(self.run())
 
     def _validate_deployment_script(self) -> None:
         """Validate deployment script existence and permissions"""
@@ -173,39 +377,25 @@ class ModelDeployWorker(QThread):
                 f"Deployment script not found: {self._deploy_script}"
             )
 
-    def _setup_environment(self) -> None:
-        """Setup environment variables for deployment"""
-        try:
-            # Read the content of the script
-            with open(self._deploy_script, 'r') as script_file:
-                script_lines = script_file.readlines()
-
-            # Regex to find keys in the format BUNCHA_*="*"
-            pattern = r'^\s*(BUNCHA_[^=]+)\s*=\s*"([^"]*)"\s*$'
-            updated_lines = []
-
-            # Iterate through each line to find and update values
-            for line in script_lines:
-                match = re.match(pattern, line.strip())
-                if match:
-                    key = match.group(1).strip()
-                    # If key exists in self._envs, update the value
-                    if key in self._envs:
-                        new_value = self._envs[key]
-                        line = f'{key} = "{new_value}"\n'
-                updated_lines.append(line)
-
-            # Write the updated content back to the file
-            with open(self._deploy_script, 'w') as script_file:
-                script_file.writelines(updated_lines)
+    def _setup_environment(self) -> dict:
+        """
+        Render the deploy script into its own workspace
 
+        Returns:
+            Environment of the `modal deploy` process, with the `BUNCHA_*` overrides
+        """
+        try:
+            self._workspace = DeployWorkspace(self._deploy_script)
+            self._script = self._workspace.render(self._envs)
+            logger.info(f"Rendered deployment script to {self._script}")
+            return self._workspace.environment(self._envs)
         except Exception as e:
             raise RuntimeError(f"Error setting up environment: {str(e)}")
 
-    def _extract_deployed_url(self, line: str) -> str:
+    def _extract_deployed_url(self, line: str, endpoint: str = "web-inference") -> str:
         deployed_url = ""
         line = line.strip()
-        if f"--{self._model['code_name']}-model-web-inference" in line:
+        if f"--{self._model['code_name']}-model-{endpoint}" in line:
             pattern = r'https?://[^\s]+'
             match = re.search(pattern, line)
 
@@ -215,77 +405,99 @@ class ModelDeployWorker(QThread):
 
         return deployed_url
 
-    def _execute_deployment(self, env: dict) -> str:
+    def _onOutputLine(self, stream: str, line: str) -> None:
+        """Parse one line of `modal deploy` output as soon as it is read"""
+        logger.info(f"Deployment {stream}: {line}")
+
+        for endpoint in ("web-inference", "health"):
+            url = self._extract_deployed_url(line, endpoint)
+            if url:
+                self._urls[endpoint] = url
+                self.urlFound.emit(endpoint, url)
+
+        stage = self._tracker.stage
+        if self._tracker.feed(line):
+            if self._tracker.stage != stage:
+                self.stageChanged.emit(self._tracker.stage)
+            self.progress.emit(int(self._tracker.progress * 100))
+            eta = self._tracker.eta()
+            self.etaChanged.emit(-1.0 if eta is None else eta)
+
+    async def _execute_deployment(self, env: dict) -> str:
         """Execute deployment script and handle output"""
         try:
             # Use modal deploy command
             deploy_command = [
-                "modal", "deploy", str(self._deploy_script)
+                "modal", "deploy", str(self._script)
             ]
 
             logger.info(f"Executing deployment command: {' '.join(deploy_command)}")
 
-            self._process = subprocess.Popen(
-                deploy_command,
+            self._process = await asyncio.create_subprocess_exec(
+                *deploy_command,
                 env=env,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
             )
 
-            if not self._process:
-                raise RuntimeError("Failed to start deployment process")
-
-            total_steps = 5
-            current_step = 0
-
-            deployed_url = ""
-            while True:
-                if self._process.poll() is not None:
-                    break
-
-                line = self._process.stdout.readline()
-                if line:
-                    logger.info(f"Deployment output: {line.strip()}")
-                    extracted_url = self._extract_deployed_url(line)
-                    if extracted_url:
-                        deployed_url = extracted_url
-
-                    # Update progress based on output
-                    if "Starting deployment" in line:
-                        current_step = 1
-                    elif "Uploading code" in line:
-                        current_step = 2
-                    elif "Building container" in line:
-                        current_step = 3
-                    elif "Deploying model" in line:
-                        current_step = 4
-                    elif "Deployment complete" in line:
-                        current_step = 5
-
-                    progress = int((current_step / total_steps) * 100)
-                    self.progress.emit(progress)
-
-            # Check exit code
-            if self._process.returncode != 0:
-                error_output = self._process.stderr.read()
+            self._urls = dict()
+            # Earlier deploys of this model size the stages and drive the ETA
+            expected = self._history.expected(self._model["code_name"]) if self.tracks_deploys else None
+            self._tracker = DeployProgress(expected=expected)
+            # stdout and stderr are drained together, so a chatty build cannot fill a pipe and stall
+            pump = LogPump(self._process, on_line=self._onOutputLine)
+            returncode = await pump.run()
+            if returncode != 0:
+                error_output = "\n".join(pump.tail("stderr", 50) or pump.tail("stdout", 50))
                 raise RuntimeError(
-                    f"Deployment failed with exit code {self._process.returncode}: {error_output}"
+                    f"Deployment failed with exit code {returncode}: {error_output}"
                 )
 
-            return deployed_url
+            self._health_url = self._urls.get("health", "")
+            return self._urls.get("web-inference", "")
 
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Deployment execution error: {str(e)}")
-        finally:
-            # Cleanup process
-            if self._process:
-                self._process.stdout.close()
-                self._process.stderr.close()
 
-    def run(self) -> None:
+    async def _terminate_process(self) -> None:
+        """Terminate the subprocess, killing it if it does not exit in time"""
+        if self._process and await LogPump.terminate(self._process, grace=5):
+            logger.warning("Had to force kill deployment process")
+
+    async def _is_live(self, url: str) -> bool:
+        """
+        Whether a recorded endpoint still belongs to a deployed app
+
+        A stopped app's endpoints answer 404 right away. Any other answer, or a read
+        timeout while a container boots, means the app is still there.
+        """
+        try:
+            async with httpx.AsyncClient(timeout=self._health_timeout) as client:
+                response = await client.get(url)
+            return response.status_code != 404 and response.status_code < 500
+        except httpx.ReadTimeout:
+            return True
+        except httpx.HTTPError as e:
+            logger.info(f"Recorded endpoint {url} is unreachable: {str(e)}")
+            return False
+
+    async def _reuse_deployment(self, fingerprint: str) -> bool:
+        """Take the URLs of the last deploy if it had the same inputs and is still live"""
+        recorded = self._manifest.get(self._model["code_name"])
+        if not recorded or recorded.get("fingerprint") != fingerprint or not recorded.get("deployed_url"):
+            return False
+        if not await self._is_live(recorded.get("health_url") or recorded["deployed_url"]):
+            logger.info(f"Recorded deployment of {self._model['code_name']} is gone, redeploying")
+            return False
+
+        self._model["deployed_url"] = recorded["deployed_url"]
+        if recorded.get("health_url"):
+            self._model["health_url"] = recorded["health_url"]
+        return True
+
+    async def run(self) -> None:
         """Run deployment process"""
         try:
             self._status = WorkerStatus.RUNNING
@@ -294,130 +506,214 @@ class ModelDeployWorker(QThread):
             # Validate deployment script
             self._validate_deployment_script()
 
+            fingerprint = ""
+            if self.tracks_deploys:
+                fingerprint = DeployManifest.fingerprint(self._deploy_script, self._envs, default_settings.get("version", ""))
+            if self.tracks_deploys and not self._force and await self._reuse_deployment(fingerprint):
+                self._status = WorkerStatus.COMPLETED
+                self.progress.emit(100)
+                self.finished.emit(True, self._model, "")
+                logger.info(f"Skipped deployment of unchanged model: {self._model['code_name']}. Deployed URL: {self._model['deployed_url']}")
+                return
+
             # Setup environment
             env = self._setup_environment()
 
             # Execute deployment
-            deployed_url = self._execute_deployment(env)
+            deployed_url = await self._execute_deployment(env)
             if deployed_url:
                 self._model["deployed_url"] = deployed_url
             else:
                 raise Exception(f"Failed to deploy model {self._model}")
+            if self._health_url:
+                self._model["health_url"] = self._health_url
+            if self.tracks_deploys:
+                self._history.record(self._model["code_name"], self._tracker.finish())
+                self._manifest.record(self._model["code_name"], fingerprint, self._model)
 
             # Deployment successful
             self._status = WorkerStatus.COMPLETED
             self.finished.emit(True, self._model, "")
             logger.info(f"Deployment completed successfully for model: {self._model['code_name']}. Deployed URL: {self._model['deployed_url']}")
+        except asyncio.CancelledError:
+            logger.info(f"Deployment cancelled for model: {self._model['code_name']}")
+            self._status = WorkerStatus.CANCELLED
+            self.finished.emit(False, dict(), "Deployment cancelled")
         except Exception as e:
             error_msg = f"Deployment failed: {str(e)}"
-            logger.error(error_msg, exc_info=True)
+            # Deploy output can contain braces, which loguru would try to format with extra arguments
+            logger.opt(exception=True).error(error_msg)
             self._status = WorkerStatus.ERROR
             self.finished.emit(False, dict(), error_msg)
 
         finally:
             # Cleanup
-            if self._process and self._process.poll() is None:
-                try:
-                    self._process.terminate()
-                    self._process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self._process.kill()
-                    logger.warning("Had to force kill deployment process")
+            await self._terminate_process()
+            if self._workspace:
+                self._workspace.cleanup()
 
     def stop(self) -> None:
         """Stop the deployment process"""
-        if self._process and self._process.poll() is None:
-            try:
-                self._process.terminate()
-                logger.info("Stopping deployment process...")
-                if not self._process.wait(timeout=5):
-                    self._process.kill()
-                    logger.warning("Force killed deployment process")
-            except Exception as e:
-                logger.error(f"Error stopping deployment: {str(e)}", exc_info=True)
+        if self._future and not self._future.done():
+            logger.info("Stopping deployment process...")
+            self._future.cancel()
 
-class ModelStopWorker(QThread):
-    finished = Signal(bool, dict, str)  # success, error_message
+class ModelStopWorker(QObject):
+    """
+    Stops the Modal apps of several models in one batch, on the shared engine loop
+
+    Every app gets its own `modal app stop`, all of them run concurrently, then the app
+    list is read back with `modal app list` so that a model is only reported as stopped
+    once its app is really gone. With `stop=False` nothing is stopped and the worker only
+    reconciles the given models against the app list.
+    """
+    finished = Signal(list, list, str)  # models whose app is gone, models still deployed, error_message
 
-    def __init__(self, model: dict):
+    # `modal app list` states of apps that no longer serve requests
+    STOPPED_STATES = ("stopped", "stopping")
+
+    def __init__(self, models: List[dict], stop: bool = True) -> None:
         super().__init__()
-        self._model = model
+        self._models = [model for model in models if model.get("code_name")]
+        self._stop = stop
         self._status = WorkerStatus.IDLE
-        self._process: Optional[subprocess.Popen] = None
-
-    def run(self):
+        self._future: Optional[concurrent.futures.Future] = None
+        deploy_settings = default_settings.get("deploy") or dict()
+        self._manifest = DeployManifest.from_settings(deploy_settings)
+        self._timeout = float(deploy_settings.get("stop_timeout", 60))
+
+    @property
+    def status(self) -> WorkerStatus:
+        return self._status
+
+    @property
+    def stopping(self) -> bool:
+        """False for a worker that only reconciles"""
+        return self._stop
+
+    def start(self) -> None:
+        """Schedule the job on the engine loop"""
+        self._future = get_engine().submit(self.run())
+
+    @staticmethod
+    def _app_name(model: dict) -> str:
+        # Deploy scripts name their app after the model's code name
+        return model.get("app_name") or model["code_name"]
+
+    async def _modal(self, *args: str) -> Tuple[int, str, str]:
+        """
+        Run a `modal` CLI command
+
+        Returns:
+            Exit code, stdout and stderr
+        """
+        process = await asyncio.create_subprocess_exec(
+            "modal", *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self._timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            await LogPump.terminate(process, grace=0)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise RuntimeError(f"`modal {' '.join(args)}` timed out after {self._timeout:g}s")
+        return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+    async def _stop_app(self, model: dict) -> Optional[str]:
+        """Stop one app, returning the error output if `modal app stop` failed"""
+        app_name = self._app_name(model)
+        logger.info(f"Stopping app: {app_name}")
+        try:
+            returncode, stdout, stderr = await self._modal("app", "stop", app_name)
+        except (OSError, RuntimeError) as e:
+            return str(e)
+        if returncode != 0:
+            return (stderr or stdout).strip() or f"exit code {returncode}"
+        return None
+
+    async def _list_apps(self) -> Dict[str, str]:
+        """
+        States of the workspace's apps by name, from `modal app list --json`
+
+        An app name can show up several times, e.g. a stopped deployment and a newer live
+        one, so a live entry wins over a stopped one.
+        """
+        returncode, stdout, stderr = await self._modal("app", "list", "--json")
+        if returncode != 0:
+            raise RuntimeError(f"Listing apps failed: {(stderr or stdout).strip()}")
+        try:
+            rows = json.loads(stdout)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Unexpected `modal app list` output: {str(e)}")
+
+        states: Dict[str, str] = dict()
+        for row in rows:
+            name = row.get("Description") or row.get("Name") or ""
+            state = str(row.get("State", "")).lower()
+            if name and (name not in states or states[name] in self.STOPPED_STATES):
+                states[name] = state
+        return states
+
+    async def run(self) -> None:
         try:
             self._status = WorkerStatus.RUNNING
-            logger.info(f"Stopping model: {self._model['code_name']}")
-
-            # stop_command = [
-            #     "modal", "stop", self._model.code_name
-            # ]
-            # self._process = subprocess.Popen(
-            #     stop_command,
-            #     stdout=subprocess.PIPE,
-            #     stderr=subprocess.PIPE,
-            #     text=True,
-            #     bufsize=1,
-            #     universal_newlines=True
-            # )
-
-            # if not self._process:
-            #     raise RuntimeError("Failed to start deployment process")
-
-            # while True:
-            #     if self._process.poll() is not None:
-            #         break
-
-            # # Check exit code
-            # if self._process.returncode != 0:
-            #     error_output = self._process.stderr.read()
-            #     raise RuntimeError(
-            #         f"Deployment failed with exit code {self._process.returncode}: {error_output}"
-            #     )
-            import time
-            time.sleep(2)
-            self.finished.emit(True, self._model, "")
-            self._status = WorkerStatus.COMPLETED
-            logger.info(f"Stopped model successfully : {self._model['code_name']}")
+            errors: Dict[str, str] = dict()
+            if self._stop and self._models:
+                logger.info(f"Stopping models: {', '.join(model['code_name'] for model in self._models)}")
+                results = await asyncio.gather(*(self._stop_app(model) for model in self._models))
+                errors = {model["code_name"]: error for model, error in zip(self._models, results) if error}
+
+            try:
+                states = await self._list_apps()
+            except (OSError, RuntimeError) as e:
+                if not self._stop:
+                    self._status = WorkerStatus.ERROR
+                    self.finished.emit([], self._models, f"Failed to check deployed apps: {str(e)}")
+                    return
+                # Without the app list, trust the exit codes of `modal app stop`
+                logger.warning(f"Could not confirm stopped apps: {str(e)}")
+                states = {
+                    self._app_name(model): "unconfirmed" if model["code_name"] in errors else "stopped"
+                    for model in self._models
+                }
+
+            gone, running = [], []
+            for model in self._models:
+                state = states.get(self._app_name(model))
+                if state is None or state in self.STOPPED_STATES:
+                    gone.append(model)
+                    self._manifest.forget(model["code_name"])
+                else:
+                    running.append(model)
+
+            error_msg = ""
+            if self._stop and running:
+                error_msg = "Failed to stop: " + "; ".join(
+                    f"{model['code_name']} ({errors.get(model['code_name']) or states.get(self._app_name(model))})"
+                    for model in running
+                )
+                logger.error(error_msg)
+            self._status = WorkerStatus.COMPLETED if not error_msg else WorkerStatus.ERROR
+            self.finished.emit(gone, running, error_msg)
+            if gone:
+                logger.info(f"Apps no longer deployed: {', '.join(model['code_name'] for model in gone)}")
+        except asyncio.CancelledError:
+            self._status = WorkerStatus.CANCELLED
+            self.finished.emit([], self._models, "Stopping cancelled")
         except Exception as e:
             error_msg = f"Failed to stop: {str(e)}"
-            logger.error(error_msg, exc_info=True)
+            logger.opt(exception=True).error(error_msg)
             self._status = WorkerStatus.ERROR
-            self.finished.emit(False, dict(), error_msg)
-        finally:
-            # Cleanup
-            if self._process and self._process.poll() is None:
-                try:
-                    self._process.terminate()
-                    self._process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self._process.kill()
-                    logger.warning("Had to force kill deployment process")
-
-class ModelTrainingWorker(QThread):
-    """Worker thread for model deployment"""
-    finished = Signal(bool, dict, str)  # success, error_message
-    progress = Signal(int)
+            self.finished.emit([], self._models, error_msg)
 
-    def __init__(self, model: dict, envs: dict = dict()) -> None:
-        super().__init__()
-        self._model = model or dict()
-        self._envs = envs
-        self._status = WorkerStatus.IDLE
-        self._process: Optional[subprocess.Popen] = None
+class ModelTrainingWorker(ModelDeployWorker):
+    """Training job run as a coroutine on the shared engine loop"""
 
-        # Define paths
-        self._base_path = Path(__file__).parents[1]
-        self._scripts_path = self._base_path / "scripts/train"
-        self._deploy_script = self._scripts_path / f"{self._model['code_name']}.py"
-
-    def _validate_deployment_script(self) -> None:
-        """Validate deployment script existence and permissions"""
-        if not self._deploy_script.exists():
-            raise FileNotFoundError(
-                f"Deployment script not found: {self._deploy_script}"
-            )
+    scripts_dir = "scripts/train"
+    # Training runs share code names with deploys but must never be skipped or overwrite their records
+    tracks_deploys = False
 
     def _setup_environment(self) -> dict:
         """Setup environment variables for deployment"""
@@ -429,138 +725,3 @@ class ModelTrainingWorker(QThread):
 
         env.update(custom_envs)
         return env
-
-    def _extract_deployed_url(self, line: str) -> str:
-        deployed_url = ""
-        line = line.strip()
-        if f"--{self._model['code_name']}-model-web-inference" in line:
-            pattern = r'https?://[^\s]+'
-            match = re.search(pattern, line)
-
-            if match:
-                link = match.group(0)
-                deployed_url = link
-
-        return deployed_url
-
-    def _execute_deployment(self, env: dict) -> str:
-        """Execute deployment script and handle output"""
-        try:
-            # Use modal deploy command
-            deploy_command = [
-                "modal", "deploy", str(self._deploy_script)
-            ]
-
-            logger.info(f"Executing deployment command: {' '.join(deploy_command)}")
-
-            self._process = subprocess.Popen(
-                deploy_command,
-                env=env,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-
-            if not self._process:
-                raise RuntimeError("Failed to start deployment process")
-
-            total_steps = 5
-            current_step = 0
-
-            deployed_url = ""
-            while True:
-                if self._process.poll() is not None:
-                    break
-
-                line = self._process.stdout.readline()
-                if line:
-                    logger.info(f"Deployment output: {line.strip()}")
-                    extracted_url = self._extract_deployed_url(line)
-                    if extracted_url:
-                        deployed_url = extracted_url
-
-                    # Update progress based on output
-                    if "Starting deployment" in line:
-                        current_step = 1
-                    elif "Uploading code" in line:
-                        current_step = 2
-                    elif "Building container" in line:
-                        current_step = 3
-                    elif "Deploying model" in line:
-                        current_step = 4
-                    elif "Deployment complete" in line:
-                        current_step = 5
-
-                    progress = int((current_step / total_steps) * 100)
-                    self.progress.emit(progress)
-
-            # Check exit code
-            if self._process.returncode != 0:
-                error_output = self._process.stderr.read()
-                raise RuntimeError(
-                    f"Deployment failed with exit code {self._process.returncode}: {error_output}"
-                )
-
-            return deployed_url
-
-        except Exception as e:
-            raise RuntimeError(f"Deployment execution error: {str(e)}")
-        finally:
-            # Cleanup process
-            if self._process:
-                self._process.stdout.close()
-                self._process.stderr.close()
-
-    def run(self) -> None:
-        """Run deployment process"""
-        try:
-            self._status = WorkerStatus.RUNNING
-            logger.info(f"Starting deployment for model: {self._model['code_name']}")
-
-            # Validate deployment script
-            self._validate_deployment_script()
-
-            # Setup environment
-            env = self._setup_environment()
-
-            # Execute deployment
-            deployed_url = self._execute_deployment(env)
-            if deployed_url:
-                self._model["deployed_url"] = deployed_url
-            else:
-                raise Exception(f"Failed to deploy model {self._model}")
-
-            # Deployment successful
-            self._status = WorkerStatus.COMPLETED
-            self.finished.emit(True, self._model, "")
-            logger.info(f"Deployment completed successfully for model: {self._model['code_name']}. Deployed URL: {self._model['deployed_url']}")
-
-        except Exception as e:
-            error_msg = f"Deployment failed: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            self._status = WorkerStatus.ERROR
-            self.finished.emit(False, dict(), error_msg)
-
-        finally:
-            # Cleanup
-            if self._process and self._process.poll() is None:
-                try:
-                    self._process.terminate()
-                    self._process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self._process.kill()
-                    logger.warning("Had to force kill deployment process")
-
-    def stop(self) -> None:
-        """Stop the deployment process"""
-        if self._process and self._process.poll() is None:
-            try:
-                self._process.terminate()
-                logger.info("Stopping deployment process...")
-                if not self._process.wait(timeout=5):
-                    self._process.kill()
-                    logger.warning("Force killed deployment process")
-            except Exception as e:
-                logger.error(f"Error stopping deployment: {str(e)}", exc_info=True)
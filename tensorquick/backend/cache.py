@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from typing import Optional, Tuple
+
+from loguru import logger
+
+class ResultCache:
+    """Content-addressed on-disk cache of generation results"""
+
+    INDEX_FILE = "index.json"
+    BLOB_DIR = "blobs"
+
+    def __init__(self, cache_dir: str, max_size_mb: float = 1024) -> None:
+        """
+        Args:
+            cache_dir: Directory holding the index file and the blobs
+            max_size_mb: Total blob size above which least recently used entries are evicted
+        """
+        self._cache_dir = os.path.expanduser(cache_dir)
+        self._blob_dir = os.path.join(self._cache_dir, self.BLOB_DIR)
+        self._index_path = os.path.join(self._cache_dir, self.INDEX_FILE)
+        self._max_size = int(max_size_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+
+        os.makedirs(self._blob_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[dict]) -> Optional["ResultCache"]:
+        """Create a cache from the `cache` section of the settings, or None when disabled"""
+        settings = settings or dict()
+        if not settings.get("enabled", True):
+            return None
+
+        try:
+            return cls(
+                cache_dir=settings.get("dir", "~/.cache/tensorquick"),
+                max_size_mb=float(settings.get("max_size_mb", 1024)),
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize result cache: {str(e)}")
+            return None
+
+    @staticmethod
+    def make_key(model: dict, prompt: str, params: Optional[dict] = None) -> str:
+        """Hash everything that determines the generated output"""
+        payload = {
+            "code_name": model.get("code_name", ""),
+            "deployed_url": model.get("deployed_url", ""),
+            "prompt": prompt,
+            "params": params or dict(),
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self._index_path):
+            return dict()
+
+        try:
+            with open(self._index_path, "r") as f:
+                index = json.load(f)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache index: {str(e)}")
+            return dict()
+
+        # Drop entries whose blob disappeared behind our back
+        return {
+            key: entry for key, entry in index.items()
+            if os.path.exists(os.path.join(self._blob_dir, entry["blob"]))
+        }
+
+    def _save_index(self) -> None:
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _hash_file(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits its size cap"""
+        blob_sizes = {entry["blob"]: entry["size"] for entry in self._index.values()}
+        total = sum(blob_sizes.values())
+        if total <= self._max_size:
+            return
+
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self._max_size:
+                break
+
+            del self._index[key]
+            # Identical outputs share a blob, only delete it once nothing refers to it
+            if any(other["blob"] == entry["blob"] for other in self._index.values()):
+                continue
+
+            total -= blob_sizes[entry["blob"]]
+            try:
+                os.remove(os.path.join(self._blob_dir, entry["blob"]))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Evicted cached result {entry['blob']}")
+
+    def lookup(self, key: str) -> Optional[Tuple[str, dict]]:
+        """
+        Look up a cached result together with the metadata stored with it
+
+        Args:
+            key: Key returned by `make_key`, empty for results that are never cached
+
+        Returns:
+            (path to the cached blob, metadata), or None on a miss
+        """
+        if not key:
+            return None
+        with self._lock:
+            entry = self._index.get(key)
+            if not entry:
+                return None
+
+            blob_path = os.path.join(self._blob_dir, entry["blob"])
+            if not os.path.exists(blob_path):
+                del self._index[key]
+                self._save_index()
+                return None
+
+            entry["last_access"] = time.time()
+            self._save_index()
+            return blob_path, dict(entry.get("metadata") or dict())
+
+    def put(self, key: str, path: str, metadata: Optional[dict] = None) -> Optional[str]:
+        """
+        Store a generated file under the given key
+
+        Args:
+            key: Key returned by `make_key`; an empty key stores nothing
+            path: Path to the generated file; it is copied, not moved
+            metadata: JSON-serializable details returned by `lookup`, e.g. the seed
+
+        Returns:
+            Path to the stored blob, or None if it could not be cached
+        """
+        if not key:
+            return None
+        try:
+            extension = os.path.splitext(path)[1]
+            blob = f"{self._hash_file(path)}{extension}"
+            blob_path = os.path.join(self._blob_dir, blob)
+
+            with self._lock:
+                if not os.path.exists(blob_path):
+                    tmp_path = f"{blob_path}.tmp"
+                    shutil.copyfile(path, tmp_path)
+                    os.replace(tmp_path, blob_path)
+
+                self._index[key] = {
+                    "blob": blob,
+                    "size": os.path.getsize(blob_path),
+                    "last_access": time.time(),
+                    "metadata": metadata or dict(),
+                }
+                self._evict()
+                self._save_index()
+
+            return blob_path if key in self._index else None
+
+        except Exception as e:
+            logger.error(f"Failed to cache result: {str(e)}")
+            return None
+
+    def clear(self) -> None:
+        """Remove every cached result"""
+        with self._lock:
+            self._index = dict()
+            shutil.rmtree(self._blob_dir, ignore_errors=True)
+            os.makedirs(self._blob_dir, exist_ok=True)
+            self._save_index()
@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import math
+import time
+import statistics
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Pattern, Sequence, Tuple
+
+from loguru import logger
+
+UNITS = {"": 1, "B": 1, "K": 1e3, "M": 1e6, "G": 1e9, "KI": 1024, "MI": 1024**2, "GI": 1024**3}
+
+@dataclass(frozen=True)
+class Stage:
+    """One phase of `modal deploy` output"""
+    name: str
+    patterns: Tuple[Pattern, ...]
+    weight: float  # share of the progress bar when the model has no deploy history
+    creep: float = 20.0  # matched lines after which the stage shows about two thirds done
+
+def stage(name: str, weight: float, *patterns: str, creep: float = 20.0) -> Stage:
+    """
+    Build a stage from regular expressions, compiled once
+
+    A pattern with `done` and `total` groups reports how far the stage is, e.g. uploaded
+    bytes or files; `done_unit` and `total_unit` groups scale sizes like `12.3 MiB`.
+    """
+    return Stage(name, tuple(re.compile(pattern, re.IGNORECASE) for pattern in patterns), weight, creep)
+
+# Stages in the order `modal deploy` goes through them. A stage that does not show up,
+# like the image build when every layer is cached, is skipped.
+DEFAULT_STAGES: Tuple[Stage, ...] = (
+    stage("initializing", 0.02, r"Initialized\.", r"Creating objects", r"View run at"),
+    stage(
+        "uploading", 0.08,
+        r"Created mount", r"Uploading",
+        r"Uploaded (?P<done>\d+)/(?P<total>\d+) files",
+        r"(?P<done>[\d.]+)\s*(?P<done_unit>(?:[KMG]i?)?B)\s*/\s*(?P<total>[\d.]+)\s*(?P<total_unit>(?:[KMG]i?)?B)",
+    ),
+    stage(
+        "building", 0.70,
+        r"Building image", r"=> Step (?P<done>\d+)(?:/(?P<total>\d+))?",
+        # pip output inside the image layers
+        r"^\s*Collecting \S+", r"^\s*Downloading \S+", r"Installing collected packages", r"Successfully installed",
+        r"^\s*(?:Get|Hit):\d+ ", r"Setting up \S+",  # apt
+        creep=200.0,
+    ),
+    stage("saving", 0.10, r"Saving image", r"Image saved", r"Built image"),
+    stage("creating", 0.08, r"Created (?:web )?function", r"Created objects"),
+    stage("complete", 0.02, r"App deployed", r"Deployment complete"),
+)
+
+class DeployProgress:
+    """
+    Turns `modal deploy` output into monotonic progress and an ETA
+
+    Each stage owns a slice of the bar, sized by how long the stage took in earlier deploys
+    of the same model, or by its default weight without history. Within a stage, progress
+    comes from explicit counters (bytes, files, build steps) when the output has them,
+    otherwise from the number of matched lines and the time spent against the history.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Stage] = DEFAULT_STAGES,
+        expected: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            stages: Stage table, in deployment order
+            expected: Seconds each stage took in earlier deploys, from `DeployHistory.expected`
+            clock: Source of the current time in seconds, replaceable to replay a recorded log
+        """
+        self._stages = tuple(stages)
+        self._clock = clock
+        self._expected = {name: seconds for name, seconds in (expected or dict()).items() if seconds >= 0}
+        if self._expected and sum(self._expected.get(s.name, 0) for s in self._stages) > 0:
+            total = sum(self._expected.get(s.name, 0) for s in self._stages)
+            self._weights = [self._expected.get(s.name, 0) / total for s in self._stages]
+        else:
+            total = sum(s.weight for s in self._stages)
+            self._weights = [s.weight / total for s in self._stages]
+
+        self._start = clock()
+        self._index = -1
+        self._stage_start = self._start
+        self._matches = 0
+        self._fraction: Optional[float] = None
+        self._progress = 0.0
+        self._durations: Dict[str, float] = dict()
+
+    @property
+    def stage(self) -> str:
+        return self._stages[self._index].name if self._index >= 0 else ""
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the deployment done, between 0 and 1, never decreasing"""
+        return self._progress
+
+    @property
+    def durations(self) -> Dict[str, float]:
+        """Seconds spent in each stage so far; skipped stages count as zero"""
+        return dict(self._durations)
+
+    def _enter(self, index: int, now: float) -> None:
+        if self._index >= 0:
+            self._durations[self.stage] = round(now - self._stage_start, 2)
+        for skipped in self._stages[self._index + 1:index]:
+            self._durations[skipped.name] = 0.0
+        self._index = index
+        self._stage_start = now
+        self._matches = 0
+        self._fraction = None
+
+    def _fraction_from(self, match: re.Match) -> Optional[float]:
+        groups = match.groupdict()
+        if groups.get("done") is None or groups.get("total") is None:
+            return None
+        try:
+            done = float(groups["done"]) * UNITS[(groups.get("done_unit") or "").upper().rstrip("B")]
+            total = float(groups["total"]) * UNITS[(groups.get("total_unit") or "").upper().rstrip("B")]
+        except (KeyError, ValueError):
+            return None
+        return min(1.0, done / total) if total > 0 else None
+
+    def _stage_fraction(self, now: float) -> float:
+        """How far the current stage is, capped below 1 until the next stage starts"""
+        if self._fraction is not None:
+            return min(0.99, self._fraction)
+        creep = 1 - math.exp(-self._matches / self._stages[self._index].creep)
+        expected = self._expected.get(self.stage)
+        timed = (now - self._stage_start) / expected if expected else 0.0
+        return min(0.95, max(creep, timed))
+
+    def feed(self, line: str) -> bool:
+        """
+        Match one line of output against the stage table
+
+        Returns:
+            True if the stage or the progress changed
+        """
+        now = self._clock()
+        stage_changed = False
+        # Stages only move forward; a later stage's pattern wins over the current one
+        for index in range(len(self._stages) - 1, max(self._index, 0) - 1, -1):
+            match = next(filter(None, (p.search(line) for p in self._stages[index].patterns)), None)
+            if match is None:
+                continue
+            if index > self._index:
+                self._enter(index, now)
+                stage_changed = True
+            self._matches += 1
+            fraction = self._fraction_from(match)
+            if fraction is not None:
+                self._fraction = fraction
+            break
+
+        if self._index < 0:
+            return False
+
+        if self.stage == self._stages[-1].name:
+            progress = 1.0
+        else:
+            progress = sum(self._weights[:self._index]) + self._weights[self._index] * self._stage_fraction(now)
+        if progress > self._progress:
+            self._progress = progress
+            return True
+        return stage_changed
+
+    def eta(self) -> Optional[float]:
+        """Seconds left, from the history when there is one, else extrapolated from the progress"""
+        now = self._clock()
+        if self._progress >= 1.0:
+            return 0.0
+        if self._expected and self._index >= 0:
+            current = max(0.0, self._expected.get(self.stage, 0) - (now - self._stage_start))
+            later = sum(self._expected.get(s.name, 0) for s in self._stages[self._index + 1:])
+            return round(current + later, 1)
+        if self._progress < 0.05:
+            return None
+        elapsed = now - self._start
+        return round(elapsed * (1 - self._progress) / self._progress, 1)
+
+    def finish(self) -> Dict[str, float]:
+        """Close the running stage and return the duration of every stage, empty if none was seen"""
+        if self._index < 0:
+            return dict()
+        self._durations[self.stage] = round(self._clock() - self._stage_start, 2)
+        for skipped in self._stages[self._index + 1:]:
+            self._durations.setdefault(skipped.name, 0.0)
+        self._progress = 1.0
+        return self.durations
+
+class DeployHistory:
+    """Per-stage deploy durations of recent successful deploys, kept in a JSON file"""
+
+    def __init__(self, path: str, max_runs: int = 5) -> None:
+        """
+        Args:
+            path: JSON file holding the history
+            max_runs: Deploys remembered per model
+        """
+        self._path = os.path.expanduser(path)
+        self._max_runs = max(1, max_runs)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[dict]) -> "DeployHistory":
+        """Create a history from the `deploy` section of the settings"""
+        settings = settings or dict()
+        return cls(
+            settings.get("history_file", "~/.cache/tensorquick/deploy_history.json"),
+            max_runs=int(settings.get("history_runs", 5)),
+        )
+
+    def _load(self) -> Dict[str, List[Dict[str, float]]]:
+        if not os.path.exists(self._path):
+            return dict()
+        try:
+            with open(self._path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable deploy history: {str(e)}")
+            return dict()
+
+    def expected(self, code_name: str) -> Dict[str, float]:
+        """Median seconds per stage over the recorded deploys of `code_name`"""
+        with self._lock:
+            runs = self._load().get(code_name, [])
+        stages = {name for run in runs for name in run}
+        return {name: round(statistics.median(run.get(name, 0.0) for run in runs), 2) for name in stages}
+
+    def record(self, code_name: str, durations: Dict[str, float]) -> None:
+        """Append the stage durations of a successful deploy"""
+        if not durations:
+            return
+        with self._lock:
+            history = self._load()
+            history[code_name] = (history.get(code_name, []) + [durations])[-self._max_runs:]
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                tmp_path = f"{self._path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(history, f, indent=2)
+                os.replace(tmp_path, self._path)
+            except OSError as e:
+                logger.warning(f"Failed to save deploy history: {str(e)}")
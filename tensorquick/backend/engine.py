@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import concurrent.futures
+from typing import Coroutine, Optional
+
+from loguru import logger
+
+class AsyncEngine:
+    """Single background event loop that runs every backend job
+
+    Jobs are coroutines submitted from the Qt thread; they report back through
+    Qt signals, which are delivered to the receivers' thread as queued calls.
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="tensorquick-engine", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the engine loop; cancelling the future cancels the job"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Cancel outstanding jobs and stop the loop"""
+        if not self._loop.is_running():
+            return
+
+        async def _cancel_all():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            self.submit(_cancel_all()).result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Engine shutdown did not finish cleanly: {str(e)}")
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+
+_engine: Optional[AsyncEngine] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> AsyncEngine:
+    """Return the process-wide engine, starting it on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncEngine()
+        return _engine
@@ -0,0 +1,117 @@
+import asyncio
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+class LogPump:
+    """
+    Drains a subprocess's stdout and stderr concurrently as output arrives
+
+    Both pipes are read by their own task on the engine loop, so neither can fill up
+    and block the child while the other one is being waited on. Output is split into
+    lines on `\\n` and on the `\\r` that progress spinners use to redraw, each line is
+    handed to `on_line` as soon as it is complete, and the most recent lines of every
+    stream are kept in bounded buffers for error reports.
+    """
+
+    STREAMS = ("stdout", "stderr")
+
+    def __init__(
+        self,
+        process: asyncio.subprocess.Process,
+        on_line: Optional[Callable[[str, str], None]] = None,
+        max_lines: int = 200,
+        max_line_length: int = 4096,
+        chunk_size: int = 64 * 1024,
+    ) -> None:
+        """
+        Args:
+            process: Subprocess started with stdout and stderr set to PIPE
+            on_line: Called with (stream name, line) for every line, on the engine loop
+            max_lines: Lines kept per stream in the ring buffers
+            max_line_length: Longer lines are truncated, so one huge line cannot grow memory
+            chunk_size: Bytes read from a pipe at a time
+        """
+        self._process = process
+        self._on_line = on_line
+        self._max_line_length = max_line_length
+        self._chunk_size = chunk_size
+        self._buffers: Dict[str, Deque[str]] = {name: deque(maxlen=max_lines) for name in self.STREAMS}
+        self.line_counts: Dict[str, int] = {name: 0 for name in self.STREAMS}
+
+    def tail(self, stream: str, lines: Optional[int] = None) -> List[str]:
+        """Most recent lines of `stream`, oldest first"""
+        buffer = list(self._buffers[stream])
+        return buffer[-lines:] if lines else buffer
+
+    def _emit(self, stream: str, raw: bytes) -> None:
+        line = raw.decode(errors="replace").rstrip()
+        if not line:
+            return
+        if len(line) > self._max_line_length:
+            line = line[:self._max_line_length] + "…"
+        self._buffers[stream].append(line)
+        self.line_counts[stream] += 1
+        if self._on_line:
+            self._on_line(stream, line)
+
+    async def _pump(self, stream: str, reader: Optional[asyncio.StreamReader]) -> None:
+        if reader is None:
+            return
+
+        pending = bytearray()
+        while True:
+            chunk = await reader.read(self._chunk_size)
+            if not chunk:
+                break
+            pending += chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+            *lines, rest = pending.split(b"\n")
+            for raw in lines:
+                self._emit(stream, raw)
+            # A partial line is kept for the next chunk, but only up to the truncation limit
+            pending = bytearray(rest[:self._max_line_length * 4])
+        self._emit(stream, bytes(pending))
+
+    async def run(self) -> int:
+        """
+        Pump both streams until the process closes them and exits
+
+        Returns:
+            The process's exit code
+        """
+        await asyncio.gather(
+            self._pump("stdout", self._process.stdout),
+            self._pump("stderr", self._process.stderr),
+        )
+        return await self._process.wait()
+
+    @classmethod
+    async def terminate(cls, process: asyncio.subprocess.Process, grace: float = 5.0) -> bool:
+        """
+        Stop a piped process and reap it
+
+        The process is only reaped once its pipes are closed, so they are drained while
+        waiting for it to exit.
+
+        Args:
+            process: Subprocess started with stdout and stderr set to PIPE
+            grace: Seconds to wait after SIGTERM before killing it, 0 to kill right away
+
+        Returns:
+            Whether the process had to be killed
+        """
+        if process.returncode is not None:
+            return False
+        try:
+            if grace > 0:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(cls(process).run(), timeout=grace)
+                    return False
+                except asyncio.TimeoutError:
+                    pass
+            process.kill()
+        except ProcessLookupError:
+            # Exited in the meantime; it still has to be reaped
+            pass
+        await cls(process).run()
+        return True
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from importlib import metadata
+
+from loguru import logger
+from tensorquick.backend.workspace import script_sources
+
+class DeployManifest:
+    """
+    Fingerprints of the last successful deploy of every model, kept in a JSON file
+
+    A fingerprint covers everything that ends up in the deployed app: the deploy script,
+    the sibling helper modules it imports, the `BUNCHA_*` values it is deployed with and
+    the versions of the `modal` client and of this app. When a deploy would produce the
+    same fingerprint as the recorded one, the recorded URLs can be reused instead.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path: JSON file holding the manifest
+        """
+        self._path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[dict]) -> "DeployManifest":
+        """Create a manifest from the `deploy` section of the settings"""
+        settings = settings or dict()
+        return cls(settings.get("manifest_file", "~/.cache/tensorquick/deploy_manifest.json"))
+
+    @staticmethod
+    def _version(package: str) -> str:
+        try:
+            return metadata.version(package)
+        except metadata.PackageNotFoundError:
+            return ""
+
+    @classmethod
+    def fingerprint(cls, script: Path, envs: Optional[dict], app_version: str = "") -> str:
+        """
+        Hash the deploy inputs of `script`
+
+        Args:
+            script: Deploy script
+            envs: `BUNCHA_*` values the script is deployed with
+            app_version: Version of this app, so a client upgrade redeploys
+        """
+        digest = hashlib.sha256()
+        for path in script_sources(Path(script)):
+            digest.update(path.name.encode("utf-8") + b"\0" + path.read_bytes() + b"\0")
+
+        digest.update(json.dumps({
+            "envs": {key: str(value) for key, value in (envs or dict()).items()},
+            "modal": cls._version("modal"),
+            "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+            "app": app_version,
+        }, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self._path):
+            return dict()
+        try:
+            with open(self._path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable deploy manifest: {str(e)}")
+            return dict()
+
+    def _save(self, manifest: Dict[str, dict]) -> None:
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logger.warning(f"Failed to save deploy manifest: {str(e)}")
+
+    def get(self, code_name: str) -> Optional[dict]:
+        """Recorded deploy of `code_name` with its fingerprint and URLs, or None"""
+        with self._lock:
+            return self._load().get(code_name)
+
+    def record(self, code_name: str, fingerprint: str, model: dict) -> None:
+        """Remember a successful deploy"""
+        with self._lock:
+            manifest = self._load()
+            manifest[code_name] = {
+                "fingerprint": fingerprint,
+                "deployed_url": model.get("deployed_url", ""),
+                "health_url": model.get("health_url", ""),
+                "deployed_at": time.time(),
+            }
+            self._save(manifest)
+
+    def forget(self, code_name: str) -> None:
+        """Drop the record of a model whose app was stopped, so its next deploy runs"""
+        with self._lock:
+            manifest = self._load()
+            if manifest.pop(code_name, None) is not None:
+                self._save(manifest)
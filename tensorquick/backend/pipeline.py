@@ -1,19 +1,35 @@
 import os
+import json
+import uuid
+import base64
+import asyncio
+import zipfile
+import dataclasses
+import concurrent.futures
 import tempfile
 import shutil
+from collections import deque
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
 from loguru import logger
 
-import requests
+import httpx
 from PIL import Image
-from PySide6.QtCore import QObject, Slot, Signal, Property, QThread
+from PySide6.QtCore import QObject, Slot, Signal, Property, Qt, QUrl
+from PySide6.QtGui import QDesktopServices, QGuiApplication
 
+from tensorquick.backend.cache import ResultCache
 from tensorquick.backend.clipboard import ClipboardModel
+from tensorquick.backend.engine import get_engine
+from tensorquick.backend.transport import HttpTransport
 from tensorquick.backend.types import GenerationResult, WorkerStatus
-from tensorquick.utils.general import validate_image_path
+from tensorquick.backend.warmup import EndpointWarmer
+from tensorquick.scripts.deploy.params import DEFAULT_FORMAT, OUTPUT_MEDIA_TYPES, GenerationParams, ParamLimits
+from tensorquick.utils.general import validate_image_path, derive_endpoint_url
 from tensorquick.config import default_settings
 
+VIDEO_EXTENSIONS = (".mp4", ".webm")
+
 class ImageProcessor:
     """Handles image processing operations like saving, copying, and validation"""
 
@@ -42,8 +58,11 @@ class ImageProcessor:
             filename = os.path.basename(image_path)
             new_image_path = os.path.join(self._save_dir, filename)
             shutil.copy(image_path, new_image_path)
-            image = Image.open(new_image_path)
-            image.show()
+            if os.path.splitext(new_image_path)[1].lower() in VIDEO_EXTENSIONS:
+                QDesktopServices.openUrl(QUrl.fromLocalFile(new_image_path))
+            else:
+                image = Image.open(new_image_path)
+                image.show()
             return True, ""
 
         except Exception as e:
@@ -66,24 +85,71 @@ class ImageProcessor:
 class InferencePipeline(QObject):
     """Main pipeline for image inference"""
     imagePathChanged = Signal(str)
+    previewPathChanged = Signal(str)
     currentModelChanged = Signal(dict)
     loadingChanged = Signal(bool)
     progressChanged = Signal(int)
     generationCompleted = Signal(bool, str, str)
+    jobCompleted = Signal(str, bool, str, str)  # job_id, success, image_path, error_message
+    batchCompleted = Signal()
+    keepWarmChanged = Signal(bool)
+    lastSeedChanged = Signal(int)
+    healthChanged = Signal(dict)
     errorOccurred = Signal(str)
+    _healthFetched = Signal(str, dict)  # url, health; emitted from the engine loop
 
     def __init__(self, current_model: dict = None) -> None:
         super().__init__()
         self._current_model = current_model
         self._image_path: str = ""
+        self._preview_path: str = ""
+        self._last_seed: int = -1
         self._loading: bool = False
-        self._worker: Optional[ImageGeneratorWorker] = None
+        self._workers: Dict[str, ImageGeneratorWorker] = dict()
+        self._pending: Deque[Tuple[str, dict, str, dict]] = deque()  # (job_id, model, prompt, options)
+        self._total_jobs: int = 0
+        self._finished_jobs: int = 0
         self._image_processor = ImageProcessor()
+        self._health: dict = dict()
+
+        inference_settings = default_settings.get("inference") or dict()
+        self._max_in_flight = max(1, int(inference_settings.get("max_in_flight", 4)))
+        self._server_batch_size = max(1, int(inference_settings.get("server_batch_size", 1)))
+        self._deadline = float(inference_settings.get("deadline", 0)) or None
+        self._job_settings = inference_settings.get("jobs") or dict()
+        self._job_deadline = float(self._job_settings.get("deadline", 0)) or None
+        self._output_options = output_options(inference_settings.get("output"))
+        self._stream_previews = bool(inference_settings.get("stream_previews", True))
+        self._draft_steps = int(inference_settings.get("draft_steps", 4))
+        self._transport = HttpTransport.from_settings(inference_settings)
+        self._cache = ResultCache.from_settings(default_settings.get("cache"))
+
+        self._warmer = EndpointWarmer(self._transport, default_settings.get("warmup"))
+        self._warmer.setTarget(self._healthUrl(current_model), (current_model or dict()).get("deployed_url", ""))
+        self._healthFetched.connect(self._onHealthFetched)
+        app = QGuiApplication.instance()
+        if app:
+            app.applicationStateChanged.connect(self._onApplicationStateChanged)
 
     @Property(str, notify=imagePathChanged)
     def imagePath(self) -> str:
         return self._image_path
 
+    @Property(str, notify=previewPathChanged)
+    def previewPath(self) -> str:
+        """Latest intermediate preview of the running generation, empty when there is none"""
+        return self._preview_path
+
+    def _setPreviewPath(self, path: str) -> None:
+        if path != self._preview_path:
+            self._preview_path = path
+            self.previewPathChanged.emit(path)
+
+    @Property(int, notify=lastSeedChanged)
+    def lastSeed(self) -> int:
+        """Seed of the latest generated image, -1 when the endpoint did not report it"""
+        return self._last_seed
+
     @Property(bool, notify=loadingChanged)
     def loading(self) -> bool:
         return self._loading
@@ -95,54 +161,298 @@ class InferencePipeline(QObject):
     @currentModel.setter
     def currentModel(self, model):
         self._current_model = model
+        self._warmer.setTarget(self._healthUrl(model), (model or dict()).get("deployed_url", ""))
+        self._health = dict()
+        self.healthChanged.emit(self._health)
         self.currentModelChanged.emit(model)
 
+    @Property(dict, notify=healthChanged)
+    def health(self) -> dict:
+        return self._health
+
+    def _healthUrl(self, model: Optional[dict]) -> str:
+        """URL of the model's `health` route, falling back to the inference URL"""
+        if not model or not model.get("deployed_url"):
+            return ""
+        return (
+            model.get("health_url")
+            or derive_endpoint_url(model["deployed_url"], "health")
+            or model["deployed_url"]
+        )
+
+    def _onHealthFetched(self, url: str, health: dict) -> None:
+        # Ignore answers for a model that is no longer selected
+        if url != self._healthUrl(self._current_model):
+            return
+        self._health = health
+        self.healthChanged.emit(health)
+
+    async def _fetchHealth(self, url: str) -> None:
+        try:
+            response = await self._transport.get(url, timeout=self._transport.cold_timeout)
+            response.raise_for_status()
+            health = response.json()
+            self._transport.mark_warm(url)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Health check for {url} failed: {str(e)}")
+            health = {"status": "unreachable", "error": str(e)}
+        self._healthFetched.emit(url, health)
+
+    @Slot()
+    def checkHealth(self) -> None:
+        """Query the current model's health route; the answer arrives through `healthChanged`"""
+        url = self._healthUrl(self._current_model)
+        if not url:
+            logger.warning("No deployed model")
+            return
+        get_engine().submit(self._fetchHealth(url))
+
+    @Property(bool, notify=keepWarmChanged)
+    def keepWarm(self) -> bool:
+        return self._warmer.keep_warm
+
+    @keepWarm.setter
+    def keepWarm(self, enabled: bool):
+        self._warmer.keep_warm = enabled
+        self.keepWarmChanged.emit(enabled)
+
+    def _onApplicationStateChanged(self, state: Qt.ApplicationState) -> None:
+        self._warmer.setActive(state == Qt.ApplicationState.ApplicationActive)
+
     def _onGenerationComplete(self, result: GenerationResult) -> None:
-        self._loading = False
-        self.loadingChanged.emit(False)
+        if self._workers.pop(result.job_id, None) is None:
+            # Cancelled jobs were accounted for when their slot was freed
+            return
 
-        if result.success:
+        self._finishJob(result)
+        self._dispatch()
+
+    def _finishJob(self, result: GenerationResult) -> None:
+        self._setPreviewPath("")
+        self._finished_jobs += 1
+        self.progressChanged.emit(int(self._finished_jobs / self._total_jobs * 100))
+
+        if result.cancelled:
+            self.jobCompleted.emit(result.job_id, False, "", result.error_message or "")
+            self.generationCompleted.emit(False, "", result.error_message)
+        elif result.success:
             self._image_path = result.image_path
             self.imagePathChanged.emit(self._image_path)
+            if result.seed is not None:
+                self._last_seed = result.seed
+                self.lastSeedChanged.emit(result.seed)
+            self.jobCompleted.emit(result.job_id, True, result.image_path, "")
             self.generationCompleted.emit(True, result.image_path, "")
         else:
             self.errorOccurred.emit(result.error_message or "Unknown error occurred")
+            self.jobCompleted.emit(result.job_id, False, "", result.error_message or "")
             self.generationCompleted.emit(True, "", result.error_message)
 
-        if self._worker:
-            self._worker.deleteLater()
-            self._worker = None
-
     def _onProgressUpdate(self, progress: int) -> None:
-        self.progressChanged.emit(progress)
+        # Per-job progress only matters while a single job is running
+        if self._total_jobs == 1:
+            self.progressChanged.emit(progress)
 
-    @Slot(str)
-    def generateImage(self, prompt: str) -> None:
-        """Start image generation process"""
-        try:
-            if self._worker and self._worker.status == WorkerStatus.RUNNING:
-                logger.warning("Generation already in progress")
-                return
+    def _onPreview(self, job_id: str, path: str) -> None:
+        # Previews of cancelled jobs may still be in flight
+        if job_id in self._workers:
+            self._setPreviewPath(path)
 
-            current_model = self._current_model
-            if not current_model or not current_model["deployed_url"]:
-                logger.warning("No deployed model")
-                return
+    def _paramLimits(self) -> ParamLimits:
+        """Parameter ranges of the current model, from its catalog entry"""
+        code_name = (self._current_model or dict()).get("code_name")
+        catalog = {entry["code_name"]: entry for entry in default_settings.get("models") or []}
+        return ParamLimits.from_dict(catalog.get(code_name, dict()).get("limits"))
+
+    def _requestOptions(self, params: Optional[dict] = None, **overrides) -> dict:
+        """
+        Combine the output options with validated generation parameters
 
+        Raises:
+            ValueError: If a generation parameter is unknown or out of range
+        """
+        options = dict(self._output_options, **overrides)
+        params = GenerationParams.from_dict(params, self._paramLimits()).to_dict()
+        if params:
+            options["params"] = params
+        return options
+
+    def _cacheKey(self, model: dict, prompt: str, options: dict) -> str:
+        """Result cache key of a job, empty when its output must not be cached"""
+        # Without an explicit seed the server draws a random one, so every run gives a new image
+        if not self._cache or options.get("params", dict()).get("seed") is None:
+            return ""
+        return ResultCache.make_key(model, prompt, options)
+
+    def _enqueue(self, prompts: List[str], options: Optional[dict] = None) -> List[str]:
+        """Queue prompts against the current model and return their job ids"""
+        current_model = self._current_model
+        if not current_model or not current_model["deployed_url"]:
+            logger.warning("No deployed model")
+            return []
+
+        if not self._workers and not self._pending:
+            self._total_jobs = 0
+            self._finished_jobs = 0
+
+        job_ids = []
+        for prompt in prompts:
+            job_id = uuid.uuid4().hex
+            self._pending.append((job_id, current_model, prompt, options or self._output_options))
+            job_ids.append(job_id)
+        self._total_jobs += len(job_ids)
+
+        if job_ids and not self._loading:
             self._loading = True
             self.loadingChanged.emit(True)
 
-            self._worker = ImageGeneratorWorker(current_model["deployed_url"], prompt)
-            self._worker.finished.connect(self._onGenerationComplete)
-            self._worker.progress.connect(self._onProgressUpdate)
-            self._worker.start()
+        self._dispatch()
+        return job_ids
 
-        except Exception as e:
-            logger.error(f"Error starting generation: {str(e)}", exc_info=True)
+    def _inFlight(self) -> int:
+        """Number of requests in flight; a batched worker serves several jobs"""
+        return len({id(worker) for worker in self._workers.values()})
+
+    def _dispatch(self) -> None:
+        """Start queued jobs until the in-flight limit is reached"""
+        while self._pending and self._inFlight() < self._max_in_flight:
+            job_id, model, prompt, options = self._pending.popleft()
+            group = [(job_id, prompt)]
+            # Consecutive prompts for the same model and output options share one batched request
+            while (
+                self._pending and len(group) < self._server_batch_size and not model.get("async_jobs")
+                and self._pending[0][1] is model and self._pending[0][3] == options
+            ):
+                next_id, _, next_prompt, _ = self._pending.popleft()
+                group.append((next_id, next_prompt))
+
+            if model.get("async_jobs"):
+                # Video models run each prompt as a server-side job
+                cache_key = self._cacheKey(model, prompt, options)
+                worker = VideoJobWorker(
+                    model["deployed_url"], prompt, self._transport, job_id,
+                    cache=self._cache, cache_key=cache_key, deadline=self._job_deadline, options=options,
+                    poll_interval=float(self._job_settings.get("poll_interval", 2.0)),
+                    poll_max_interval=float(self._job_settings.get("poll_max_interval", 30.0)),
+                )
+            elif len(group) == 1:
+                cache_key = self._cacheKey(model, prompt, options)
+                worker = ImageGeneratorWorker(
+                    model["deployed_url"], prompt, self._transport, job_id,
+                    cache=self._cache, cache_key=cache_key, deadline=self._deadline, options=options,
+                    stream=self._stream_previews,
+                )
+            else:
+                jobs = [
+                    (group_id, group_prompt, self._cacheKey(model, group_prompt, options))
+                    for group_id, group_prompt in group
+                ]
+                worker = BatchGeneratorWorker(
+                    model["deployed_url"], jobs, self._transport,
+                    cache=self._cache, deadline=self._deadline, options=options,
+                )
+
+            worker.finished.connect(self._onGenerationComplete)
+            worker.progress.connect(self._onProgressUpdate)
+            worker.preview.connect(self._onPreview)
+            for group_id, _ in group:
+                self._workers[group_id] = worker
+            worker.start()
+
+        if not self._workers and not self._pending and self._loading:
             self._loading = False
             self.loadingChanged.emit(False)
+            self.batchCompleted.emit()
+
+    @Slot(str)
+    @Slot(str, dict)
+    def generateImage(self, prompt: str, params: Optional[dict] = None) -> None:
+        """
+        Queue a single image generation
+
+        Args:
+            prompt: Text prompt
+            params: Optional steps, width, height, seed, guidance_scale and negative_prompt;
+                missing ones keep the model defaults
+        """
+        self.generateBatch([prompt], params)
+
+    @Slot(str)
+    def generateDraft(self, prompt: str) -> None:
+        """Queue a fast low-step draft; re-render keepers with `generateImage` and `lastSeed`"""
+        self.generateImage(prompt, {"steps": self._draft_steps})
+
+    @Slot(str)
+    def generatePreview(self, prompt: str) -> None:
+        """Queue a quick low-resolution preview of the prompt"""
+        job_ids = self._enqueue([prompt], self._requestOptions(preview=True)) if prompt else []
+        if job_ids:
+            logger.info(f"Queued preview job, {self._inFlight()} request(s) in flight")
+
+    @Slot(list)
+    @Slot(list, dict)
+    def generateBatch(self, prompts: list, params: Optional[dict] = None) -> None:
+        """Queue several prompts; up to `max_in_flight` of them run concurrently"""
+        try:
+            options = self._requestOptions(params)
+        except ValueError as e:
+            logger.warning(f"Invalid generation parameters: {str(e)}")
+            self.errorOccurred.emit(str(e))
+            return
+
+        try:
+            prompts = [prompt for prompt in prompts if prompt]
+            if not prompts:
+                return
+
+            job_ids = self._enqueue(prompts, options)
+            if job_ids:
+                logger.info(f"Queued {len(job_ids)} generation job(s), {self._inFlight()} request(s) in flight")
+
+        except Exception as e:
+            logger.error(f"Error starting generation: {str(e)}", exc_info=True)
+            self._pending.clear()
+            if not self._workers:
+                self._loading = False
+                self.loadingChanged.emit(False)
             self.errorOccurred.emit(str(e))
 
+    @Slot()
+    @Slot(str)
+    def cancelGeneration(self, job_id: str = "") -> None:
+        """Cancel one job by id, or every queued and running job when no id is given"""
+        cancelled = []
+
+        for pending in list(self._pending):
+            if not job_id or pending[0] == job_id:
+                self._pending.remove(pending)
+                cancelled.append((pending[0], pending[2]))
+
+        for running_id in list(self._workers):
+            if not job_id or running_id == job_id:
+                worker = self._workers.pop(running_id, None)
+                if worker is None:
+                    # Already cancelled together with the rest of its batch
+                    continue
+                worker.cancel()
+                for worker_job_id, prompt in worker.jobs:
+                    if worker_job_id == running_id or self._workers.pop(worker_job_id, None):
+                        cancelled.append((worker_job_id, prompt))
+
+        for cancelled_id, prompt in cancelled:
+            self._finishJob(GenerationResult(False, "", "Generation cancelled", cancelled_id, prompt, cancelled=True))
+
+        if cancelled:
+            logger.info(f"Cancelled {len(cancelled)} generation job(s)")
+        self._dispatch()
+
+    @Slot()
+    def clearCache(self) -> None:
+        """Drop every cached generation result"""
+        if self._cache:
+            self._cache.clear()
+            logger.info("Result cache cleared")
+
     @Slot()
     def saveImage(self) -> None:
         """Save the generated image and open it in default viewer"""
@@ -162,21 +472,105 @@ class InferencePipeline(QObject):
         """Copy the deployed to clipboard"""
         ClipboardModel().copyTextToClipboard(self._current_model["deployed_url"])
 
-class ImageGeneratorWorker(QThread):
-    """Worker thread for image generation"""
+def output_options(settings: Optional[dict]) -> dict:
+    """
+    Build the output encoding options sent with every inference request
+
+    Args:
+        settings: The `inference.output` section of the settings
+
+    Returns:
+        Dictionary with format, quality and lossless fields understood by `web_inference`
+    """
+    settings = settings or dict()
+    output_format = str(settings.get("format", DEFAULT_FORMAT)).lower()
+    output_format = "jpeg" if output_format == "jpg" else output_format
+    if output_format not in OUTPUT_MEDIA_TYPES:
+        logger.warning(f"Unsupported output format {output_format}, falling back to {DEFAULT_FORMAT}")
+        output_format = DEFAULT_FORMAT
+
+    return {
+        "format": output_format,
+        "quality": min(100, max(1, int(settings.get("quality", 90)))),
+        "lossless": bool(settings.get("lossless", False)),
+    }
+
+def _parse_seeds(header: Optional[str]) -> List[int]:
+    """Seeds reported by the endpoint in the `X-Seeds` header, one per image"""
+    try:
+        return [int(seed) for seed in (header or "").split(",") if seed.strip()]
+    except ValueError:
+        return []
+
+def accept_header(preferred: Optional[str] = None) -> str:
+    """Accept header listing the preferred format first, for servers that ignore the body field"""
+    preferred = preferred if preferred in OUTPUT_MEDIA_TYPES else DEFAULT_FORMAT
+    media_types = [OUTPUT_MEDIA_TYPES[preferred]]
+    media_types += [media_type for name, media_type in OUTPUT_MEDIA_TYPES.items() if name != preferred]
+    return ", ".join(
+        media_type if i == 0 else f"{media_type};q={1 - i / 10:.1f}"
+        for i, media_type in enumerate(media_types)
+    )
+
+async def _prepend(head: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Yield `head`, then the rest of `chunks`"""
+    if head:
+        yield head
+    async for chunk in chunks:
+        yield chunk
+
+class ImageGeneratorWorker(QObject):
+    """Image generation job run as a coroutine on the shared engine loop"""
     finished = Signal(GenerationResult)
     progress = Signal(int)  # 0-100
+    preview = Signal(str, str)  # job_id, path of an intermediate preview
 
-    def __init__(self, model_url: str, prompt: str) -> None:
+    STREAM_STEP_SHARE = 90  # percent of a streamed job's progress taken by the denoising steps
+
+    def __init__(
+        self,
+        model_url: str,
+        prompt: str,
+        transport: HttpTransport,
+        job_id: str = "",
+        cache: Optional[ResultCache] = None,
+        cache_key: str = "",
+        deadline: Optional[float] = None,
+        options: Optional[dict] = None,
+        stream: bool = False,
+    ) -> None:
         super().__init__()
         self._model_url = model_url
         self._prompt = prompt
+        self._transport = transport
+        self._job_id = job_id
+        self._cache = cache
+        self._cache_key = cache_key
+        self._deadline = deadline
+        self._options = options or dict()
+        self._stream = stream
+        self._seed: Optional[int] = None
         self._status = WorkerStatus.IDLE
+        self._future: Optional[concurrent.futures.Future] = None
 
     @property
     def status(self) -> WorkerStatus:
         return self._status
 
+    @property
+    def jobs(self) -> List[Tuple[str, str]]:
+        """(job_id, prompt) pairs handled by this worker"""
+        return [(self._job_id, self._prompt)]
+
+    def start(self) -> None:
+        """Schedule the job on the engine loop"""
+        self._future = get_engine().submit(self.run())
+
+    def cancel(self) -> None:
+        """Abort the job; cancelling the coroutine closes its connection"""
+        if self._future and not self._future.done():
+            self._future.cancel()
+
     def _get_extension_from_mime(self, content_type: str) -> str:
         """Get file extension from MIME type"""
         mime_to_ext = {
@@ -185,65 +579,583 @@ class ImageGeneratorWorker(QThread):
             'image/png': '.png',
             'image/gif': '.gif',
             'image/webp': '.webp',
-            'image/svg+xml': '.svg'
+            'image/svg+xml': '.svg',
+            'video/mp4': '.mp4',
+            'video/webm': '.webm',
         }
         # Convert to lowercase and strip any parameters
         content_type = content_type.lower().split(';')[0].strip()
         return mime_to_ext.get(content_type, '.jpg')  # Default to .jpg if not found
 
-    def _inference(self, prompt):
+    async def _inference(self, json_data: dict) -> httpx.Response:
+        """Send the request body with the request options and return the response with its body left unread"""
+        json_data = {**json_data, **self._options}
+        headers = {"Accept": accept_header(self._options.get("format"))}
         try:
-            json_data = {"prompt": prompt}
-            response = requests.post(self._model_url, json=json_data)
-            if response.ok:
-                return response, response.content
-            else:
-                logger.error(f"Error: {response.text}")
-                return None, None
-        except Exception as e:
-            logger.error(f"Failed to run model: {str(e)}")
-            return None, None
+            response = await self._transport.post_with_retry(
+                self._model_url, json=json_data, headers=headers, stream=True
+            )
+        except httpx.TimeoutException as e:
+            raise RuntimeError(f"Model did not respond in time ({type(e).__name__})")
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to run model: {str(e)}")
+
+        if not response.is_success:
+            await response.aread()
+            await response.aclose()
+            logger.error(f"Error: {response.text}")
+            raise RuntimeError(f"Model returned HTTP {response.status_code}")
+
+        return response
+
+    def _output_path(self, extension: str, prompt: Optional[str] = None, job_id: Optional[str] = None) -> str:
+        """Build a unique temp file path for the generated output"""
+        prompt = self._prompt if prompt is None else prompt
+        job_id = self._job_id if job_id is None else job_id
+
+        # Create temp directory if it doesn't exist
+        temp_dir = tempfile.gettempdir()
+        if not os.path.exists(temp_dir):
+            os.makedirs(temp_dir, exist_ok=True)
+
+        # Generate unique filename with proper extension
+        app_name = default_settings.get("app")
+        timestamp = int(datetime.now().timestamp())
+        # Batched jobs can finish within the same second, the job id keeps names unique
+        suffix = f"-{job_id[:8]}" if job_id else ""
+        temp_file = f"{prompt}-{app_name}-{timestamp}{suffix}{extension}"
+        return os.path.join(temp_dir, temp_file)
+
+    async def _download(self, response: httpx.Response, path: str, report_progress: bool = True) -> int:
+        """
+        Stream the response body to disk chunk by chunk
+
+        Args:
+            response: Streaming response returned by `_inference`
+            path: Destination file path
+            report_progress: Emit `progress` as the body arrives
 
-    def run(self) -> None:
+        Returns:
+            Number of bytes written
+        """
+        total = int(response.headers.get("content-length") or 0)
+        try:
+            chunks = response.aiter_bytes(chunk_size=self._transport.chunk_size)
+            return await self._save_chunks(chunks, path, total, 0 if report_progress else None)
+        finally:
+            await response.aclose()
+
+    async def _save_chunks(
+        self, chunks: AsyncIterator[bytes], path: str, total: int, progress_from: Optional[int] = 0
+    ) -> int:
+        """
+        Write a body to disk as it arrives, through a `.part` file
+
+        Args:
+            chunks: Body chunks
+            path: Destination file path
+            total: Expected size in bytes, 0 if unknown
+            progress_from: Progress when the body starts, scaled up to 99 as it arrives; None reports nothing
+
+        Returns:
+            Number of bytes written
+        """
+        received = 0
+        last_progress = -1
+        partial_path = f"{path}.part"
+
+        try:
+            with open(partial_path, "wb") as f:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    received += len(chunk)
+
+                    if total and progress_from is not None:
+                        progress = min(99, progress_from + received * (100 - progress_from) // total)
+                        if progress != last_progress:
+                            last_progress = progress
+                            self.progress.emit(progress)
+
+            if total and received < total:
+                raise IOError(f"Incomplete response: received {received} of {total} bytes")
+
+            os.replace(partial_path, path)
+            return received
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def _write_event_image(self, data: dict, suffix: str = "") -> str:
+        """Decode a base64 image carried by a server-sent event into a temp file"""
+        extension = self._get_extension_from_mime(data.get("media_type", ""))
+        path = self._output_path(f"{suffix}{extension}")
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(data["image"]))
+        return path
+
+    async def _receive_stream(self, response: httpx.Response) -> str:
+        """
+        Follow a streamed generation, reporting step progress and previews as they arrive
+
+        The `result` event is followed by the raw bytes of the final image, which are
+        written to disk as they arrive, like a plain response body.
+
+        Args:
+            response: Server-sent event response returned by `_inference`
+
+        Returns:
+            Path of the final image
+        """
+        event, data = "message", []
+        preview_paths = []
+        buffer = bytearray()
+        chunks = response.aiter_bytes(chunk_size=self._transport.chunk_size)
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                while True:
+                    end = buffer.find(b"\n")
+                    if end < 0:
+                        break
+                    line = buffer[:end].decode("utf-8").rstrip("\r")
+                    del buffer[:end + 1]
+                    if line:
+                        field, _, value = line.partition(":")
+                        value = value[1:] if value.startswith(" ") else value
+                        if field == "event":
+                            event = value
+                        elif field == "data":
+                            data.append(value)
+                        continue
+
+                    # A blank line ends the event
+                    payload = json.loads("\n".join(data)) if data else None
+                    current_event, event, data = event, "message", []
+                    if payload is None:
+                        continue
+
+                    if current_event == "progress":
+                        step_progress = payload["step"] * self.STREAM_STEP_SHARE // max(1, payload["total"])
+                        self.progress.emit(min(self.STREAM_STEP_SHARE, step_progress))
+                    elif current_event == "preview":
+                        # A new file per step, so the view notices the change
+                        path = self._write_event_image(payload, f"-preview-{payload['step']}")
+                        preview_paths.append(path)
+                        self.preview.emit(self._job_id, path)
+                    elif current_event == "result":
+                        self._seed = (payload.get("seeds") or [None])[0]
+                        if "image" in payload:
+                            # Endpoints deployed before the image followed the event inline it
+                            return self._write_event_image(payload)
+                        path = self._output_path(self._get_extension_from_mime(payload.get("media_type", "")))
+                        body = _prepend(bytes(buffer), chunks)
+                        if not await self._save_chunks(body, path, int(payload["length"]), self.STREAM_STEP_SHARE):
+                            raise RuntimeError("Empty response from model")
+                        return path
+                    elif current_event == "error":
+                        raise RuntimeError(payload.get("detail") or "Generation failed")
+        finally:
+            await response.aclose()
+            for path in preview_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        raise RuntimeError("Stream ended without a result")
+
+    def _requested_seed(self) -> Optional[int]:
+        return self._options.get("params", dict()).get("seed")
+
+    async def _restore_cached(
+        self, cache_key: str, prompt: Optional[str] = None, job_id: Optional[str] = None
+    ) -> Optional[Tuple[str, dict]]:
+        """
+        Copy a cached output to a new output file
+
+        The cache reads and copies whole files, so this runs on the default executor to keep
+        the engine loop serving other requests meanwhile.
+
+        Returns:
+            (path of the copy, metadata stored with it), or None on a cache miss
+        """
+        if not self._cache:
+            return None
+
+        def restore() -> Optional[Tuple[str, dict]]:
+            cached = self._cache.lookup(cache_key)
+            if not cached:
+                return None
+            cached_path, metadata = cached
+            output_path = self._output_path(os.path.splitext(cached_path)[1], prompt, job_id)
+            shutil.copyfile(cached_path, output_path)
+            return output_path, metadata
+
+        return await asyncio.get_running_loop().run_in_executor(None, restore)
+
+    async def _store_cached(self, cache_key: str, path: str, seed: Optional[int]) -> None:
+        """Add an output to the cache; hashing and copying it runs on the default executor"""
+        if self._cache:
+            await asyncio.get_running_loop().run_in_executor(None, self._cache.put, cache_key, path, {"seed": seed})
+
+    async def _cached_result(self) -> Optional[GenerationResult]:
+        """Copy of a cached output for this job, or None on a cache miss"""
+        cached = await self._restore_cached(self._cache_key)
+        if not cached:
+            return None
+        generated_image_path, metadata = cached
+
+        logger.info(f"Cache hit for prompt: {self._prompt}")
+        self.progress.emit(100)
+        # Entries cached before seeds were stored fall back to the requested seed
+        seed = metadata.get("seed")
+        return GenerationResult(
+            True, generated_image_path, "", self._job_id, self._prompt,
+            seed=self._requested_seed() if seed is None else seed, cached=True,
+        )
+
+    async def _generate(self) -> GenerationResult:
+        cached = await self._cached_result()
+        if cached:
+            return cached
+
+        response = await self._inference({"prompt": self._prompt, "stream": self._stream})
+
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            generated_image_path = await self._receive_stream(response)
+            await self._store_cached(self._cache_key, generated_image_path, self._seed)
+            self.progress.emit(100)
+            return GenerationResult(True, generated_image_path, "", self._job_id, self._prompt, seed=self._seed)
+
+        # Endpoints deployed before streaming was added answer with the image directly
+        if 'content-type' in response.headers:
+            extension = self._get_extension_from_mime(response.headers['content-type'])
+        else:
+            extension = '.jpg'  # Default extension
+            logger.warning("Content-type not found in response, using default extension .jpg")
+
+        generated_image_path = self._output_path(extension)
+        if not await self._download(response, generated_image_path):
+            raise RuntimeError("Empty response from model")
+
+        seeds = _parse_seeds(response.headers.get("x-seeds"))
+        seed = seeds[0] if seeds else None
+        await self._store_cached(self._cache_key, generated_image_path, seed)
+
+        self.progress.emit(100)
+        return GenerationResult(True, generated_image_path, "", self._job_id, self._prompt, seed=seed)
+
+    async def run(self) -> None:
         try:
             self._status = WorkerStatus.RUNNING
             logger.info(f"Starting image generation for prompt: {self._prompt}")
 
-            response, image_bytes = self._inference(self._prompt)
-            if not image_bytes:
-                self._status = WorkerStatus.ERROR
-                self.finished.emit(GenerationResult(False, "", "Failed to inference"))
-                return
+            result = await asyncio.wait_for(self._generate(), timeout=self._deadline)
+            self._status = WorkerStatus.COMPLETED
+            self.finished.emit(result)
 
-            # Get file extension from response content-type
-            if response and 'content-type' in response.headers:
-                extension = self._get_extension_from_mime(response.headers['content-type'])
+        except asyncio.TimeoutError:
+            error_msg = f"Generation exceeded its {self._deadline:g}s deadline"
+            logger.error(error_msg)
+            self._status = WorkerStatus.ERROR
+            self.finished.emit(GenerationResult(False, "", error_msg, self._job_id, self._prompt))
+
+        except asyncio.CancelledError:
+            logger.info(f"Generation cancelled for prompt: {self._prompt}")
+            self._status = WorkerStatus.CANCELLED
+            self.finished.emit(GenerationResult(False, "", "Generation cancelled", self._job_id, self._prompt, cancelled=True))
+
+        except Exception as e:
+            logger.error(f"Error in image generation: {str(e)}", exc_info=True)
+            self._status = WorkerStatus.ERROR
+            self.finished.emit(GenerationResult(False, "", str(e), self._job_id, self._prompt))
+
+class VideoJobWorker(ImageGeneratorWorker):
+    """
+    Runs a generation as a job on the server: submit it, poll its progress and download the result
+
+    Used for models whose `web_inference` answers with a job id, because a generation takes
+    minutes and would not fit in a single request.
+    """
+
+    MAX_POLL_FAILURES = 5
+
+    def __init__(
+        self,
+        model_url: str,
+        prompt: str,
+        transport: HttpTransport,
+        job_id: str = "",
+        cache: Optional[ResultCache] = None,
+        cache_key: str = "",
+        deadline: Optional[float] = None,
+        options: Optional[dict] = None,
+        poll_interval: float = 2.0,
+        poll_max_interval: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            model_url: URL of the deployed `web_inference` endpoint that submits jobs
+            poll_interval: Seconds between status checks while the job makes progress
+            poll_max_interval: Cap in seconds for the delay while the job is queued or booting
+        """
+        super().__init__(
+            model_url, prompt, transport, job_id,
+            cache=cache, cache_key=cache_key, deadline=deadline, options=options,
+        )
+        self._poll_interval = max(0.1, poll_interval)
+        self._poll_max_interval = max(self._poll_interval, poll_max_interval)
+        self._remote_cancel: Optional[asyncio.Task] = None
+
+    def _endpoint(self, name: str) -> str:
+        url = derive_endpoint_url(self._model_url, name)
+        if not url:
+            raise RuntimeError(f"Cannot derive the `{name}` endpoint from {self._model_url}")
+        return url
+
+    async def _submit(self) -> str:
+        """Queue the generation and return the server's job id"""
+        body = {"prompt": self._prompt}
+        if self._options.get("params"):
+            body["params"] = self._options["params"]
+        try:
+            # Retries are safe: the server runs one job per idempotency key
+            response = await self._transport.post_with_retry(
+                self._model_url, json=body, headers={"Idempotency-Key": self._job_id}
+            )
+            if not response.is_success:
+                logger.error(f"Error: {response.text}")
+                raise RuntimeError(f"Model returned HTTP {response.status_code}")
+            return response.json()["job_id"]
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to submit job: {str(e)}")
+        except (ValueError, KeyError):
+            raise RuntimeError("Model did not return a job id")
+
+    async def _wait(self, remote_id: str) -> None:
+        """
+        Poll the job until it completes, backing off while it makes no progress
+
+        Raises:
+            RuntimeError: If the job failed or its status could not be read repeatedly
+        """
+        url = self._endpoint("status")
+        delay, failures, last_step = self._poll_interval, 0, None
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                response = await self._transport.get(url, params={"job_id": remote_id})
+                response.raise_for_status()
+                state = response.json()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code < 500:
+                    raise RuntimeError(f"Job {remote_id} is gone (HTTP {e.response.status_code})")
+                error = e
+            except (httpx.HTTPError, ValueError) as e:
+                error = e
             else:
-                extension = '.jpg'  # Default extension
-                logger.warning("Content-type not found in response, using default extension .jpg")
-
-            # Create temp directory if it doesn't exist
-            temp_dir = tempfile.gettempdir()
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir, exist_ok=True)
-
-            # Generate unique filename with proper extension
-            app_name = default_settings.get("app")
-            timestamp = int(datetime.now().timestamp())
-            temp_file = f"{self._prompt}-{app_name}-{timestamp}{extension}"
-            generated_image_path = os.path.join(temp_dir, temp_file)
-
-            # Save the image
-            with open(generated_image_path, "wb") as f:
-                f.write(image_bytes)
-
-            # import time
-            # time.sleep(2)
-            # generated_image_path = "/home/tamnv/Downloads/ohmyicon-a-plum.jpg"
+                failures = 0
+                status = state.get("status")
+                if status == "completed":
+                    return
+                if status == "failed":
+                    raise RuntimeError(state.get("error") or "Generation failed")
+
+                step, total = state.get("step"), state.get("total")
+                if step and total:
+                    self.progress.emit(min(99, step * 100 // total))
+                # Poll at the base rate while steps advance, back off while queued or booting
+                delay = self._poll_interval if step != last_step else min(self._poll_max_interval, delay * 1.5)
+                last_step = step
+                continue
+
+            failures += 1
+            if failures >= self.MAX_POLL_FAILURES:
+                raise RuntimeError(f"Lost track of job {remote_id}: {str(error)}")
+            logger.warning(f"Status check {failures}/{self.MAX_POLL_FAILURES} for job {remote_id} failed: {str(error)}")
+            delay = min(self._poll_max_interval, delay * 2)
+
+    async def _fetch(self, remote_id: str) -> str:
+        """Stream the finished video to a temp file and return its path"""
+        try:
+            response = await self._transport.get(
+                self._endpoint("result"), params={"job_id": remote_id}, stream=True
+            )
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to download result: {str(e)}")
+
+        if not response.is_success:
+            await response.aread()
+            await response.aclose()
+            logger.error(f"Error: {response.text}")
+            raise RuntimeError(f"Model returned HTTP {response.status_code}")
+
+        path = self._output_path(self._get_extension_from_mime(response.headers.get("content-type", "video/mp4")))
+        # Step progress is already at 99%, the download would restart it from zero
+        if not await self._download(response, path, report_progress=False):
+            raise RuntimeError("Empty response from model")
+        return path
+
+    async def _cancel_job(self, remote_id: str) -> None:
+        try:
+            await self._transport.post(self._endpoint("cancel"), params={"job_id": remote_id})
+            logger.info(f"Cancelled job {remote_id}")
+        except (httpx.HTTPError, RuntimeError) as e:
+            logger.warning(f"Could not cancel job {remote_id}: {str(e)}")
+
+    async def _generate(self) -> GenerationResult:
+        cached = await self._cached_result()
+        if cached:
+            return cached
+
+        remote_id = await self._submit()
+        logger.info(f"Submitted job {remote_id} for prompt: {self._prompt}")
+        try:
+            await self._wait(remote_id)
+        except asyncio.CancelledError:
+            # Cancelled or past the deadline; stop the GPU job too, nobody is waiting for it
+            self._remote_cancel = asyncio.ensure_future(self._cancel_job(remote_id))
+            raise
+
+        generated_path = await self._fetch(remote_id)
+        # Job results do not report their seed; only requests with an explicit seed are cached
+        seed = self._requested_seed()
+        await self._store_cached(self._cache_key, generated_path, seed)
+        self.progress.emit(100)
+        return GenerationResult(True, generated_path, "", self._job_id, self._prompt, seed=seed)
+
+class BatchGeneratorWorker(ImageGeneratorWorker):
+    """Sends several prompts to the endpoint in one batched `web_inference` call"""
+
+    def __init__(
+        self,
+        model_url: str,
+        jobs: List[Tuple[str, str, str]],
+        transport: HttpTransport,
+        cache: Optional[ResultCache] = None,
+        deadline: Optional[float] = None,
+        options: Optional[dict] = None,
+    ) -> None:
+        """
+        Args:
+            model_url: URL of the deployed `web_inference` endpoint
+            jobs: (job_id, prompt, cache_key) for every prompt in the batch
+            transport: Shared HTTP transport
+            cache: Result cache, checked per prompt before the request is sent
+            deadline: Seconds the whole batch may take
+            options: Output encoding options sent with the request
+        """
+        super().__init__(model_url, "", transport, cache=cache, deadline=deadline, options=options)
+        self._jobs = jobs
+        self._reported: set = set()
+
+    @property
+    def jobs(self) -> List[Tuple[str, str]]:
+        return [(job_id, prompt) for job_id, prompt, _ in self._jobs]
+
+    def _report(self, result: GenerationResult) -> None:
+        self._reported.add(result.job_id)
+        self.finished.emit(result)
+
+    def _extract(
+        self, archive_path: str, jobs: List[Tuple[str, str, str]], seeds: List[int]
+    ) -> List[Tuple[str, str, str, str, Optional[int]]]:
+        """
+        Copy the first image generated for each prompt out of the response archive
+
+        Returns:
+            (job_id, prompt, cache_key, output path, seed) of every extracted image
+        """
+        extracted = []
+        with zipfile.ZipFile(archive_path) as archive:
+            for name in sorted(archive.namelist()):
+                # Entries are named `{prompt_index}_{image_index}{extension}`
+                prompt_index, _, rest = name.partition("_")
+                image_index, extension = os.path.splitext(rest)
+                if image_index != "0" or not prompt_index.isdigit() or int(prompt_index) >= len(jobs):
+                    continue
+
+                job_id, prompt, cache_key = jobs[int(prompt_index)]
+                output_path = self._output_path(extension, prompt, job_id)
+                with archive.open(name) as src, open(output_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+
+                seed = seeds[int(prompt_index)] if int(prompt_index) < len(seeds) else None
+                extracted.append((job_id, prompt, cache_key, output_path, seed))
+        return extracted
+
+    async def _generate_batch(self) -> None:
+        misses = []
+        for job_id, prompt, cache_key in self._jobs:
+            cached = await self._restore_cached(cache_key, prompt, job_id)
+            if cached:
+                output_path, metadata = cached
+                logger.info(f"Cache hit for prompt: {prompt}")
+                self._report(GenerationResult(
+                    True, output_path, "", job_id, prompt, seed=metadata.get("seed"), cached=True
+                ))
+            else:
+                misses.append((job_id, prompt, cache_key))
+
+        if not misses:
+            return
+
+        response = await self._inference({"prompts": [prompt for _, prompt, _ in misses]})
+        content_type = response.headers.get("content-type", "")
+        seeds = _parse_seeds(response.headers.get("x-seeds"))
+
+        if content_type.lower().startswith("application/zip"):
+            archive_path = self._output_path(".zip", "batch", misses[0][0])
+            try:
+                await self._download(response, archive_path)
+                # Unzipping blocks, keep it off the engine loop
+                extracted = await asyncio.get_running_loop().run_in_executor(
+                    None, self._extract, archive_path, misses, seeds
+                )
+            finally:
+                if os.path.exists(archive_path):
+                    os.remove(archive_path)
+            for job_id, prompt, cache_key, output_path, seed in extracted:
+                await self._store_cached(cache_key, output_path, seed)
+                self._report(GenerationResult(True, output_path, "", job_id, prompt, seed=seed))
+        else:
+            # A single image comes back as-is
+            job_id, prompt, cache_key = misses[0]
+            output_path = self._output_path(self._get_extension_from_mime(content_type), prompt, job_id)
+            await self._download(response, output_path)
+            seed = seeds[0] if seeds else None
+            await self._store_cached(cache_key, output_path, seed)
+            self._report(GenerationResult(True, output_path, "", job_id, prompt, seed=seed))
+
+        for job_id, prompt, _ in misses:
+            if job_id not in self._reported:
+                self._report(GenerationResult(False, "", "Missing from batch response", job_id, prompt))
+
+    async def run(self) -> None:
+        try:
+            self._status = WorkerStatus.RUNNING
+            logger.info(f"Starting batched generation for {len(self._jobs)} prompt(s)")
+
+            await asyncio.wait_for(self._generate_batch(), timeout=self._deadline)
             self._status = WorkerStatus.COMPLETED
-            self.finished.emit(GenerationResult(True, generated_image_path, ""))
+            return
+
+        except asyncio.TimeoutError:
+            error_msg = f"Generation exceeded its {self._deadline:g}s deadline"
+            logger.error(error_msg)
+            self._status = WorkerStatus.ERROR
+            result = GenerationResult(False, "", error_msg)
+
+        except asyncio.CancelledError:
+            logger.info("Batched generation cancelled")
+            self._status = WorkerStatus.CANCELLED
+            result = GenerationResult(False, "", "Generation cancelled", cancelled=True)
 
         except Exception as e:
-            logger.error(f"Error in image generation: {str(e)}", exc_info=True)
+            logger.error(f"Error in batched generation: {str(e)}", exc_info=True)
             self._status = WorkerStatus.ERROR
-            self.finished.emit(GenerationResult(False, "", error_message=str(e)))
+            result = GenerationResult(False, "", str(e))
+
+        for job_id, prompt, _ in self._jobs:
+            if job_id not in self._reported:
+                self._report(dataclasses.replace(result, job_id=job_id, prompt=prompt))
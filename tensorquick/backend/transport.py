@@ -0,0 +1,233 @@
+import time
+import random
+import asyncio
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from loguru import logger
+
+class RetryPolicy:
+    """Jittered exponential backoff for transient inference failures"""
+
+    RETRY_STATUS_CODES = frozenset({500, 502, 503, 504})
+
+    def __init__(self, max_attempts: int = 3, backoff_base: float = 1.0, backoff_max: float = 20.0) -> None:
+        """
+        Args:
+            max_attempts: Total number of attempts, including the first one
+            backoff_base: Upper bound in seconds of the delay after the first failure
+            backoff_max: Cap in seconds for any single delay
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @classmethod
+    def from_settings(cls, settings: Optional[dict]) -> "RetryPolicy":
+        """Create a policy from the `inference.retry` section of the settings"""
+        settings = settings or dict()
+        return cls(
+            max_attempts=int(settings.get("max_attempts", 3)),
+            backoff_base=float(settings.get("backoff_base", 1.0)),
+            backoff_max=float(settings.get("backoff_max", 20.0)),
+        )
+
+    def should_retry(self, status_code: int) -> bool:
+        return status_code in self.RETRY_STATUS_CODES
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter delay before the attempt following `attempt` (1-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+class HostPoolTransport(httpx.AsyncBaseTransport):
+    """
+    Routes every request to a connection pool of its own origin
+
+    Each Modal web endpoint has its own host name, so a limit on one shared pool would let
+    one busy endpoint take the connections of the others. Pools are created on first use
+    and kept until the transport is closed.
+    """
+
+    def __init__(self, limits: httpx.Limits) -> None:
+        """
+        Args:
+            limits: Limits applied to each host's pool separately
+        """
+        self._limits = limits
+        self._pools: Dict[Tuple[bytes, bytes, Optional[int]], httpx.AsyncHTTPTransport] = dict()
+
+    def _pool(self, url: httpx.URL) -> httpx.AsyncHTTPTransport:
+        origin = (url.raw_scheme, url.raw_host, url.port)
+        pool = self._pools.get(origin)
+        if pool is None:
+            pool = httpx.AsyncHTTPTransport(limits=self._limits)
+            self._pools[origin] = pool
+        return pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool(request.url).handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pools, self._pools = list(self._pools.values()), dict()
+        for pool in pools:
+            await pool.aclose()
+
+class HttpTransport:
+    """Connection-pooled async HTTP transport shared by inference jobs"""
+
+    def __init__(
+        self,
+        pool_maxsize: int = 8,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 300.0,
+        chunk_size: int = 64 * 1024,
+        cold_read_timeout: float = 600.0,
+        container_idle_timeout: float = 60.0,
+        retry: Optional[RetryPolicy] = None,
+    ) -> None:
+        """
+        Args:
+            pool_maxsize: Maximum number of keep-alive connections kept per host
+            connect_timeout: Seconds to wait for the TCP/TLS connection
+            read_timeout: Seconds to wait between bytes of the response
+            chunk_size: Bytes read per iteration when streaming a response body
+            cold_read_timeout: First-byte timeout used when the endpoint has likely scaled to zero
+            container_idle_timeout: Idle seconds after which a deployed container is assumed cold
+            retry: Policy applied by `post_with_retry`
+        """
+        self._timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=connect_timeout,
+            pool=None,
+        )
+        self._cold_timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=max(read_timeout, cold_read_timeout),
+            write=connect_timeout,
+            pool=None,
+        )
+        self._container_idle_timeout = container_idle_timeout
+        self._last_success: Dict[str, float] = dict()
+        self._retry = retry or RetryPolicy()
+        self._limits = httpx.Limits(max_connections=None, max_keepalive_connections=pool_maxsize)
+        self._chunk_size = chunk_size
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_settings(cls, settings: Optional[dict]) -> "HttpTransport":
+        """Create a transport from the `inference` section of the settings"""
+        settings = settings or dict()
+        return cls(
+            pool_maxsize=int(settings.get("pool_maxsize", 8)),
+            connect_timeout=float(settings.get("connect_timeout", 10.0)),
+            read_timeout=float(settings.get("read_timeout", 300.0)),
+            chunk_size=int(settings.get("chunk_size", 64 * 1024)),
+            cold_read_timeout=float(settings.get("cold_read_timeout", 600.0)),
+            container_idle_timeout=float(settings.get("container_idle_timeout", 60.0)),
+            retry=RetryPolicy.from_settings(settings.get("retry")),
+        )
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return self._timeout
+
+    @property
+    def cold_timeout(self) -> httpx.Timeout:
+        return self._cold_timeout
+
+    @property
+    def chunk_size(self) -> int:
+        return self._chunk_size
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the client is bound to the engine's event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout, transport=HostPoolTransport(self._limits))
+        return self._client
+
+    async def post(self, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """
+        Send a POST request over a pooled keep-alive connection
+
+        With `stream=True` the body is left unread; the caller must `aclose()` the response.
+        """
+        request = self.client.build_request("POST", url, **kwargs)
+        return await self.client.send(request, stream=stream)
+
+    async def get(self, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """Send a GET request over a pooled keep-alive connection"""
+        request = self.client.build_request("GET", url, **kwargs)
+        return await self.client.send(request, stream=stream)
+
+    def is_likely_cold(self, url: str) -> bool:
+        """Whether the endpoint has been idle long enough for its container to scale down"""
+        last_success = self._last_success.get(urlsplit(url).netloc)
+        return last_success is None or time.monotonic() - last_success > self._container_idle_timeout
+
+    def seconds_since_success(self, url: str) -> Optional[float]:
+        """Seconds since the endpoint last answered, or None if it never did"""
+        last_success = self._last_success.get(urlsplit(url).netloc)
+        return None if last_success is None else time.monotonic() - last_success
+
+    def mark_warm(self, url: str) -> None:
+        """Record that the endpoint just answered a request"""
+        self._last_success[urlsplit(url).netloc] = time.monotonic()
+
+    async def post_with_retry(self, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """
+        POST with jittered exponential backoff on 5xx, timeouts and dropped connections
+
+        Requests to an endpoint that is likely cold get the longer first-byte timeout.
+
+        Returns:
+            The first successful response, or the last failed one once retries are exhausted
+            or the status is not retryable
+
+        Raises:
+            httpx.TransportError: If the final attempt failed before a response arrived
+        """
+        for attempt in range(1, self._retry.max_attempts + 1):
+            cold = self.is_likely_cold(url)
+            timeout = self._cold_timeout if cold else self._timeout
+            start = time.perf_counter()
+            try:
+                response = await self.post(url, stream=stream, timeout=timeout, **kwargs)
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {str(e) or 'no details'}"
+                transport_error = e
+                response = None
+            else:
+                if response.is_success:
+                    self.mark_warm(url)
+                    logger.info(
+                        f"Attempt {attempt}/{self._retry.max_attempts} to {url} got first byte "
+                        f"in {time.perf_counter() - start:.2f}s{' (cold start)' if cold else ''}"
+                    )
+                    return response
+                if not self._retry.should_retry(response.status_code):
+                    return response
+                error = f"HTTP {response.status_code}"
+
+            logger.warning(
+                f"Attempt {attempt}/{self._retry.max_attempts} to {url} failed after "
+                f"{time.perf_counter() - start:.2f}s{' (cold start)' if cold else ''}: {error}"
+            )
+            if attempt == self._retry.max_attempts:
+                if response is None:
+                    raise transport_error
+                return response
+
+            if response is not None:
+                await response.aclose()
+            delay = self._retry.delay(attempt)
+            logger.info(f"Retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        """Close all pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
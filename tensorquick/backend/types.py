@@ -18,6 +18,7 @@ class WorkerStatus(Enum):
     RUNNING = auto()
     COMPLETED = auto()
     ERROR = auto()
+    CANCELLED = auto()
 
 
 @dataclass
@@ -26,3 +27,8 @@ class GenerationResult:
     success: bool
     image_path: Optional[str] = None
     error_message: Optional[str] = None
+    job_id: Optional[str] = None
+    prompt: Optional[str] = None
+    cached: bool = False
+    cancelled: bool = False
+    seed: Optional[int] = None
@@ -0,0 +1,119 @@
+import time
+import asyncio
+from typing import Dict, Optional, Set
+
+import httpx
+from loguru import logger
+from PySide6.QtCore import QObject, Signal, QTimer
+
+from tensorquick.backend.engine import get_engine
+from tensorquick.backend.transport import HttpTransport
+
+class EndpointWarmer(QObject):
+    """Wakes the selected deployed model and keeps its container warm while the app is in use"""
+    warmed = Signal(str, bool, float)  # url, success, seconds
+
+    def __init__(self, transport: HttpTransport, settings: Optional[dict] = None) -> None:
+        """
+        Args:
+            transport: Shared transport, so pings and generations agree on warm state
+            settings: The `warmup` section of the settings
+        """
+        super().__init__()
+        settings = settings or dict()
+        self._transport = transport
+        self._on_select = bool(settings.get("on_select", False))
+        self._keep_warm = bool(settings.get("keep_warm", False))
+        self._min_interval = float(settings.get("min_interval", 30))
+        self._url: str = ""
+        self._fallbacks: Dict[str, str] = dict()  # health url -> inference url
+        self._no_health: Set[str] = set()  # health urls that answered 404
+        self._active: bool = True
+        self._last_ping: Dict[str, float] = dict()
+        self._in_flight: Dict[str, bool] = dict()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(float(settings.get("interval", 50)) * 1000))
+        self._timer.timeout.connect(self._onTimeout)
+
+    @property
+    def keep_warm(self) -> bool:
+        return self._keep_warm
+
+    @keep_warm.setter
+    def keep_warm(self, enabled: bool) -> None:
+        self._keep_warm = enabled
+        self._updateTimer()
+
+    def setTarget(self, url: str, fallback_url: str = "") -> None:
+        """
+        Switch to a newly selected endpoint, warming it right away if enabled
+
+        Args:
+            url: Health route of the selected model
+            fallback_url: Inference route, pinged instead on deployments without a health route
+        """
+        self._url = url or ""
+        if self._url and fallback_url and fallback_url != self._url:
+            self._fallbacks[self._url] = fallback_url
+        if self._url and self._on_select:
+            self.warm(self._url)
+        self._updateTimer()
+
+    def setActive(self, active: bool) -> None:
+        """Pause keep-warm pings while the application is not in focus"""
+        self._active = active
+        self._updateTimer()
+
+    def _updateTimer(self) -> None:
+        if self._keep_warm and self._active and self._url:
+            if not self._timer.isActive():
+                self._timer.start()
+        else:
+            self._timer.stop()
+
+    def _onTimeout(self) -> None:
+        # A recent generation already kept the container alive
+        idle = self._transport.seconds_since_success(self._url)
+        if idle is not None and idle < self._timer.interval() / 1000:
+            return
+        self.warm(self._url)
+
+    def warm(self, url: str) -> None:
+        """Ping the endpoint unless it was pinged within `min_interval` seconds"""
+        now = time.monotonic()
+        if self._in_flight.get(url) or now - self._last_ping.get(url, float("-inf")) < self._min_interval:
+            return
+
+        self._last_ping[url] = now
+        self._in_flight[url] = True
+        get_engine().submit(self._ping(url))
+
+    async def _ping(self, url: str) -> None:
+        start = time.perf_counter()
+        success = False
+        fallback_url = self._fallbacks.get(url, "")
+        try:
+            target = fallback_url if url in self._no_health else url
+            response = await self._transport.get(target, timeout=self._transport.cold_timeout)
+            if response.status_code == 404 and target == url and fallback_url:
+                # Deployments older than the health route only serve the inference route
+                logger.info(f"{url} has no health route, warming {fallback_url} instead")
+                self._no_health.add(url)
+                target = fallback_url
+                response = await self._transport.get(target, timeout=self._transport.cold_timeout)
+
+            # The inference route only takes POST; its 405 still comes from a running container
+            success = response.is_success or (target == fallback_url and response.status_code == 405)
+            if success:
+                self._transport.mark_warm(target)
+            else:
+                logger.warning(f"Warm-up ping to {target} answered HTTP {response.status_code}")
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            logger.warning(f"Warm-up ping to {url} failed: {str(e)}")
+        finally:
+            self._in_flight[url] = False
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Warm-up ping to {url} {'succeeded' if success else 'failed'} in {elapsed:.2f}s")
+        self.warmed.emit(url, success, elapsed)
@@ -0,0 +1,96 @@
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+# Deploy-time settings of a deploy script, e.g. `BUNCHA_GPU_TYPE = "H100"`
+BUNCHA_LINE = re.compile(r'^(\s*)(BUNCHA_[^=\s]+)\s*=\s*"[^"]*"\s*$', re.MULTILINE)
+LOCAL_IMPORT = re.compile(r"^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))", re.MULTILINE)
+
+def script_sources(script: Path) -> List[Path]:
+    """The script followed by the sibling modules it imports, e.g. the shared deploy helpers"""
+    content = script.read_text()
+    names = sorted({name for match in LOCAL_IMPORT.finditer(content) for name in match.groups() if name})
+    siblings = [script.parent / f"{name}.py" for name in names]
+    return [script] + [path for path in siblings if path.exists()]
+
+def render_script(content: str, envs: Optional[Dict[str, str]]) -> str:
+    """Replace the value of every `BUNCHA_*` line that has an override in `envs`"""
+    envs = envs or dict()
+
+    def replace(match: re.Match) -> str:
+        indent, key = match.group(1), match.group(2)
+        if key not in envs:
+            return match.group(0)
+        value = str(envs[key]).replace("\\", "\\\\").replace('"', '\\"')
+        return f'{indent}{key} = "{value}"'
+
+    return BUNCHA_LINE.sub(replace, content)
+
+class DeployWorkspace:
+    """
+    Temporary directory holding a rendered copy of a deploy script
+
+    The packaged scripts are templates and are never written to. Each deployment renders
+    its `BUNCHA_*` overrides into its own copy, next to copies of the helper modules the
+    script mounts from its own directory, so deployments with different settings cannot
+    overwrite each other's script and the installed package can stay read-only.
+    """
+
+    def __init__(self, script: Path) -> None:
+        """
+        Args:
+            script: Packaged deploy script used as the template
+        """
+        self._script = Path(script)
+        self._path: Optional[Path] = None
+
+    @property
+    def path(self) -> Optional[Path]:
+        return self._path
+
+    def render(self, envs: Optional[Dict[str, str]] = None) -> Path:
+        """
+        Copy the script and its helper modules into a new directory, with `envs` applied
+
+        Returns:
+            Path of the rendered script, under the same file name as the template
+        """
+        self.cleanup()
+        self._path = Path(tempfile.mkdtemp(prefix=f"tensorquick-{self._script.stem}-"))
+        try:
+            script, *siblings = script_sources(self._script)
+            rendered = self._path / script.name
+            rendered.write_text(render_script(script.read_text(), envs))
+            for sibling in siblings:
+                shutil.copyfile(sibling, self._path / sibling.name)
+        except Exception:
+            self.cleanup()
+            raise
+
+        unused = sorted(set(envs or dict()) - set(match.group(2) for match in BUNCHA_LINE.finditer(rendered.read_text())))
+        if unused:
+            logger.debug(f"{self._script.name} has no setting for {', '.join(unused)}")
+        return rendered
+
+    def environment(self, envs: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Environment of the `modal` process: the current one with `envs` on top"""
+        env = os.environ.copy()
+        env.update({key: str(value) for key, value in (envs or dict()).items()})
+        return env
+
+    def cleanup(self) -> None:
+        """Remove the workspace directory, if it was created"""
+        if self._path is not None:
+            shutil.rmtree(self._path, ignore_errors=True)
+            self._path = None
+
+    def __enter__(self) -> "DeployWorkspace":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
@@ -10,6 +10,7 @@ from tensorquick.backend.builder import ModelBuilder
 from tensorquick.backend.settings import DefaultSettings, SessionSettings
 from tensorquick.backend.clipboard import ClipboardModel
 from tensorquick.backend.image_provider import ImageProvider
+from tensorquick.backend.engine import get_engine
 from tensorquick.compile_resources import maybe_compile
 
 maybe_compile()
@@ -39,6 +40,9 @@ def main() -> int:
         clipboard = ClipboardModel()
         image_provider = ImageProvider()
 
+        # Backend jobs run on a single event loop; stop it with the application
+        app.aboutToQuit.connect(get_engine().shutdown)
+
         engine.rootContext().setContextProperty("inferencePipeline", inference_pipeline)
         engine.rootContext().setContextProperty("modelBuilder", model_builder)
         engine.rootContext().setContextProperty("defaultSettings", default_settings)
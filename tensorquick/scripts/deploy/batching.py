@@ -0,0 +1,124 @@
+# Dynamic request batching shared by the deploy scripts.
+#
+# Concurrent `web_inference` calls on one container each submit their work here.
+# The batcher waits a few milliseconds for more callers, runs one batched forward
+# pass for everything compatible, and hands each caller its own slice of the output.
+# It only depends on the standard library so it can be mounted into any image
+# and driven by a CPU stub pipeline locally.
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, List, Optional
+
+
+@dataclass
+class _Request:
+    item: Any
+    size: int
+    key: Hashable
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class MicroBatcher:
+    """Collects concurrent requests and runs them as one batch"""
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+    ):
+        """
+        Args:
+            run_batch: Blocking function mapping a list of items to a list of results,
+                one per item; it runs in a worker thread so the event loop keeps accepting requests
+            max_batch_size: Upper bound on the summed `size` of the items in one batch
+            max_wait_ms: How long the first request of a batch waits for company
+        """
+        self._run_batch = run_batch
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._pending: List[_Request] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batches_run = 0
+        self.items_run = 0
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.items_run / self.batches_run if self.batches_run else 0.0
+
+    async def submit(self, item: Any, size: int = 1, key: Hashable = None) -> Any:
+        """
+        Queue an item and wait for its result
+
+        Args:
+            item: Work for `run_batch`
+            size: How much of `max_batch_size` the item takes, e.g. its number of images
+            key: Only items with equal keys are batched together
+        """
+        if size > self._max_batch_size:
+            raise ValueError(f"Request of size {size} exceeds the batch limit of {self._max_batch_size}")
+
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._loop())
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Request(item, size, key, future))
+        self._wakeup.set()
+        return await future
+
+    def _take_batch(self) -> List[_Request]:
+        """Pop the oldest request and every compatible one that still fits"""
+        head = self._pending[0]
+        batch, total = [], 0
+        for request in list(self._pending):
+            if request.key == head.key and total + request.size <= self._max_batch_size:
+                batch.append(request)
+                total += request.size
+                self._pending.remove(request)
+        return batch
+
+    def _batch_is_full(self) -> bool:
+        head = self._pending[0]
+        return sum(r.size for r in self._pending if r.key == head.key) >= self._max_batch_size
+
+    async def _loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            # Give concurrent callers a short window to join the batch
+            deadline = self._pending[0].enqueued_at + self._max_wait
+            while not self._batch_is_full() and time.monotonic() < deadline:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [r for r in self._take_batch() if not r.future.cancelled()]
+            if not batch:
+                continue
+
+            try:
+                results = await loop.run_in_executor(None, self._run_batch, [r.item for r in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch returned {len(results)} results for {len(batch)} requests")
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.items_run += len(batch)
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(result)
@@ -0,0 +1,99 @@
+# Output encoding shared by the deploy scripts.
+#
+# Clients pick the image format either explicitly in the request body or through
+# the Accept header, and otherwise get the `DEFAULT_FORMAT` shared with the client
+# through params.py. WebP is usually the smallest payload for the same quality;
+# PNG and lossless WebP keep every pixel. A preview request returns a downscaled
+# copy that is cheap to send for a first look.
+
+import io
+import zipfile
+from typing import List, Optional
+
+from fastapi import Response
+from params import DEFAULT_FORMAT, OUTPUT_MEDIA_TYPES
+
+# format name -> (PIL format, media type, file extension)
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", OUTPUT_MEDIA_TYPES["jpeg"], ".jpg"),
+    "png": ("PNG", OUTPUT_MEDIA_TYPES["png"], ".png"),
+    "webp": ("WEBP", OUTPUT_MEDIA_TYPES["webp"], ".webp"),
+}
+MEDIA_TYPES = {media_type: name for name, (_, media_type, _) in OUTPUT_FORMATS.items()}
+PREVIEW_MAX_SIDE = 384
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """Use the explicitly requested format, else the best supported one in the Accept header"""
+    if requested:
+        requested = requested.lower()
+        requested = "jpeg" if requested == "jpg" else requested
+        if requested in OUTPUT_FORMATS:
+            return requested
+
+    candidates = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type.strip().lower() in MEDIA_TYPES and quality > 0:
+            candidates.append((-quality, position, MEDIA_TYPES[media_type.strip().lower()]))
+
+    return min(candidates)[2] if candidates else DEFAULT_FORMAT
+
+
+def encode_image(image, output_format: str, quality: int = 90, lossless: bool = False, preview: bool = False) -> bytes:
+    """Encode one PIL image, optionally downscaled to a preview"""
+    if preview:
+        image = image.copy()
+        image.thumbnail((PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE))
+
+    pil_format = OUTPUT_FORMATS[output_format][0]
+    options = dict()
+    if pil_format == "JPEG":
+        options = {"quality": quality, "optimize": False}
+    elif pil_format == "WEBP":
+        options = {"quality": quality, "lossless": lossless, "method": 4}
+    elif pil_format == "PNG":
+        # PNG is always lossless; favour encode speed over the last few percent of size
+        options = {"compress_level": 1}
+
+    byte_stream = io.BytesIO()
+    image.save(byte_stream, format=pil_format, **options)
+    return byte_stream.getvalue()
+
+
+def encode_images(
+    images: List,
+    num_images_per_prompt: int,
+    output_format: str = DEFAULT_FORMAT,
+    quality: int = 90,
+    lossless: bool = False,
+    preview: bool = False,
+    headers: Optional[dict] = None,
+) -> Response:
+    """Return one image as-is, or every image in a zip named `{prompt_index}_{image_index}{ext}`"""
+    _, media_type, extension = OUTPUT_FORMATS[output_format]
+    if len(images) == 1:
+        return Response(
+            content=encode_image(images[0], output_format, quality, lossless, preview),
+            media_type=media_type,
+            headers=headers,
+        )
+
+    archive_stream = io.BytesIO()
+    # Image data is already compressed, so the archive only stores it
+    with zipfile.ZipFile(archive_stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        for i, image in enumerate(images):
+            prompt_index, image_index = divmod(i, num_images_per_prompt)
+            archive.writestr(
+                f"{prompt_index:03d}_{image_index}{extension}",
+                encode_image(image, output_format, quality, lossless, preview),
+            )
+    return Response(content=archive_stream.getvalue(), media_type="application/zip", headers=headers)
@@ -11,14 +11,21 @@
 
 # ## Setting up the image and dependencies
 
-import os
 import time
-from io import BytesIO
+import threading
 from pathlib import Path
+from typing import List, Optional
 
 import modal
-from fastapi import Response, HTTPException
-from pydantic import BaseModel
+from fastapi import Header, Response, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from batching import MicroBatcher
+from encoding import OUTPUT_FORMATS, encode_image, encode_images, negotiate_format
+from params import DEFAULT_FORMAT, GenerationParams
+from streaming import StepStreamer
+from weights import LoadTimer, drop_hub_cache, is_staged, stage_pipeline
 
 # We'll make use of the full [CUDA toolkit](https://modal.com/docs/guide/cuda)
 # in this example, so we'll build our container image off of the `nvidia/cuda` base.
@@ -69,15 +76,29 @@ flux_image = flux_image.env({
     "TORCHINDUCTOR_CACHE_DIR": "/root/.inductor-cache",
     "TORCHINDUCTOR_FX_GRAPH_CACHE": "1",
 })
+
+# The caches live on Volumes, so compilation artifacts written by the first container
+# are reused by every later one.
+
+compile_cache_volumes = {
+    "/root/.nv": modal.Volume.from_name("nv-cache", create_if_missing=True),
+    "/root/.triton": modal.Volume.from_name("triton-cache", create_if_missing=True),
+    "/root/.inductor-cache": modal.Volume.from_name("inductor-cache", create_if_missing=True),
+}
 # Finally, we construct our Modal [App](https://modal.com/docs/reference/modal.App),
 # set its default image to the one we just constructed,
 # and import `FluxPipeline` for downloading and running Flux.1.
 
 app = modal.App(f"flux-1-{variant}", image=flux_image)
 
+# With memory snapshots these imports are restored from the snapshot instead of re-run,
+# the time they take is reported by the `health` route.
+
+import_start = time.monotonic()
 with flux_image.imports():
     import torch
     from diffusers import FluxPipeline
+IMPORT_SECONDS = time.monotonic() - import_start
 
 # ## Defining a parameterized `Model` inference class
 
@@ -92,54 +113,121 @@ with flux_image.imports():
 MINUTES = 60  # seconds
 NUM_INFERENCE_STEPS = 5  # use ~50 for [dev], smaller for [schnell]
 BUNCHA_GPU_TYPE = "H100"
+# "1" compiles the transformer and VAE decoder with `torch.compile`; set by the deploying client
+BUNCHA_COMPILE = "0"
+COMPILE = BUNCHA_COMPILE == "1"
 
+# Weights converted once at build time and loaded from the image on every start
+MODEL_ID = f"black-forest-labs/FLUX.1-{variant}"
+WEIGHTS_DIR = Path("/root/weights") / f"flux-1-{variant}"
+
+MAX_BATCH_SIZE = 8  # images per call, bounded by GPU memory
+BATCH_WAIT_MS = 15  # how long a request waits for concurrent callers to share its forward pass
+MAX_CONCURRENT_INPUTS = 16  # requests one container accepts at once, so they can be batched
+
+# Send either a single `prompt` or a list of `prompts`; each prompt yields
+# `num_images_per_prompt` images, all generated in one batched diffusion call.
 class GenerationRequest(BaseModel):
-    prompt: str
+    prompt: Optional[str] = None
+    prompts: Optional[List[str]] = None
+    num_images_per_prompt: int = 1
+    # Steps, size, seed and guidance; see `GenerationParams`, unset fields keep the defaults
+    params: dict = Field(default_factory=dict)
+    # Output encoding; without `format` the Accept header decides
+    format: Optional[str] = None
+    quality: int = Field(default=90, ge=1, le=100)
+    lossless: bool = False  # WebP only; PNG is always lossless
+    preview: bool = False  # downscaled copy for a fast first look
+    # Answer with server-sent step progress and intermediate previews, then the image
+    stream: bool = False
+
+# Helper modules shared by the deploy scripts
+shared_modules = [
+    modal.Mount.from_local_file(Path(__file__).parent / f"{module}.py", remote_path=f"/root/{module}.py")
+    for module in ("batching", "encoding", "params", "streaming", "weights")
+]
 
 @app.cls(
     gpu=BUNCHA_GPU_TYPE,
     container_idle_timeout=1 * MINUTES,
-    timeout=1 * MINUTES,
-    volumes={  # add Volumes to store serializable compilation artifacts, see section on torch.compile below
-        "/root/.nv": modal.Volume.from_name("nv-cache", create_if_missing=True),
-        "/root/.triton": modal.Volume.from_name(
-            "triton-cache", create_if_missing=True
-        ),
-        "/root/.inductor-cache": modal.Volume.from_name(
-            "inductor-cache", create_if_missing=True
-        ),
-    },
-    secrets=[modal.Secret.from_dict({"HF_TOKEN": hf_readonly_token})]
+    # The first compiled container can take a long time to start
+    timeout=(20 if COMPILE else 1) * MINUTES,
+    volumes=compile_cache_volumes,  # serializable compilation artifacts, see section on torch.compile below
+    secrets=[modal.Secret.from_dict({"HF_TOKEN": hf_readonly_token})],
+    allow_concurrent_inputs=MAX_CONCURRENT_INPUTS,
+    mounts=shared_modules,
+    enable_memory_snapshot=True,  # see the section on fast restores below
 )
 class Model:
-    compile: int = (  # see section on torch.compile below for details
-        modal.parameter(default=0)
-    )
-
     def setup_model(self):
         from huggingface_hub import snapshot_download
         from transformers.utils import move_cache
 
-        snapshot_download(f"black-forest-labs/FLUX.1-{variant}")
+        snapshot_download(MODEL_ID)
 
         move_cache()
 
-        pipe = FluxPipeline.from_pretrained(
-            f"black-forest-labs/FLUX.1-{variant}", torch_dtype=torch.bfloat16
-        )
+        pipe = FluxPipeline.from_pretrained(MODEL_ID, torch_dtype=torch.bfloat16)
 
         return pipe
 
+    def load_staged(self):
+        # Memory-mapped safetensors straight into empty modules, no Hub lookups
+        return FluxPipeline.from_pretrained(
+            WEIGHTS_DIR,
+            torch_dtype=torch.bfloat16,
+            use_safetensors=True,
+            low_cpu_mem_usage=True,
+        )
+
     @modal.build()
     def build(self):
-        self.setup_model()
-
-    @modal.enter()
+        if is_staged(WEIGHTS_DIR):
+            return
+        stage_pipeline(self.setup_model(), WEIGHTS_DIR, MODEL_ID)
+        drop_hub_cache(MODEL_ID)
+
+    # ## Fast restores with memory snapshots
+
+    # Container start is split in two. `load` runs on the CPU only and its result,
+    # imports and weights in host memory included, is captured in a memory snapshot.
+    # Later containers restore that snapshot instead of re-running it and only go
+    # through `enter`, which places the weights on the GPU and optimizes them.
+
+    @modal.enter(snap=True)
+    def load(self):
+        self.cpu_timer = LoadTimer()
+        # Images built before weight staging still load from the Hub cache
+        self.weights_source = "staged" if is_staged(WEIGHTS_DIR) else "hub"
+        with self.cpu_timer.phase("load"):
+            self.cpu_pipe = self.load_staged() if self.weights_source == "staged" else self.setup_model()
+        self.cpu_timer.report(f"CPU load with {self.weights_source} weights (snapshotted)")
+
+    @modal.enter(snap=False)
     def enter(self):
-        pipe = self.setup_model()
-        pipe.to("cuda")  # move model to GPU
-        # self.pipe = optimize(pipe, compile=bool(self.compile))
+        timer = LoadTimer()
+        pipe = self.cpu_pipe
+        with timer.phase("to_gpu"):
+            pipe.to("cuda")  # move model to GPU
+        # Previews decode at a different size, keep them off the compiled decoder
+        self.decode_eager = pipe.vae.decode
+        with timer.phase("optimize"):
+            pipe = optimize(pipe, compile=COMPILE)
         self.pipe = pipe
+        timer.report("GPU setup")
+
+        # Bookkeeping reported by the `health` route
+        self.load_seconds = timer.total
+        self.load_phases = {**self.cpu_timer.phases, **timer.phases}
+        self.started_at = time.time()
+        self.cold_start = True
+        self.requests_served = 0
+        self.last_inference_seconds = None
+        self.batcher = MicroBatcher(
+            self._run_batch, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=BATCH_WAIT_MS
+        )
+        # Batched and streamed generations share the pipeline, one at a time
+        self.pipe_lock = threading.Lock()
 
     @modal.method()
     def inference(self, prompt: str) -> bytes:
@@ -150,31 +238,224 @@ class Model:
             num_inference_steps=NUM_INFERENCE_STEPS,
         ).images[0]
 
-        byte_stream = BytesIO()
-        out.save(byte_stream, format="JPEG")
-        return byte_stream.getvalue()
+        return encode_image(out, DEFAULT_FORMAT)
+
+    def _run_batch(self, batch: List[tuple]) -> List[list]:
+        """Run one diffusion call for every queued request and split the images back per request"""
+        # The batcher only groups requests with the same `num_images_per_prompt` and parameters;
+        # seeds differ per request and are applied per image through the generators
+        _, num_images_per_prompt, params, _ = batch[0]
+        prompts = [prompt for request_prompts, _, _, _ in batch for prompt in request_prompts]
+        seeds = [seed for _, _, _, request_seeds in batch for seed in request_seeds]
+
+        kwargs = params.pipeline_kwargs(NUM_INFERENCE_STEPS)
+        kwargs.pop("negative_prompt", None)  # Flux is guidance-distilled and has no negative prompt
+        with self.pipe_lock:
+            inference_start = time.monotonic()
+            images = self.pipe(
+                prompts,
+                output_type="pil",
+                num_images_per_prompt=num_images_per_prompt,
+                generator=[torch.Generator("cuda").manual_seed(seed) for seed in seeds],
+                **kwargs,
+            ).images
+            self.last_inference_seconds = time.monotonic() - inference_start
+        self.requests_served += len(batch)
+        self.cold_start = False
+
+        results, offset = [], 0
+        for request_prompts, _, _, _ in batch:
+            count = len(request_prompts) * num_images_per_prompt
+            results.append(images[offset:offset + count])
+            offset += count
+        return results
+
+    # ## Progressive previews
+
+    # A streamed request runs on its own so its step callback can report progress,
+    # decode a low-resolution preview every few steps and stop early once the client
+    # has gone away.
+
+    def _decode_preview(self, latents, height: int, width: int):
+        """Decode the packed latents of the first image at half resolution"""
+        with torch.no_grad():
+            latents = self.pipe._unpack_latents(latents[:1], height, width, self.pipe.vae_scale_factor)
+            latents = latents / self.pipe.vae.config.scaling_factor + self.pipe.vae.config.shift_factor
+            latents = torch.nn.functional.interpolate(latents, scale_factor=0.5, mode="bilinear")
+            image = self.decode_eager(latents, return_dict=False)[0]
+        return self.pipe.image_processor.postprocess(image, output_type="pil")[0]
+
+    def _stream(
+        self,
+        prompt: str,
+        params: GenerationParams,
+        output_format: str,
+        request: GenerationRequest,
+    ) -> StreamingResponse:
+        kwargs = params.pipeline_kwargs(NUM_INFERENCE_STEPS)
+        kwargs.pop("negative_prompt", None)
+        default_size = self.pipe.default_sample_size * self.pipe.vae_scale_factor
+        height, width = params.height or default_size, params.width or default_size
+        seed = params.seeds(1)[0]
+        streamer = StepStreamer(
+            kwargs["num_inference_steps"],
+            decode_preview=lambda latents: self._decode_preview(latents, height, width),
+        )
+
+        def run():
+            with self.pipe_lock:
+                inference_start = time.monotonic()
+                image = self.pipe(
+                    prompt,
+                    output_type="pil",
+                    generator=torch.Generator("cuda").manual_seed(seed),
+                    callback_on_step_end=streamer.callback,
+                    callback_on_step_end_tensor_inputs=["latents"],
+                    **kwargs,
+                ).images[0]
+                self.last_inference_seconds = time.monotonic() - inference_start
+            self.requests_served += 1
+            self.cold_start = False
+            content = encode_image(image, output_format, request.quality, request.lossless, request.preview)
+            return content, OUTPUT_FORMATS[output_format][1], {"seeds": [seed]}
+
+        return StreamingResponse(
+            streamer.stream(run),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
 
     @modal.web_endpoint(method="POST")
     async def web_inference(
         self,
         request: GenerationRequest,
+        accept: Optional[str] = Header(default=None),
     ) -> Response:
-        # Generate image
+        prompts = request.prompts or ([request.prompt] if request.prompt else [])
+        if not prompts or request.num_images_per_prompt < 1:
+            raise HTTPException(status_code=422, detail="Provide `prompt` or `prompts`")
         try:
-            out = self.pipe(
-                request.prompt,
-                output_type="pil",
-                num_inference_steps=NUM_INFERENCE_STEPS,
-            ).images[0]
-
-            byte_stream = BytesIO()
-            out.save(byte_stream, format="JPEG")
-            return Response(
-                content=byte_stream.getvalue(),
-                media_type="image/jpeg"
+            params = GenerationParams.from_dict(request.params)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        # Larger images take a proportionally bigger share of the batch
+        num_images = len(prompts) * request.num_images_per_prompt
+        batch_size = num_images * params.size_units()
+        if batch_size > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Batch of {num_images} images at this size exceeds the limit of {MAX_BATCH_SIZE}",
+            )
+
+        output_format = negotiate_format(request.format, accept)
+        if request.stream:
+            if num_images != 1:
+                raise HTTPException(status_code=422, detail="Streaming supports a single image")
+            return self._stream(prompts[0], params, output_format, request)
+
+        # Generate images, sharing the forward pass with concurrent callers
+        try:
+            seeds = params.seeds(num_images)
+            images = await self.batcher.submit(
+                (prompts, request.num_images_per_prompt, params, seeds),
+                size=batch_size,
+                key=(request.num_images_per_prompt, params.batch_key()),
+            )
+            return encode_images(
+                images,
+                request.num_images_per_prompt,
+                output_format=output_format,
+                quality=request.quality,
+                lossless=request.lossless,
+                preview=request.preview,
+                headers={"X-Seeds": ",".join(map(str, seeds))},
             )
         except Exception as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Error in generation process: {str(e)}"
-            )
\ No newline at end of file
+            )
+
+    # ## Health and metadata
+
+    # A cheap GET route so the client can check liveness, warm state and expected latency
+    # without running a generation. Calling it on a scaled-down app starts a container,
+    # which also makes it the warm-up target.
+
+    @modal.web_endpoint(method="GET")
+    def health(self) -> dict:
+        cold_start = self.cold_start
+        self.cold_start = False
+        return {
+            "status": "ok",
+            "app": app.name,
+            "loaded": hasattr(self, "pipe"),
+            "cold_start": cold_start,  # True if this request booted the container
+            "warm": self.requests_served > 0,  # first generation has run on this container
+            "import_seconds": round(IMPORT_SECONDS, 2),
+            "load_seconds": round(self.load_seconds, 2),  # GPU setup paid by every container
+            "load_phases": self.load_phases,
+            "weights_source": self.weights_source,
+            "uptime_seconds": round(time.time() - self.started_at, 2),
+            "requests_served": self.requests_served,
+            "last_inference_seconds": self.last_inference_seconds,
+            "batches_run": self.batcher.batches_run,
+            "average_batch_size": round(self.batcher.average_batch_size, 2),
+            "num_inference_steps": NUM_INFERENCE_STEPS,
+            "gpu_type": BUNCHA_GPU_TYPE,
+            "compiled": COMPILE,
+        }
+
+# ## Speeding up Flux with `torch.compile`
+
+# By default, we do some basic optimizations, like adjusting memory layout
+# and re-expressing the attention head projections as a single matrix multiplication.
+# With `BUNCHA_COMPILE = "1"` we also compile the Transformer and VAE decoder.
+# Compilation is slow, so it is triggered in `enter` with a warm-up generation and the
+# artifacts are committed to the cache Volumes for later containers. Shapes other than the
+# warmed-up one (other batch sizes or image sizes) compile on first use and are cached the same way.
+
+
+def optimize(pipe, compile=True):
+    # fuse QKV projections in Transformer and VAE
+    pipe.transformer.fuse_qkv_projections()
+    pipe.vae.fuse_qkv_projections()
+
+    # switch memory layout to Torch's preferred, channels_last
+    pipe.transformer.to(memory_format=torch.channels_last)
+    pipe.vae.to(memory_format=torch.channels_last)
+
+    if not compile:
+        return pipe
+
+    # set torch compile flags
+    config = torch._inductor.config
+    config.disable_progress = False  # show progress bar
+    config.conv_1x1_as_mm = True  # treat 1x1 convolutions as matrix muls
+    # adjust autotuning algorithm
+    config.coordinate_descent_tuning = True
+    config.coordinate_descent_check_all_directions = True
+    config.epilogue_fusion = False  # do not fuse pointwise ops into matmuls
+    # leave room for one graph per batch size and resolution in use
+    torch._dynamo.config.cache_size_limit = 32
+
+    # tag the compute-intensive modules, the Transformer and VAE decoder, for compilation
+    pipe.transformer = torch.compile(pipe.transformer, mode="max-autotune", fullgraph=True)
+    pipe.vae.decode = torch.compile(pipe.vae.decode, mode="max-autotune", fullgraph=True)
+
+    # trigger torch compilation
+    print("🔦 running torch compilation (may take up to 20 minutes)...")
+    compile_start = time.monotonic()
+    pipe(
+        "dummy prompt to trigger torch compilation",
+        output_type="pil",
+        num_inference_steps=NUM_INFERENCE_STEPS,
+    ).images[0]
+    print(f"🔦 finished torch compilation in {time.monotonic() - compile_start:.1f}s")
+
+    # persist the artifacts so only the first container pays the compile cost
+    for volume in compile_cache_volumes.values():
+        volume.commit()
+
+    return pipe
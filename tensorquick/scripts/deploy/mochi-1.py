@@ -0,0 +1,578 @@
+# ---
+# cmd: ["modal", "run", "--detach", "06_gpu_and_ml/text-to-video/mochi-1.py", "--num-inference-steps", "64"]
+# ---
+
+# # Generate videos from text prompts with Mochi
+
+# This example demonstrates how to run the [Mochi 1](https://github.com/genmoai/models)
+# video generation model by [Genmo](https://www.genmo.ai/) on Modal.
+
+# Here's one that we generated, inspired by our logo:
+
+# <center>
+# <video controls autoplay loop muted>
+# <source src="https://modal-public-assets.s3.us-east-1.amazonaws.com/modal-logo-splat.mp4" type="video/mp4" />
+# </video>
+# </center>
+
+# Note that the Mochi model, at time of writing,
+# requires several minutes on four H100s to produce
+# a high-quality clip of even a few seconds.
+# It also takes a five to ten minutes to boot up.
+# So a single video generation therefore costs about $2
+# at our ~$5/hr rate for H100s.
+
+# Keep your eyes peeled for improved efficiency
+# as the open source community works on this new model.
+# We welcome PRs to improve the performance of this example!
+
+# ## Setting up the environment for Mochi
+
+# We start by defining the environment the model runs in.
+# We'll need the [full CUDA toolkit](https://modal.com/docs/guide/cuda),
+# [Flash Attention](https://arxiv.org/abs/2205.14135) for fast attention kernels,
+# and the Mochi model code.
+
+import asyncio
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional
+
+import modal
+from fastapi import Header, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, ConfigDict, Field
+from starlette.background import BackgroundTask
+
+MINUTES = 60
+HOURS = 60 * MINUTES
+
+
+cuda_version = "12.3.1"  # should be no greater than host CUDA version
+flavor = "devel"  #  includes full CUDA toolkit
+os_version = "ubuntu22.04"
+tag = f"{cuda_version}-{flavor}-{os_version}"
+
+image = (
+    modal.Image.from_registry(f"nvidia/cuda:{tag}", add_python="3.11")
+    .entrypoint([])
+    .apt_install("git", "ffmpeg")
+    .pip_install("torch==2.4.0", "packaging", "ninja", "wheel", "setuptools")
+    .pip_install("flash-attn==2.6.3", extra_options="--no-build-isolation")
+    .pip_install(
+        "git+https://github.com/genmoai/models.git@075b6e36db58f1242921deff83a1066887b9c9e1"
+    )
+    .pip_install("fastapi[standard]==0.115.4", "pydantic==2.9.2")
+)
+
+# The web endpoints only submit and track jobs, so they run on a small CPU image.
+
+web_image = modal.Image.debian_slim(python_version="3.11").pip_install(
+    "fastapi[standard]==0.115.4", "pydantic==2.9.2"
+)
+
+app = modal.App("mochi-1", image=image)
+
+with image.imports():
+    import numpy as np
+    import ray
+    import torch
+    from mochi_preview.handler import MochiWrapper
+    from tqdm import tqdm
+
+# ## Saving model weights and outputs
+
+# Mochi weighs in at ~80 GB (~20B params, released in full 32bit precision)
+# and can take several minutes to generate videos.
+
+# On Modal, we save large or expensive-to-compute data to
+# [distributed Volumes](https://modal.com/docs/guide/volumes)
+# so that they are accessible from any Modal Function
+# or downloadable via the Modal dashboard or CLI.
+
+model = modal.Volume.from_name("mochi-model", create_if_missing=True)
+outputs = modal.Volume.from_name("mochi-outputs", create_if_missing=True)
+
+MODEL_CACHE = Path("/root/.cache")  # remote path for saving the model
+OUTPUTS_PATH = "/outputs"  # remote path for saving video outputs
+
+# Generation progress is published to a [Dict](https://modal.com/docs/reference/modal.Dict),
+# keyed by the id of the function call running the job, so the web endpoints can report it.
+
+jobs = modal.Dict.from_name("mochi-jobs", create_if_missing=True)
+
+# Clients send an `Idempotency-Key` header with every submission and retry it after a
+# dropped connection or a gateway error. The job spawned for a key is remembered here, so
+# a retry of a submission that did go through gets the same job instead of a second one.
+# Entries map `key:<idempotency key>` to the job id and `job:<job id>` back to the key;
+# both, and the job's progress, are dropped once its result is served or it is cancelled.
+
+submissions = modal.Dict.from_name("mochi-submissions", create_if_missing=True)
+SUBMISSION_PENDING = "pending"  # a key was claimed but its job is not spawned yet
+
+# We download the model using the `hf-transfer`
+# library from Hugging Face and additionally download
+# the text encoder (Google's T5 XXL) using `transformers`.
+
+# This can takes five to thirty minutes, depending on traffic
+# and network speed.
+
+# If you want to launch the download first,
+# before running the rest of the code,
+# use the following command from the folder containing this file:
+
+# ```bash
+# modal run --detach mochi-1::download_model
+# ```
+
+# The `--detach` flag ensures the download will continue
+# even if you close your terminal or shut down your computer
+# while it's running.
+
+download_image = (
+    modal.Image.debian_slim(python_version="3.11")
+    .pip_install(
+        "huggingface_hub",
+        "hf-transfer",
+        "torch",
+        "transformers",
+        "sentencepiece",
+    )
+)
+
+
+@app.function(
+    volumes={MODEL_CACHE: model}, timeout=2 * HOURS, image=download_image
+)
+def download_model(
+    model_revision: str = "8e9673c5349979457e515fddd38911df6b4ca07f",
+):
+    from huggingface_hub import snapshot_download
+    from transformers import T5EncoderModel, T5Tokenizer
+
+    model.reload()
+    print("🍡 downloading Mochi model")
+
+    snapshot_download(
+        repo_id="genmo/mochi-1-preview",
+        local_dir=MODEL_CACHE / "mochi-1-preview",
+        revision=model_revision,
+    )
+    print("🍡 model downloaded")
+
+    print("🍡 downloading text encoder")
+
+    T5Tokenizer.from_pretrained("google/t5-v1_1-xxl", legacy=False)
+    T5EncoderModel.from_pretrained("google/t5-v1_1-xxl")
+
+    model.commit()
+    print("🍡 text encoder downloaded")
+
+
+# ## Running Mochi inference
+
+# We can trigger Mochi inference from our local machine by running the code in
+# the local entrypoint below.
+
+# It ensures the model is downloaded to a remote volume,
+# spins up a new replica to generate a video, also saved remotely,
+# and then downloads the video to the local machine.
+
+# You can trigger it with:
+
+# ```bash
+# modal run --detach mochi-1
+# ```
+
+
+@app.local_entrypoint()
+def main(
+    prompt: str = "A cat playing drums in a jazz ensemble",
+    num_inference_steps: int = 200,
+):
+    from pathlib import Path
+
+    mochi = Mochi()
+    local_dir = Path("/tmp/mochi")
+    local_dir.mkdir(exist_ok=True, parents=True)
+    download_model.remote()
+    remote_path = Path(
+        mochi.generate_video.remote(
+            prompt=prompt, num_inference_steps=num_inference_steps
+        )
+    )
+    local_path = local_dir / remote_path.name
+    local_path.write_bytes(b"".join(outputs.read_file(remote_path.name)))
+    print("🍡 video saved locally at", local_path)
+
+
+# To deploy Mochi, run
+# ```bash
+# modal deploy mochi-1
+# ```
+
+# And then use it from another Python process that has access to your Modal credentials:
+
+# ```python
+# import modal
+#
+# Mochi = modal.Cls.lookup("mochi-1", "Mochi")
+# remote_path = Mochi().generate_video.remote(prompt="A cat playing drums in a jazz ensemble")
+# ```
+
+
+# The Mochi inference logic is defined in the Modal [`Cls`](https://modal.com/docs/guide/lifecycle-functions) below.
+
+# See [the Mochi GitHub repo](https://github.com/genmoai/models)
+# for more details on running Mochi.
+
+
+@app.cls(
+    gpu=modal.gpu.H100(count=4),
+    volumes={
+        MODEL_CACHE: model,
+        OUTPUTS_PATH: outputs,  # videos are saved to (distributed) disk
+    },
+    # boot takes a while, so we keep the container warm for 20 minutes after the last call finishes
+    timeout=1 * HOURS,
+    container_idle_timeout=20 * MINUTES,
+)
+class Mochi:
+    @modal.enter()
+    def load_model(self):
+        model.reload()
+        ray.init()
+        model_path = MODEL_CACHE / "mochi-1-preview"
+        vae_stats_path = f"{model_path}/vae_stats.json"
+        vae_checkpoint_path = f"{model_path}/vae.safetensors"
+        model_config_path = f"{model_path}/dit-config.yaml"
+        model_checkpoint_path = f"{model_path}/dit.safetensors"
+        num_gpus = torch.cuda.device_count()
+        if num_gpus < 4:
+            print(
+                f"🍡 WARNING: Mochi requires at least 4xH100 GPUs, but only {num_gpus} GPU(s) are available."
+            )
+        print(
+            f"🍡 loading model to {num_gpus} GPUs. This can take 5-15 minutes."
+        )
+        self.model = MochiWrapper(
+            num_workers=num_gpus,
+            vae_stats_path=vae_stats_path,
+            vae_checkpoint_path=vae_checkpoint_path,
+            dit_config_path=model_config_path,
+            dit_checkpoint_path=model_checkpoint_path,
+        )
+        print("🍡 model loaded")
+
+    @modal.exit()
+    def graceful_exit(self):
+        ray.shutdown()
+
+    @modal.method()
+    def generate_video(
+        self,
+        prompt="",
+        negative_prompt="",
+        width=848,
+        height=480,
+        num_frames=163,
+        seed=12345,
+        cfg_scale=4.5,
+        num_inference_steps=200,
+    ):
+        # credit: https://github.com/genmoai/models/blob/7c7d33c49d53bbf939fd6676610e949f3008b5a8/src/mochi_preview/infer.py#L63
+
+        # sigma_schedule should be a list of floats of length (num_inference_steps + 1),
+        # such that sigma_schedule[0] == 1.0 and sigma_schedule[-1] == 0.0 and monotonically decreasing.
+        sigma_schedule = linear_quadratic_schedule(num_inference_steps, 0.025)
+
+        # cfg_schedule should be a list of floats of length num_inference_steps.
+        # For simplicity, we just use the same cfg scale at all timesteps,
+        # but more optimal schedules may use varying cfg, e.g:
+        # [5.0] * (num_inference_steps // 2) + [4.5] * (num_inference_steps // 2)
+        cfg_schedule = [cfg_scale] * num_inference_steps
+
+        args = {
+            "height": height,
+            "width": width,
+            "num_frames": num_frames,
+            "mochi_args": {
+                "sigma_schedule": sigma_schedule,
+                "cfg_schedule": cfg_schedule,
+                "num_inference_steps": num_inference_steps,
+                "batch_cfg": True,
+            },
+            "prompt": [prompt],
+            "negative_prompt": [negative_prompt],
+            "seed": seed,
+        }
+
+        # the last iteration decodes the latents into frames
+        job_id = modal.current_function_call_id()
+        total_steps = num_inference_steps + 1
+        final_frames, reported = None, -1
+        for step, (cur_progress, frames, finished) in enumerate(
+            tqdm(self.model(args), total=total_steps), start=1
+        ):
+            final_frames = frames
+            # at most one update per percent, each one is a round trip to the Dict
+            percent = step * 100 // total_steps
+            if percent != reported:
+                reported = percent
+                jobs.put(job_id, {"status": "running", "step": step, "total": total_steps})
+
+        assert isinstance(final_frames, np.ndarray)
+        assert final_frames.dtype == np.float32
+
+        # frames come back as (t, b, h, w, c); we generate a single video
+        final_frames = final_frames[:, 0]
+
+        output_path = os.path.join(
+            OUTPUTS_PATH, f"output_{int(time.time())}.mp4"
+        )
+
+        jobs.put(job_id, {"status": "encoding", "step": total_steps, "total": total_steps})
+        encode_start = time.monotonic()
+        encode_video(frames_to_uint8(final_frames), output_path)
+        print(f"🍡 encoded {len(final_frames)} frames in {time.monotonic() - encode_start:.2f}s")
+
+        json_path = os.path.splitext(output_path)[0] + ".json"
+        with open(json_path, "w") as f:
+            json.dump(args, f, indent=4)
+
+        outputs.commit()
+        print(f"Video saved remotely at: {output_path}")
+        return output_path
+
+
+# ## Serving Mochi over HTTP
+
+# A video takes minutes to generate, far longer than a client should hold a request open,
+# so generation runs as a background job. `web_inference` spawns `generate_video` and answers
+# at once with the id of the function call. The client polls `status` for progress and then
+# downloads the finished video from `result`; `cancel` stops a job nobody is waiting for.
+# These endpoints run on their own CPU containers, so polling never wakes up a GPU.
+
+
+class VideoParams(BaseModel):
+    # Same field names as the client's `GenerationParams`; unset fields keep the defaults
+    model_config = ConfigDict(extra="forbid")
+
+    steps: Optional[int] = Field(default=None, ge=1, le=200)
+    width: Optional[int] = Field(default=None, ge=256, le=1280, multiple_of=16)
+    height: Optional[int] = Field(default=None, ge=256, le=1280, multiple_of=16)
+    seed: Optional[int] = Field(default=None, ge=0, le=2**32 - 1)
+    guidance_scale: Optional[float] = Field(default=None, ge=0, le=30)
+    negative_prompt: Optional[str] = None
+    num_frames: Optional[int] = Field(default=None, ge=1, le=163)
+
+    def generation_kwargs(self) -> dict:
+        """Keyword arguments for `Mochi.generate_video`"""
+        names = {"steps": "num_inference_steps", "guidance_scale": "cfg_scale"}
+        return {
+            names.get(name, name): value
+            for name, value in self.model_dump(exclude_none=True).items()
+        }
+
+
+class VideoRequest(BaseModel):
+    prompt: str = Field(min_length=1)
+    params: VideoParams = Field(default_factory=VideoParams)
+
+
+async def job_state(job_id: str) -> dict:
+    """
+    Look up a job without waiting for it
+
+    Returns:
+        Dictionary with `status` (queued, running, encoding, completed or failed),
+        the step counts while running, `path` once completed and `error` on failure
+    """
+    call = modal.FunctionCall.from_id(job_id)
+    try:
+        path = await call.get.aio(timeout=0)
+    except modal.exception.FunctionTimeoutError:
+        return {"status": "failed", "error": "Generation timed out"}
+    except (TimeoutError, modal.exception.TimeoutError):
+        # still queued or running
+        progress = await jobs.get.aio(job_id) or {}
+        return {"status": "queued", **progress}
+    except modal.exception.NotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    except modal.exception.OutputExpiredError:
+        raise HTTPException(status_code=410, detail=f"Result of job {job_id} has expired")
+    except Exception as e:
+        return {"status": "failed", "error": str(e)}
+    return {"status": "completed", "path": path}
+
+
+async def submitted_job(idempotency_key: str, wait: float = 10.0) -> str:
+    """
+    Job id of a submission whose key was claimed by another request
+
+    Raises:
+        HTTPException: 503 if that request has not spawned its job within `wait` seconds,
+            or gave up; the client retries the submission
+    """
+    deadline = time.monotonic() + wait
+    job_id = await submissions.get.aio(f"key:{idempotency_key}")
+    while job_id == SUBMISSION_PENDING and time.monotonic() < deadline:
+        await asyncio.sleep(0.25)
+        job_id = await submissions.get.aio(f"key:{idempotency_key}")
+    if not job_id or job_id == SUBMISSION_PENDING:
+        raise HTTPException(status_code=503, detail="Submission with this key is still in progress")
+    return job_id
+
+
+async def forget_job(job_id: str) -> None:
+    """Drop the progress and submission entries of a job that is no longer needed"""
+    try:
+        await jobs.pop.aio(job_id)
+    except KeyError:
+        pass
+    try:
+        idempotency_key = await submissions.pop.aio(f"job:{job_id}")
+        await submissions.pop.aio(f"key:{idempotency_key}")
+    except KeyError:
+        pass
+
+
+@app.cls(
+    image=web_image,
+    volumes={OUTPUTS_PATH: outputs},
+    container_idle_timeout=5 * MINUTES,
+    allow_concurrent_inputs=100,
+)
+class Model:
+    @modal.web_endpoint(method="POST")
+    async def web_inference(
+        self,
+        request: VideoRequest,
+        idempotency_key: Optional[str] = Header(default=None),
+    ) -> dict:
+        if idempotency_key:
+            # Claim the key atomically, so concurrent retries cannot both spawn a job
+            claimed = await submissions.put.aio(
+                f"key:{idempotency_key}", SUBMISSION_PENDING, skip_if_exists=True
+            )
+            if not claimed:
+                job_id = await submitted_job(idempotency_key)
+                print(f"🍡 job {job_id} already submitted for key {idempotency_key}")
+                return {"job_id": job_id, "status": "queued"}
+
+        try:
+            call = await Mochi().generate_video.spawn.aio(
+                prompt=request.prompt, **request.params.generation_kwargs()
+            )
+        except Exception:
+            if idempotency_key:
+                # release the key so a retry can submit again
+                await submissions.pop.aio(f"key:{idempotency_key}")
+            raise
+        if idempotency_key:
+            await submissions.put.aio(f"job:{call.object_id}", idempotency_key)
+            await submissions.put.aio(f"key:{idempotency_key}", call.object_id)
+        print(f"🍡 queued job {call.object_id}")
+        return {"job_id": call.object_id, "status": "queued"}
+
+    @modal.web_endpoint(method="GET")
+    async def status(self, job_id: str) -> dict:
+        state = await job_state(job_id)
+        state.pop("path", None)
+        return {"job_id": job_id, **state}
+
+    @modal.web_endpoint(method="GET")
+    async def result(self, job_id: str) -> FileResponse:
+        state = await job_state(job_id)
+        if state["status"] == "failed":
+            raise HTTPException(status_code=500, detail=state["error"])
+        if state["status"] != "completed":
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is {state['status']}")
+
+        path = state["path"]
+        if not os.path.exists(path):
+            # written by another container after this one mounted the Volume
+            await outputs.reload.aio()
+        return FileResponse(
+            path,
+            media_type="video/mp4",
+            filename=os.path.basename(path),
+            background=BackgroundTask(forget_job, job_id),
+        )
+
+    @modal.web_endpoint(method="POST")
+    async def cancel(self, job_id: str) -> dict:
+        await modal.FunctionCall.from_id(job_id).cancel.aio()
+        await forget_job(job_id)
+        return {"job_id": job_id, "status": "cancelled"}
+
+    @modal.web_endpoint(method="GET")
+    def health(self) -> dict:
+        return {"status": "ok", "app": app.name, "async_jobs": True}
+
+
+# ## Addenda
+
+# The remainder of the code in this file is utility code.
+
+# Frames are converted to uint8 in one vectorized pass over the whole clip and piped
+# to ffmpeg as raw RGB, so there are no per-frame PNG encodes and no disk round trip.
+
+
+def frames_to_uint8(frames):
+    """Scale float frames in [0, 1] to a C-contiguous uint8 array"""
+    frames = np.clip(frames, 0.0, 1.0)
+    frames *= 255.0
+    frames += 0.5  # round instead of truncating
+    return frames.astype(np.uint8, order="C")
+
+
+def encode_video(frames, output_path, fps=30):
+    """
+    Encode (t, h, w, 3) uint8 frames to an H.264 MP4 by piping them to ffmpeg
+
+    Raises:
+        RuntimeError: If ffmpeg exits with an error
+    """
+    num_frames, height, width, _ = frames.shape
+    ffmpeg_cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+        "-i", "pipe:0",
+        "-an", "-vcodec", "libx264", "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart",  # index up front so the file can be played while downloading
+        output_path,
+    ]
+    process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    # communicate() writes the buffer without copying it and drains stderr meanwhile
+    _, stderr = process.communicate(input=memoryview(frames).cast("B"))
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {num_frames} frames: {stderr.decode(errors='replace')}")
+
+
+def linear_quadratic_schedule(num_steps, threshold_noise, linear_steps=None):
+    if linear_steps is None:
+        linear_steps = num_steps // 2
+    linear_sigma_schedule = [
+        i * threshold_noise / linear_steps for i in range(linear_steps)
+    ]
+    threshold_noise_step_diff = linear_steps - threshold_noise * num_steps
+    quadratic_steps = num_steps - linear_steps
+    quadratic_coef = threshold_noise_step_diff / (
+        linear_steps * quadratic_steps**2
+    )
+    linear_coef = (
+        threshold_noise / linear_steps
+        - 2 * threshold_noise_step_diff / (quadratic_steps**2)
+    )
+    const = quadratic_coef * (linear_steps**2)
+    quadratic_sigma_schedule = [
+        quadratic_coef * (i**2) + linear_coef * i + const
+        for i in range(linear_steps, num_steps)
+    ]
+    sigma_schedule = linear_sigma_schedule + quadratic_sigma_schedule + [1.0]
+    sigma_schedule = [1.0 - x for x in sigma_schedule]
+    return sigma_schedule
\ No newline at end of file
@@ -0,0 +1,127 @@
+# Generation parameters shared by the deploy scripts and the desktop client.
+#
+# Every field is optional and None keeps the model's own default, so a request
+# only carries what the user changed. The client validates with the same class
+# before sending, against the limits of the selected model, and the server
+# resolves the values into diffusers keyword arguments. It only depends on the
+# standard library so both sides can import it.
+
+import math
+import random
+from dataclasses import asdict, dataclass, fields
+from typing import List, Optional
+
+MIN_STEPS, MAX_STEPS = 1, 100
+MIN_SIZE, MAX_SIZE = 256, 2048
+SIZE_MULTIPLE = 16  # latent downscaling times Flux's 2x2 patch packing
+DEFAULT_SIZE = 1024
+MAX_GUIDANCE = 30.0
+MAX_SEED = 2**32 - 1
+
+# Output image formats and their media types. Requests that name no format, through the
+# body or the Accept header, get DEFAULT_FORMAT, which is also what the client asks for
+# by default, so every caller receives the same format.
+OUTPUT_MEDIA_TYPES = {"webp": "image/webp", "png": "image/png", "jpeg": "image/jpeg"}
+DEFAULT_FORMAT = "webp"
+
+
+@dataclass(frozen=True)
+class ParamLimits:
+    """Ranges a model accepts; the defaults are those of the image models"""
+    max_steps: int = MAX_STEPS
+    max_size: int = MAX_SIZE
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "ParamLimits":
+        """Limits from a model's `limits` setting; missing ones keep the defaults"""
+        known = {field.name for field in fields(cls)}
+        return cls(**{key: int(value) for key, value in (data or dict()).items() if key in known})
+
+
+@dataclass(frozen=True)
+class GenerationParams:
+    steps: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    seed: Optional[int] = None
+    guidance_scale: Optional[float] = None
+    negative_prompt: Optional[str] = None
+
+    def validate(self, limits: Optional[ParamLimits] = None) -> "GenerationParams":
+        """
+        Check every set field against the model's limits
+
+        Raises:
+            ValueError: On out-of-range values
+        """
+        limits = limits or ParamLimits()
+        if self.steps is not None and not MIN_STEPS <= self.steps <= limits.max_steps:
+            raise ValueError(f"steps must be between {MIN_STEPS} and {limits.max_steps}")
+        for name in ("width", "height"):
+            value = getattr(self, name)
+            if value is not None and (not MIN_SIZE <= value <= limits.max_size or value % SIZE_MULTIPLE):
+                raise ValueError(
+                    f"{name} must be a multiple of {SIZE_MULTIPLE} between {MIN_SIZE} and {limits.max_size}"
+                )
+        if self.seed is not None and not 0 <= self.seed <= MAX_SEED:
+            raise ValueError(f"seed must be between 0 and {MAX_SEED}")
+        if self.guidance_scale is not None and not 0 <= self.guidance_scale <= MAX_GUIDANCE:
+            raise ValueError(f"guidance_scale must be between 0 and {MAX_GUIDANCE:g}")
+        return self
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict], limits: Optional[ParamLimits] = None) -> "GenerationParams":
+        """
+        Build validated parameters from a request body or a UI dictionary
+
+        Args:
+            data: Parameter values; None and empty strings count as unset
+            limits: Ranges of the target model, the image model defaults when None
+
+        Raises:
+            ValueError: On unknown fields, wrong types or out-of-range values
+        """
+        data = {key: value for key, value in (data or dict()).items() if value is not None and value != ""}
+        unknown = set(data) - {field.name for field in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown generation parameters: {', '.join(sorted(unknown))}")
+
+        try:
+            for name in ("steps", "width", "height", "seed"):
+                if name in data:
+                    if isinstance(data[name], bool) or float(data[name]) != int(data[name]):
+                        raise ValueError(f"{name} must be an integer")
+                    data[name] = int(data[name])
+            if "guidance_scale" in data:
+                data["guidance_scale"] = float(data["guidance_scale"])
+            if "negative_prompt" in data:
+                data["negative_prompt"] = str(data["negative_prompt"])
+        except (TypeError, OverflowError) as e:
+            raise ValueError(str(e))
+        return cls(**data).validate(limits)
+
+    def to_dict(self) -> dict:
+        """Fields that are set, ready to be sent as JSON"""
+        return {key: value for key, value in asdict(self).items() if value is not None}
+
+    def batch_key(self) -> tuple:
+        """Requests with equal keys can share a forward pass; seeds are applied per image"""
+        return (self.steps, self.width, self.height, self.guidance_scale, self.negative_prompt)
+
+    def size_units(self) -> int:
+        """Cost of one image relative to a default 1024x1024 one"""
+        width, height = self.width or DEFAULT_SIZE, self.height or DEFAULT_SIZE
+        return max(1, math.ceil(width * height / DEFAULT_SIZE**2))
+
+    def seeds(self, num_images: int) -> List[int]:
+        """One seed per image, consecutive from the requested seed or from a random one"""
+        seed = self.seed if self.seed is not None else random.randint(0, MAX_SEED)
+        return [(seed + i) % (MAX_SEED + 1) for i in range(num_images)]
+
+    def pipeline_kwargs(self, default_steps: int) -> dict:
+        """Keyword arguments for a diffusers pipeline call; unset fields keep the pipeline defaults"""
+        kwargs = {"num_inference_steps": self.steps or default_steps}
+        for name in ("width", "height", "guidance_scale", "negative_prompt"):
+            if getattr(self, name) is not None:
+                kwargs[name] = getattr(self, name)
+        return kwargs
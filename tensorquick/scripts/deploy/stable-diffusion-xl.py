@@ -17,11 +17,21 @@
 # ## Basic setup
 
 import io
+import time
+import threading
 from pathlib import Path
+from typing import List, Optional
 
 import modal
-from pydantic import BaseModel
-from fastapi import Response
+from pydantic import BaseModel, Field
+from fastapi import Header, Response, HTTPException
+from fastapi.responses import StreamingResponse
+
+from batching import MicroBatcher
+from encoding import OUTPUT_FORMATS, encode_image, encode_images, negotiate_format
+from params import DEFAULT_FORMAT, GenerationParams
+from streaming import StepStreamer
+from weights import LoadTimer, drop_hub_cache, is_staged, stage_pipeline
 
 # ## Define a container image
 #
@@ -55,12 +65,28 @@ sdxl_image = cuda_dev_image.apt_install(
     "numpy<2",
 )
 
+# `torch.compile` artifacts are cached on Volumes, so only the first compiled container
+# pays the compile cost; see the section on `torch.compile` below.
+sdxl_image = sdxl_image.env({
+    "TORCHINDUCTOR_CACHE_DIR": "/root/.inductor-cache",
+    "TORCHINDUCTOR_FX_GRAPH_CACHE": "1",
+})
+
+compile_cache_volumes = {
+    "/root/.nv": modal.Volume.from_name("nv-cache", create_if_missing=True),
+    "/root/.triton": modal.Volume.from_name("triton-cache", create_if_missing=True),
+    "/root/.inductor-cache": modal.Volume.from_name("inductor-cache", create_if_missing=True),
+}
+
 app = modal.App("stable-diffusion-xl")
 
+# With memory snapshots these imports are restored from the snapshot instead of re-run,
+# the time they take is reported by the `health` route.
+import_start = time.monotonic()
 with sdxl_image.imports():
     import torch
     from diffusers import DiffusionPipeline
-    from fastapi import Response
+IMPORT_SECONDS = time.monotonic() - import_start
 
 # ## Load model and run inference
 #
@@ -70,92 +96,252 @@ with sdxl_image.imports():
 # To avoid excessive cold-starts, we set the idle timeout to 240 seconds, meaning once a GPU has loaded the model it will stay
 # online for 4 minutes before spinning down. This can be adjusted for cost/experience trade-offs.
 BUNCHA_GPU_TYPE = "A10G"
+# "1" compiles both UNets with `torch.compile`; set by the deploying client
+BUNCHA_COMPILE = "0"
+COMPILE = BUNCHA_COMPILE == "1"
+
+# Weights converted once at build time and loaded from the image on every start
+BASE_ID = "stabilityai/stable-diffusion-xl-base-1.0"
+REFINER_ID = "stabilityai/stable-diffusion-xl-refiner-1.0"
+WEIGHTS_DIR = Path("/root/weights")
+N_STEPS = 24
+HIGH_NOISE_FRAC = 0.8
 
+MAX_BATCH_SIZE = 4  # images per call, bounded by GPU memory
+BATCH_WAIT_MS = 15  # how long a request waits for concurrent callers to share its forward pass
+MAX_CONCURRENT_INPUTS = 8  # requests one container accepts at once, so they can be batched
+
+# Send either a single `prompt` or a list of `prompts`; each prompt yields
+# `num_images_per_prompt` images, all generated in one batched base + refiner pass.
 class GenerationRequest(BaseModel):
-    prompt: str
+    prompt: Optional[str] = None
+    prompts: Optional[List[str]] = None
+    num_images_per_prompt: int = 1
+    # Steps, size, seed, guidance and negative prompt; see `GenerationParams`,
+    # unset fields keep the defaults
+    params: dict = Field(default_factory=dict)
+    # Output encoding; without `format` the Accept header decides
+    format: Optional[str] = None
+    quality: int = Field(default=90, ge=1, le=100)
+    lossless: bool = False  # WebP only; PNG is always lossless
+    preview: bool = False  # downscaled copy for a fast first look
+    # Answer with server-sent step progress and intermediate previews, then the image
+    stream: bool = False
+
+# Helper modules shared by the deploy scripts
+shared_modules = [
+    modal.Mount.from_local_file(Path(__file__).parent / f"{module}.py", remote_path=f"/root/{module}.py")
+    for module in ("batching", "encoding", "params", "streaming", "weights")
+]
 
 @app.cls(
     gpu=BUNCHA_GPU_TYPE,
     container_idle_timeout=60,
-    image=sdxl_image
+    # The first compiled container can take a long time to start
+    timeout=(20 if COMPILE else 5) * 60,
+    image=sdxl_image,
+    volumes=compile_cache_volumes,
+    enable_memory_snapshot=True,  # see the section on fast restores below
+    allow_concurrent_inputs=MAX_CONCURRENT_INPUTS,
+    mounts=shared_modules,
 )
 class Model:
+    def load_pipelines(self, base_source, refiner_source, **load_options):
+        """Load base and refiner; the refiner reuses the base's second text encoder and VAE"""
+        load_options = dict(torch_dtype=torch.float16, use_safetensors=True, **load_options)
+        base = DiffusionPipeline.from_pretrained(base_source, **load_options)
+        refiner = DiffusionPipeline.from_pretrained(
+            refiner_source,
+            text_encoder_2=base.text_encoder_2,
+            vae=base.vae,
+            **load_options,
+        )
+        return base, refiner
+
     @modal.build()
     def build(self):
         from huggingface_hub import snapshot_download
 
+        if is_staged(WEIGHTS_DIR / "base") and is_staged(WEIGHTS_DIR / "refiner"):
+            return
+
         ignore = [
             "*.bin",
             "*.onnx_data",
             "*/diffusion_pytorch_model.safetensors",
         ]
-        snapshot_download(
-            "stabilityai/stable-diffusion-xl-base-1.0", ignore_patterns=ignore
-        )
-        snapshot_download(
-            "stabilityai/stable-diffusion-xl-refiner-1.0",
-            ignore_patterns=ignore,
-        )
+        snapshot_download(BASE_ID, ignore_patterns=ignore)
+        snapshot_download(REFINER_ID, ignore_patterns=ignore)
+
+        # Stage the fp16 variant as the plain weights, so `enter` needs no variant lookup
+        base, refiner = self.load_pipelines(BASE_ID, REFINER_ID, variant="fp16")
+        stage_pipeline(base, WEIGHTS_DIR / "base", BASE_ID)
+        stage_pipeline(refiner, WEIGHTS_DIR / "refiner", REFINER_ID)
+        drop_hub_cache(BASE_ID)
+        drop_hub_cache(REFINER_ID)
 
-    @modal.enter()
+    # ## Fast restores with memory snapshots
+    #
+    # Container start is split in two. `load` runs on the CPU only and its result,
+    # imports and weights in host memory included, is captured in a memory snapshot.
+    # Later containers restore that snapshot instead of re-running it and only go
+    # through `enter`, which places the weights on the GPU and optimizes them.
+
+    @modal.enter(snap=True)
+    def load(self):
+        self.cpu_timer = LoadTimer()
+        # Images built before weight staging still load from the Hub cache
+        staged = is_staged(WEIGHTS_DIR / "base") and is_staged(WEIGHTS_DIR / "refiner")
+        self.weights_source = "staged" if staged else "hub"
+        with self.cpu_timer.phase("load"):
+            if staged:
+                # Memory-mapped safetensors straight into empty modules, no Hub lookups
+                self.base, self.refiner = self.load_pipelines(
+                    WEIGHTS_DIR / "base", WEIGHTS_DIR / "refiner", low_cpu_mem_usage=True
+                )
+            else:
+                self.base, self.refiner = self.load_pipelines(BASE_ID, REFINER_ID, variant="fp16")
+        self.cpu_timer.report(f"CPU load with {self.weights_source} weights (snapshotted)")
+
+    @modal.enter(snap=False)
     def enter(self):
-        import torch
-        from diffusers import DiffusionPipeline
+        timer = LoadTimer()
+        with timer.phase("to_gpu"):
+            self.base.to("cuda")
+            self.refiner.to("cuda")
+        with timer.phase("optimize"):
+            optimize(self.base, self.refiner, compile=COMPILE)
+        timer.report("GPU setup")
 
-        load_options = dict(
-            torch_dtype=torch.float16,
-            use_safetensors=True,
-            variant="fp16",
+        # Bookkeeping reported by the `health` route
+        self.load_seconds = timer.total
+        self.load_phases = {**self.cpu_timer.phases, **timer.phases}
+        self.started_at = time.time()
+        self.cold_start = True
+        self.requests_served = 0
+        self.last_inference_seconds = None
+        self.batcher = MicroBatcher(
+            self._run_batch, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=BATCH_WAIT_MS
         )
+        # Batched and streamed generations share the pipelines, one at a time
+        self.pipe_lock = threading.Lock()
 
-        # Load base model
-        self.base = DiffusionPipeline.from_pretrained(
-            "stabilityai/stable-diffusion-xl-base-1.0", **load_options
-        )
-        self.base.to("cuda")
+    def _generate(
+        self,
+        prompts,
+        params=None,
+        seeds=None,
+        high_noise_frac=HIGH_NOISE_FRAC,
+        num_images_per_prompt=1,
+        callback=None,
+    ):
+        """Run base + refiner once over the whole batch; images come back prompt-major"""
+        params = params or GenerationParams()
+        kwargs = params.pipeline_kwargs(N_STEPS)
+        kwargs.setdefault("negative_prompt", "disfigured, ugly, deformed")
+        if seeds:
+            kwargs["generator"] = [torch.Generator("cuda").manual_seed(seed) for seed in seeds]
+        # The refiner starts from the base latents, so the output size is already decided
+        refiner_kwargs = {key: value for key, value in kwargs.items() if key not in ("width", "height")}
 
-        # Load refiner model
-        self.refiner = DiffusionPipeline.from_pretrained(
-            "stabilityai/stable-diffusion-xl-refiner-1.0",
-            text_encoder_2=self.base.text_encoder_2,
-            vae=self.base.vae,
-            **load_options,
+        # Step callbacks only run for streamed requests
+        callback_options = dict(
+            callback_on_step_end=callback, callback_on_step_end_tensor_inputs=["latents"]
+        ) if callback else dict()
+
+        with self.pipe_lock:
+            inference_start = time.monotonic()
+            latents = self.base(
+                prompt=prompts,
+                denoising_end=high_noise_frac,
+                num_images_per_prompt=num_images_per_prompt,
+                output_type="latent",
+                **kwargs,
+                **callback_options,
+            ).images
+            images = self.refiner(
+                prompt=prompts,
+                denoising_start=high_noise_frac,
+                num_images_per_prompt=num_images_per_prompt,
+                image=latents,
+                **refiner_kwargs,
+                **callback_options,
+            ).images
+            self.last_inference_seconds = time.monotonic() - inference_start
+
+        self.cold_start = False
+
+        return images
+
+    def _run_batch(self, batch):
+        """Run one base + refiner pass for every queued request and split the images back per request"""
+        # The batcher only groups requests with the same `num_images_per_prompt` and parameters;
+        # seeds differ per request and are applied per image through the generators
+        _, num_images_per_prompt, params, _ = batch[0]
+        prompts = [prompt for request_prompts, _, _, _ in batch for prompt in request_prompts]
+        seeds = [seed for _, _, _, request_seeds in batch for seed in request_seeds]
+        images = self._generate(
+            prompts, params=params, seeds=seeds, num_images_per_prompt=num_images_per_prompt
         )
-        self.refiner.to("cuda")
-
-        # Compiling the model graph is JIT so this will increase inference time for the first run
-        # but speed up subsequent runs. Uncomment to enable.
-        # self.base.unet = torch.compile(self.base.unet, mode="reduce-overhead", fullgraph=True)
-        # self.refiner.unet = torch.compile(self.refiner.unet, mode="reduce-overhead", fullgraph=True)
-
-    def _inference(self, prompt, n_steps=24, high_noise_frac=0.8):
-        negative_prompt = "disfigured, ugly, deformed"
-        image = self.base(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
-            num_inference_steps=n_steps,
-            denoising_end=high_noise_frac,
-            output_type="latent",
-        ).images
-        image = self.refiner(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
-            num_inference_steps=n_steps,
-            denoising_start=high_noise_frac,
-            image=image,
-        ).images[0]
-
-        byte_stream = io.BytesIO()
-        image.save(byte_stream, format="JPEG")
-
-        return byte_stream
+        self.requests_served += len(batch)
+
+        results, offset = [], 0
+        for request_prompts, _, _, _ in batch:
+            count = len(request_prompts) * num_images_per_prompt
+            results.append(images[offset:offset + count])
+            offset += count
+        return results
+
+    def _inference(self, prompt, n_steps=N_STEPS, high_noise_frac=HIGH_NOISE_FRAC):
+        image = self._generate(
+            prompt, params=GenerationParams(steps=n_steps), high_noise_frac=high_noise_frac
+        )[0]
+        self.requests_served += 1
+
+        return io.BytesIO(encode_image(image, DEFAULT_FORMAT))
 
     @modal.method()
-    def inference(self, prompt, n_steps=24, high_noise_frac=0.8):
+    def inference(self, prompt, n_steps=N_STEPS, high_noise_frac=HIGH_NOISE_FRAC):
         return self._inference(
             prompt, n_steps=n_steps, high_noise_frac=high_noise_frac
         ).getvalue()
 
+    # ## Progressive previews
+    #
+    # A streamed request runs on its own so its step callbacks can report progress across
+    # the base and refiner stages, decode a low-resolution preview every few steps and
+    # stop early once the client has gone away.
+
+    def _decode_preview(self, latents):
+        """Decode the latents of the first image at half resolution"""
+        vae = self.base.vae
+        with torch.no_grad():
+            latents = torch.nn.functional.interpolate(latents[:1], scale_factor=0.5, mode="bilinear")
+            image = vae.decode(latents.to(vae.dtype) / vae.config.scaling_factor, return_dict=False)[0]
+        return self.base.image_processor.postprocess(image, output_type="pil")[0]
+
+    def _stream(
+        self,
+        prompt: str,
+        params: GenerationParams,
+        output_format: str,
+        request: GenerationRequest,
+    ) -> StreamingResponse:
+        seeds = params.seeds(1)
+        streamer = StepStreamer(params.steps or N_STEPS, decode_preview=self._decode_preview)
+
+        def run():
+            image = self._generate(prompt, params=params, seeds=seeds, callback=streamer.callback)[0]
+            self.requests_served += 1
+            content = encode_image(image, output_format, request.quality, request.lossless, request.preview)
+            return content, OUTPUT_FORMATS[output_format][1], {"seeds": seeds}
+
+        return StreamingResponse(
+            streamer.stream(run),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
     # @modal.web_endpoint(docs=True)
     # def web_inference(
     #     self, prompt: str, n_steps: int = 24, high_noise_frac: float = 0.8
@@ -165,10 +351,124 @@ class Model:
     async def web_inference(
         self,
         request: GenerationRequest,
+        accept: Optional[str] = Header(default=None),
     ) -> Response:
-        return Response(
-            content=self._inference(
-                request.prompt,
-            ).getvalue(),
-            media_type="image/jpeg",
-        )
\ No newline at end of file
+        prompts = request.prompts or ([request.prompt] if request.prompt else [])
+        if not prompts or request.num_images_per_prompt < 1:
+            raise HTTPException(status_code=422, detail="Provide `prompt` or `prompts`")
+        try:
+            params = GenerationParams.from_dict(request.params)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        # Larger images take a proportionally bigger share of the batch
+        num_images = len(prompts) * request.num_images_per_prompt
+        batch_size = num_images * params.size_units()
+        if batch_size > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Batch of {num_images} images at this size exceeds the limit of {MAX_BATCH_SIZE}",
+            )
+
+        output_format = negotiate_format(request.format, accept)
+        if request.stream:
+            if num_images != 1:
+                raise HTTPException(status_code=422, detail="Streaming supports a single image")
+            return self._stream(prompts[0], params, output_format, request)
+
+        # Share the forward pass with concurrent callers
+        try:
+            seeds = params.seeds(num_images)
+            images = await self.batcher.submit(
+                (prompts, request.num_images_per_prompt, params, seeds),
+                size=batch_size,
+                key=(request.num_images_per_prompt, params.batch_key()),
+            )
+            return encode_images(
+                images,
+                request.num_images_per_prompt,
+                output_format=output_format,
+                quality=request.quality,
+                lossless=request.lossless,
+                preview=request.preview,
+                headers={"X-Seeds": ",".join(map(str, seeds))},
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error in generation process: {str(e)}"
+            )
+
+    # ## Health and metadata
+    #
+    # A cheap GET route so the client can check liveness, warm state and expected latency
+    # without running a generation. Calling it on a scaled-down app starts a container,
+    # which also makes it the warm-up target.
+
+    @modal.web_endpoint(method="GET")
+    def health(self) -> dict:
+        cold_start = self.cold_start
+        self.cold_start = False
+        return {
+            "status": "ok",
+            "app": app.name,
+            "loaded": hasattr(self, "base") and hasattr(self, "refiner"),
+            "cold_start": cold_start,  # True if this request booted the container
+            "warm": self.requests_served > 0,  # first generation has run on this container
+            "import_seconds": round(IMPORT_SECONDS, 2),
+            "load_seconds": round(self.load_seconds, 2),  # GPU setup paid by every container
+            "load_phases": self.load_phases,
+            "weights_source": self.weights_source,
+            "uptime_seconds": round(time.time() - self.started_at, 2),
+            "requests_served": self.requests_served,
+            "last_inference_seconds": self.last_inference_seconds,
+            "batches_run": self.batcher.batches_run,
+            "average_batch_size": round(self.batcher.average_batch_size, 2),
+            "num_inference_steps": N_STEPS,
+            "gpu_type": BUNCHA_GPU_TYPE,
+            "compiled": COMPILE,
+        }
+
+
+# ## Speeding up SDXL with `torch.compile`
+#
+# The attention projections are always fused into one matrix multiplication and the UNets
+# use the channels-last memory layout. With `BUNCHA_COMPILE = "1"` both UNets are also
+# compiled. The warm-up generation in `enter` triggers the compilation, and the artifacts
+# are committed to the cache Volumes so later containers load them instead of recompiling.
+
+
+def optimize(base, refiner, compile=True):
+    # fuse QKV projections; the refiner shares the base VAE
+    base.fuse_qkv_projections()
+    refiner.fuse_qkv_projections(vae=False)
+
+    # switch memory layout to Torch's preferred, channels_last
+    base.unet.to(memory_format=torch.channels_last)
+    refiner.unet.to(memory_format=torch.channels_last)
+
+    if not compile:
+        return
+
+    config = torch._inductor.config
+    config.conv_1x1_as_mm = True  # treat 1x1 convolutions as matrix muls
+    config.coordinate_descent_tuning = True
+    config.epilogue_fusion = False  # do not fuse pointwise ops into matmuls
+    # leave room for one graph per batch size and resolution in use
+    torch._dynamo.config.cache_size_limit = 32
+
+    base.unet = torch.compile(base.unet, mode="max-autotune", fullgraph=True)
+    refiner.unet = torch.compile(refiner.unet, mode="max-autotune", fullgraph=True)
+
+    print("🔦 running torch compilation (may take up to 20 minutes)...")
+    compile_start = time.monotonic()
+    prompt = "dummy prompt to trigger torch compilation"
+    latents = base(
+        prompt=prompt, num_inference_steps=N_STEPS, denoising_end=HIGH_NOISE_FRAC, output_type="latent"
+    ).images
+    refiner(prompt=prompt, num_inference_steps=N_STEPS, denoising_start=HIGH_NOISE_FRAC, image=latents)
+    print(f"🔦 finished torch compilation in {time.monotonic() - compile_start:.1f}s")
+
+    # persist the artifacts so only the first container pays the compile cost
+    for volume in compile_cache_volumes.values():
+        volume.commit()
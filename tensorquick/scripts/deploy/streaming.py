@@ -0,0 +1,113 @@
+# Progressive previews shared by the deploy scripts.
+#
+# A streamed `web_inference` call answers with server-sent events instead of a
+# single image: a `progress` event after every denoising step, a low-resolution
+# `preview` every few steps, then one `result` (or `error`) event. The `result`
+# event carries the media type and byte `length` of the final image, and the raw
+# image bytes follow it as the rest of the body, so the full-size image is not
+# base64-encoded into an event and the client can stream it straight to disk
+# with byte-level progress. The diffusers step callback runs in the inference thread, so
+# events are handed to the event loop thread-safely. When the client goes away
+# the next step callback aborts the pipeline, which frees the GPU early.
+
+import asyncio
+import base64
+import json
+import threading
+from typing import Any, AsyncIterator, Callable, Optional, Tuple
+
+from encoding import OUTPUT_FORMATS, encode_image
+
+PREVIEW_EVERY = 5  # decode a preview every this many steps
+PREVIEW_FORMAT = "webp"
+PREVIEW_QUALITY = 60
+
+
+class GenerationCancelled(Exception):
+    """Raised from the step callback to abort a generation nobody is waiting for"""
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+class StepStreamer:
+    """Turns diffusers step callbacks into server-sent events"""
+
+    def __init__(
+        self,
+        total_steps: int,
+        decode_preview: Optional[Callable[[Any], Any]] = None,
+        preview_every: int = PREVIEW_EVERY,
+    ):
+        """
+        Args:
+            total_steps: Denoising steps of the whole generation, across every pipeline stage
+            decode_preview: Maps the callback's latents to a small PIL image; None disables previews
+            preview_every: Steps between two previews
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._total_steps = total_steps
+        self._decode_preview = decode_preview
+        self._preview_every = preview_every
+        self._steps_done = 0
+        self.cancelled = threading.Event()
+
+    def _emit(self, event: str, data: dict) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, sse_event(event, data))
+
+    def callback(self, pipe, step: int, timestep, callback_kwargs: dict) -> dict:
+        """`callback_on_step_end` hook; runs in the inference thread"""
+        if self.cancelled.is_set():
+            raise GenerationCancelled()
+
+        # Counted here rather than taken from `step` so base and refiner stages add up
+        self._steps_done += 1
+        done = min(self._steps_done, self._total_steps)
+        self._emit("progress", {"step": done, "total": self._total_steps})
+
+        if self._decode_preview and done % self._preview_every == 0 and done < self._total_steps:
+            image = self._decode_preview(callback_kwargs["latents"])
+            content = encode_image(image, PREVIEW_FORMAT, PREVIEW_QUALITY, preview=True)
+            self._emit("preview", {
+                "step": done,
+                "total": self._total_steps,
+                "media_type": OUTPUT_FORMATS[PREVIEW_FORMAT][1],
+                "image": base64.b64encode(content).decode("ascii"),
+            })
+        return callback_kwargs
+
+    async def stream(self, run: Callable[[], Tuple[bytes, str, dict]]) -> AsyncIterator[bytes]:
+        """
+        Run the generation in a worker thread and yield its events as they happen
+
+        Args:
+            run: Blocking function that generates and encodes the image, returning
+                (content, media_type, metadata); the metadata is added to the result event,
+                which is followed by the content itself
+        """
+        future = self._loop.run_in_executor(None, run)
+        try:
+            while True:
+                getter = asyncio.ensure_future(self._queue.get())
+                await asyncio.wait({getter, future}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                yield getter.result()
+
+            while not self._queue.empty():
+                yield self._queue.get_nowait()
+
+            content, media_type, metadata = await future
+            yield sse_event("result", {**metadata, "media_type": media_type, "length": len(content)})
+            # The final image follows as raw bytes, no more events after this
+            yield content
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error in generation process: {str(e)}"})
+        finally:
+            # Stops the pipeline at its next step if the client disconnected
+            self.cancelled.set()
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
@@ -0,0 +1,94 @@
+# Weight staging shared by the deploy scripts.
+#
+# `build()` converts the downloaded checkpoint once into a self-contained diffusers
+# directory of safetensors files in the serving dtype, baked into the image. `enter()`
+# then loads from that directory: no Hub round trips, no dtype conversion, and the
+# safetensors files are memory-mapped instead of being read and copied into RAM.
+# The phase timings are logged on every container start so cold starts with staged
+# and Hub weights can be compared.
+
+import json
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+MANIFEST = "staged.json"
+
+
+def is_staged(path) -> bool:
+    """Whether a complete staged copy exists at `path`"""
+    return (Path(path) / MANIFEST).exists()
+
+
+def stage_pipeline(pipe, path, source: str) -> None:
+    """
+    Save a loaded pipeline as safetensors under `path`
+
+    The copy is written next to `path` and renamed into place, so an interrupted
+    build never leaves a half-staged directory behind.
+
+    Args:
+        pipe: Diffusers pipeline already in the serving dtype
+        path: Destination directory
+        source: Hub repository the weights came from, recorded in the manifest
+    """
+    path = Path(path)
+    partial = path.with_name(f"{path.name}.partial")
+    shutil.rmtree(partial, ignore_errors=True)
+
+    start = time.monotonic()
+    pipe.save_pretrained(partial, safe_serialization=True)
+    files = {
+        str(file.relative_to(partial)): file.stat().st_size
+        for file in partial.rglob("*") if file.is_file()
+    }
+    (partial / MANIFEST).write_text(json.dumps({
+        "source": source,
+        "staged_at": time.time(),
+        "files": files,
+    }, indent=2))
+
+    shutil.rmtree(path, ignore_errors=True)
+    partial.rename(path)
+    print(f"📦 staged {source} to {path}: {sum(files.values()) / 1e9:.1f} GB in {time.monotonic() - start:.1f}s")
+
+
+def drop_hub_cache(repo_id: str) -> None:
+    """Delete the Hub download of `repo_id` once it is staged, so the image does not hold it twice"""
+    from huggingface_hub import scan_cache_dir
+
+    cache = scan_cache_dir()
+    revisions = [
+        revision.commit_hash
+        for repo in cache.repos if repo.repo_id == repo_id
+        for revision in repo.revisions
+    ]
+    if revisions:
+        strategy = cache.delete_revisions(*revisions)
+        print(f"🧹 freeing {strategy.expected_freed_size / 1e9:.1f} GB of Hub cache for {repo_id}")
+        strategy.execute()
+
+
+class LoadTimer:
+    """Records how long each phase of a container start takes"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = dict()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.monotonic() - start, 2)
+
+    @property
+    def total(self) -> float:
+        return round(sum(self.phases.values()), 2)
+
+    def report(self, label: str) -> None:
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        print(f"⏱️ {label}: {phases}, total {self.total:.2f}s")
@@ -113,6 +113,7 @@ ApplicationWindow {
 
         if (sessionSettings && sessionSettings.deployedModels && sessionSettings.deployedModels.length > 0) {
             modelBuilder.deployedModels = sessionSettings.deployedModels
+            modelBuilder.reconcileDeployments()
         }
 
         if (inferencePipeline && inferencePipeline.currentModel && inferencePipeline.currentModel.code_name) {
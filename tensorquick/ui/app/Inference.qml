@@ -17,6 +17,21 @@ Item {
     readonly property color placeholderColor: isDarkMode ? "#98989d" : "#86868b"
     readonly property color labelColor: isDarkMode ? "#98989d" : "#86868b"
     readonly property int cornerRadius: 6
+    property int generationProgress: 0
+
+    Connections {
+        target: inferencePipeline
+
+        function onLoadingChanged(loading) {
+            if (loading) {
+                generationProgress = 0
+            }
+        }
+
+        function onProgressChanged(progress) {
+            generationProgress = progress
+        }
+    }
 
     Column {
         anchors.fill: parent
@@ -52,6 +67,19 @@ Item {
             color: secondaryBackgroundColor
             radius: 8
 
+            // Intermediate preview streamed while the model is still denoising
+            Image {
+                id: previewImage
+                anchors.fill: parent
+                anchors.margins: 1
+                fillMode: Image.PreserveAspectFit
+                source: inferencePipeline.previewPath
+                visible: isLoading && source != ""
+                opacity: 0.6
+                cache: false
+                smooth: true
+            }
+
             // Loading Spinner
             Item {
                 id: spinner
@@ -96,12 +124,35 @@ Item {
                         topMargin: 16
                         horizontalCenter: parent.horizontalCenter
                     }
-                    text: "Generating image..."
+                    text: generationProgress > 0 ? "Generating image... " + generationProgress + "%" : "Generating image..."
                     color: secondaryTextColor
                     font.family: "Inter"
                     font.pixelSize: 13
                     font.weight: Font.Medium
                 }
+
+                Text {
+                    anchors {
+                        top: parent.bottom
+                        topMargin: 40
+                        horizontalCenter: parent.horizontalCenter
+                    }
+                    text: "Cancel"
+                    // Also before the first preview, so a cold start or a stalled request can be abandoned
+                    visible: isLoading
+                    color: cancelArea.containsMouse ? accentColor : secondaryTextColor
+                    font.family: "Inter"
+                    font.pixelSize: 12
+                    font.underline: cancelArea.containsMouse
+
+                    MouseArea {
+                        id: cancelArea
+                        anchors.fill: parent
+                        hoverEnabled: true
+                        cursorShape: Qt.PointingHandCursor
+                        onClicked: inferencePipeline.cancelGeneration()
+                    }
+                }
             }
 
             ImageDisplay {
@@ -19,7 +19,12 @@ Rectangle {
     property var deployedModelCodeNames: []
     property int selectedModelIndex: -1
     property var selectedModel: null
-    property int deployingModelIndex: -1
+    // code_name -> "queued" or "deploying", for every deployment in modelBuilder's queue
+    property var deploymentStates: ({})
+
+    function isDeploying(codeName) {
+        return deploymentStates[codeName] !== undefined
+    }
 
     readonly property var gpuOptions: ["H100", "A100-40GB", "A100-80GB", "A10G", "L4", "T4"]
 
@@ -69,10 +74,12 @@ Rectangle {
     Connections {
         target: modelBuilder
 
-        function onDeployedChanged(deployed) {
-            if (deployed) {
-                deployingModelIndex = -1
+        function onDeploymentQueueChanged(queue) {
+            var states = {}
+            for (const entry of queue) {
+                states[entry.code_name] = entry.state
             }
+            deploymentStates = states
         }
 
         function onDeployedModelsChanged(models) {
@@ -369,7 +376,7 @@ Rectangle {
                                     }
 
                                     // Disabled state during deploying
-                                    opacity: deployingModelIndex === index ? 0.8 : 1
+                                    opacity: isDeploying(modelData.code_name) ? 0.8 : 1
                                     Behavior on opacity {
                                         NumberAnimation {
                                             duration: 150
@@ -379,18 +386,18 @@ Rectangle {
 
                                     HoverHandler {
                                         id: redeployHover
-                                        enabled: deployingModelIndex !== index
+                                        enabled: !isDeploying(modelData.code_name)
                                     }
 
                                     MouseArea {
                                         anchors.fill: parent
                                         cursorShape: {
-                                            if (deployingModelIndex === index) {
+                                            if (isDeploying(modelData.code_name)) {
                                                 return Qt.ForbiddenCursor
                                             }
                                             return redeployHover.hovered ? Qt.PointingHandCursor : Qt.ArrowCursor
                                         }
-                                        enabled: deployingModelIndex !== index
+                                        enabled: !isDeploying(modelData.code_name)
 
                                         onClicked: {
                                             var dataDict = {
@@ -400,8 +407,8 @@ Rectangle {
                                                 "description": modelData.description,
                                                 "preview": modelData.preview
                                             }
-                                            modelBuilder.deploy(dataDict)
-                                            deployingModelIndex = index
+                                            // An explicit redeploy must not be skipped as unchanged
+                                            modelBuilder.deploy(dataDict, true)
                                         }
                                     }
 
@@ -414,14 +421,14 @@ Rectangle {
                                             width: 14
                                             height: 14
                                             source: "qrc:/resources/icons/refresh.svg"
-                                            visible: deployingModelIndex !== index
+                                            visible: !isDeploying(modelData.code_name)
                                         }
 
                                         Spinner {
                                             anchors.centerIn: parent
                                             width: 14
                                             height: 14
-                                            loading: deployingModelIndex === index
+                                            loading: isDeploying(modelData.code_name)
                                         }
                                     }
                                 }
@@ -464,7 +471,6 @@ Rectangle {
                                             "preview": modelData.preview
                                         }
                                         modelBuilder.deploy(dataDict)
-                                        deployingModelIndex = index
                                     }
                                 }
 
@@ -477,18 +483,18 @@ Rectangle {
                                         height: 16
                                         source: "qrc:/resources/icons/deploy.svg"
                                         anchors.verticalCenter: parent.verticalCenter
-                                        visible: deployingModelIndex !== index
+                                        visible: !isDeploying(modelData.code_name)
                                     }
 
                                     Spinner {
                                         width: 16
                                         height: 16
-                                        loading: deployingModelIndex === index
+                                        loading: isDeploying(modelData.code_name)
                                         anchors.verticalCenter: parent.verticalCenter
                                     }
 
                                     Text {
-                                        text: "Deploy"
+                                        text: deploymentStates[modelData.code_name] === "queued" ? "Queued" : "Deploy"
                                         font.pixelSize: 13
                                         font.weight: Font.Medium
                                         color: "#FFFFFF"
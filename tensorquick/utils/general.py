@@ -1,5 +1,6 @@
 from typing import Tuple
 from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
 
 def validate_image_path(image_path: str) -> Tuple[bool, str]:
     """
@@ -23,4 +24,26 @@ def find_index(a, element):
     try:
         return a.index(element)
     except ValueError:
-        return -1
\ No newline at end of file
+        return -1
+
+def derive_endpoint_url(deployed_url: str, endpoint: str) -> str:
+    """
+    Derives the URL of another web endpoint of the same Modal class
+
+    Modal names endpoint hosts `<workspace>--<app>-<class>-<method>.modal.run`,
+    so the `web_inference` URL only differs from its siblings in the host suffix.
+
+    Args:
+        deployed_url: URL of the `web_inference` endpoint
+        endpoint: Method name of the sibling endpoint, e.g. `health`
+
+    Returns:
+        The sibling URL, or an empty string if the URL does not follow the pattern
+    """
+    parts = urlsplit(deployed_url)
+    host, _, domain = parts.netloc.partition(".")
+    if not host.endswith("-web-inference"):
+        return ""
+
+    host = host[:-len("-web-inference")] + "-" + endpoint.replace("_", "-")
+    return urlunsplit(parts._replace(netloc=f"{host}.{domain}"))
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import sys
+import textwrap
+
+import pytest
+
+from tensorquick.backend.builder import ModelDeployWorker
+from tensorquick.backend.logpump import LogPump
+
+def spawn(code: str) -> asyncio.subprocess.Process:
+    return asyncio.create_subprocess_exec(
+        sys.executable, "-c", textwrap.dedent(code),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+def pump_output(code: str, timeout: float = 30, **kwargs):
+    """Run `code` in a child process under a LogPump; returns (exit code, pump, lines seen by on_line)"""
+    lines = []
+
+    async def main():
+        process = await spawn(code)
+        pump = LogPump(process, on_line=lambda stream, line: lines.append((stream, line)), **kwargs)
+        returncode = await asyncio.wait_for(pump.run(), timeout=timeout)
+        return returncode, pump
+
+    returncode, pump = asyncio.run(main())
+    return returncode, pump, lines
+
+def test_stderr_flood_does_not_stall():
+    # Far more than a pipe buffer holds, written before stdout is closed
+    returncode, pump, lines = pump_output("""
+        import sys
+        block = "building layer " + "x" * 100 + "\\n"
+        for i in range(80000):
+            sys.stderr.write(block)
+        print("App deployed")
+    """)
+
+    assert returncode == 0
+    assert pump.line_counts == {"stdout": 1, "stderr": 80000}
+    assert ("stdout", "App deployed") in lines
+
+def test_long_line_is_truncated():
+    returncode, pump, _ = pump_output("""
+        print("y" * 1_000_000)
+        print("after")
+    """, max_line_length=4096)
+
+    assert returncode == 0
+    long_line, after = pump.tail("stdout")
+    assert long_line == "y" * 4096 + "…"
+    assert after == "after"
+
+def test_carriage_returns_split_lines():
+    _, pump, lines = pump_output("""
+        import sys
+        sys.stdout.write("⠋ step 1\\r⠙ step 2\\r\\n⠹ step 3\\rdone")
+    """)
+
+    assert pump.tail("stdout") == ["⠋ step 1", "⠙ step 2", "⠹ step 3", "done"]
+    assert [line for _, line in lines] == pump.tail("stdout")
+
+def test_tails_keep_the_most_recent_lines():
+    _, pump, _ = pump_output("""
+        import sys
+        for i in range(1000):
+            print(f"out {i}")
+            sys.stderr.write(f"err {i}\\n")
+    """)
+
+    assert pump.line_counts == {"stdout": 1000, "stderr": 1000}
+    assert pump.tail("stdout") == [f"out {i}" for i in range(800, 1000)]
+    assert pump.tail("stderr", 3) == ["err 997", "err 998", "err 999"]
+
+def terminate(code: str, grace: float):
+    """Start `code`, wait for its first line, then terminate it; returns (killed, exit code)"""
+
+    async def main():
+        process = await spawn(code)
+        await process.stdout.readline()
+        killed = await asyncio.wait_for(LogPump.terminate(process, grace=grace), timeout=30)
+        return killed, process.returncode
+
+    return asyncio.run(main())
+
+def test_terminate_reaps_a_process_that_exits():
+    killed, returncode = terminate("""
+        import time
+        print("ready", flush=True)
+        time.sleep(60)
+    """, grace=5)
+
+    assert not killed
+    assert returncode == -15
+
+def test_terminate_kills_a_process_that_ignores_sigterm():
+    # Keeps both pipes full while it refuses to exit
+    killed, returncode = terminate("""
+        import signal, sys
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        print("ready", flush=True)
+        while True:
+            sys.stdout.write("x" * 1000 + "\\n")
+            sys.stderr.write("y" * 1000 + "\\n")
+    """, grace=0.5)
+
+    assert killed
+    assert returncode == -9
+
+@pytest.fixture
+def failing_modal(tmp_path, monkeypatch):
+    """A fake `modal` on PATH that floods stderr, then fails"""
+    script = tmp_path / "modal"
+    script.write_text(f"#!{sys.executable}\n" + textwrap.dedent("""
+        import sys
+        print("Building image im-1")
+        for i in range(5000):
+            sys.stderr.write(f"build log {i}\\n")
+        sys.stderr.write("Error: image build failed\\n")
+        sys.exit(3)
+    """))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return script
+
+def test_stderr_tail_becomes_the_error_message(failing_modal):
+    worker = ModelDeployWorker({"code_name": "flux-1-dev"})
+
+    with pytest.raises(RuntimeError) as error:
+        asyncio.run(asyncio.wait_for(worker._execute_deployment(dict(os.environ)), timeout=30))
+
+    message = str(error.value)
+    assert "exit code 3" in message
+    assert message.endswith("build log 4999\nError: image build failed")
+    # The last 50 stderr lines
+    assert "build log 4951" in message
+    assert "build log 4950" not in message
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import sys
+import textwrap
+import time
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+
+from tensorquick.backend.builder import ModelBuilder, ModelStopWorker
+from tensorquick.backend.manifest import DeployManifest
+from tensorquick.config import default_settings
+
+# Stands in for the `modal` CLI: app states live in a JSON file, `app stop` marks an app
+# stopped unless it is listed in FAKE_MODAL_FAIL_STOP, and `app list` fails when
+# FAKE_MODAL_FAIL_LIST is set.
+FAKE_MODAL = """
+    import fcntl, json, os, sys, time
+    state_path = os.environ["FAKE_MODAL_APPS"]
+    with open(state_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with open(state_path) as f:
+            apps = json.load(f)
+        with open(state_path + ".calls", "a") as f:
+            f.write(" ".join(sys.argv[1:]) + "\\n")
+
+        command = sys.argv[1:3]
+        if command == ["app", "stop"]:
+            name = sys.argv[3]
+            if name in os.environ.get("FAKE_MODAL_FAIL_STOP", "").split(","):
+                sys.stderr.write("Error: permission denied\\n")
+                sys.exit(1)
+            if name not in apps:
+                sys.stderr.write(f"Error: Could not find a deployed app named '{name}'\\n")
+                sys.exit(1)
+            apps[name] = "stopped"
+            with open(state_path, "w") as f:
+                json.dump(apps, f)
+        elif command == ["app", "list"]:
+            if os.environ.get("FAKE_MODAL_FAIL_LIST"):
+                sys.stderr.write("Error: not authenticated\\n")
+                sys.exit(1)
+            rows = [{"App ID": f"ap-{name}", "Description": name, "State": state} for name, state in apps.items()]
+            print(json.dumps(rows))
+"""
+
+class FakeModal:
+    def __init__(self, directory):
+        self.state_path = directory / "apps.json"
+
+    def set_apps(self, apps: dict) -> None:
+        self.state_path.write_text(json.dumps(apps))
+
+    @property
+    def apps(self) -> dict:
+        return json.loads(self.state_path.read_text())
+
+    @property
+    def calls(self) -> list:
+        calls_path = self.state_path.parent / "apps.json.calls"
+        return calls_path.read_text().splitlines() if calls_path.exists() else []
+
+@pytest.fixture
+def fake_modal(tmp_path, monkeypatch):
+    script = tmp_path / "modal"
+    script.write_text(f"#!{sys.executable}\n" + textwrap.dedent(FAKE_MODAL))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_MODAL_APPS", str(tmp_path / "apps.json"))
+    monkeypatch.setitem(default_settings["deploy"], "manifest_file", str(tmp_path / "manifest.json"))
+    return FakeModal(tmp_path)
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = DeployManifest(str(tmp_path / "manifest.json"))
+    for code_name in ("flux-1-dev", "flux-1-schnell", "mochi-1"):
+        manifest.record(code_name, "fingerprint", {"deployed_url": f"https://ws--{code_name}-model-web-inference.modal.run"})
+    return manifest
+
+def models(*code_names):
+    return [{"code_name": code_name} for code_name in code_names]
+
+def run_worker(worker: ModelStopWorker):
+    """Run the worker's coroutine directly; returns the code names it reported as gone and running, and the error"""
+    results = []
+    worker.finished.connect(lambda gone, running, error: results.append((gone, running, error)))
+    asyncio.run(worker.run())
+    gone, running, error = results[0]
+    return [m["code_name"] for m in gone], [m["code_name"] for m in running], error
+
+def test_batch_stop(fake_modal, manifest):
+    fake_modal.set_apps({"flux-1-dev": "deployed", "flux-1-schnell": "deployed", "mochi-1": "deployed"})
+
+    gone, running, error = run_worker(ModelStopWorker(models("flux-1-dev", "flux-1-schnell")))
+
+    assert (gone, running, error) == (["flux-1-dev", "flux-1-schnell"], [], "")
+    assert fake_modal.apps == {"flux-1-dev": "stopped", "flux-1-schnell": "stopped", "mochi-1": "deployed"}
+    assert sorted(fake_modal.calls) == ["app list --json", "app stop flux-1-dev", "app stop flux-1-schnell"]
+    # Their next deploy must not reuse the stopped URLs
+    assert manifest.get("flux-1-dev") is None and manifest.get("flux-1-schnell") is None
+    assert manifest.get("mochi-1") is not None
+
+def test_partial_failure_reports_apps_still_listed(fake_modal, manifest, monkeypatch):
+    fake_modal.set_apps({"flux-1-dev": "deployed", "mochi-1": "deployed"})
+    monkeypatch.setenv("FAKE_MODAL_FAIL_STOP", "mochi-1")
+
+    gone, running, error = run_worker(ModelStopWorker(models("flux-1-dev", "mochi-1")))
+
+    assert gone == ["flux-1-dev"]
+    assert running == ["mochi-1"]
+    assert "mochi-1" in error and "permission denied" in error
+    assert manifest.get("mochi-1") is not None
+
+def test_app_list_failure_after_stop_trusts_exit_codes(fake_modal, manifest, monkeypatch):
+    fake_modal.set_apps({"flux-1-dev": "deployed", "mochi-1": "deployed"})
+    monkeypatch.setenv("FAKE_MODAL_FAIL_STOP", "mochi-1")
+    monkeypatch.setenv("FAKE_MODAL_FAIL_LIST", "1")
+
+    gone, running, error = run_worker(ModelStopWorker(models("flux-1-dev", "mochi-1")))
+
+    assert gone == ["flux-1-dev"]
+    assert running == ["mochi-1"]
+    assert "permission denied" in error
+
+def test_app_list_failure_keeps_models_when_reconciling(fake_modal, manifest, monkeypatch):
+    fake_modal.set_apps({})
+    monkeypatch.setenv("FAKE_MODAL_FAIL_LIST", "1")
+
+    gone, running, error = run_worker(ModelStopWorker(models("flux-1-dev", "mochi-1"), stop=False))
+
+    assert gone == []
+    assert running == ["flux-1-dev", "mochi-1"]
+    assert "not authenticated" in error
+    assert manifest.get("flux-1-dev") is not None
+
+def test_reconcile_only_lists_apps(fake_modal, manifest):
+    fake_modal.set_apps({"flux-1-dev": "deployed", "flux-1-schnell": "stopped"})
+
+    gone, running, error = run_worker(ModelStopWorker(models("flux-1-dev", "flux-1-schnell", "mochi-1"), stop=False))
+
+    assert (gone, running, error) == (["flux-1-schnell", "mochi-1"], ["flux-1-dev"], "")
+    assert fake_modal.calls == ["app list --json"]
+    assert fake_modal.apps["flux-1-dev"] == "deployed"
+
+def test_builder_reconcile_drops_models_whose_app_is_gone(fake_modal, manifest):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    fake_modal.set_apps({"flux-1-dev": "deployed", "mochi-1": "stopped"})
+    builder = ModelBuilder()
+    builder.deployedModels = models("flux-1-dev", "flux-1-schnell", "mochi-1")
+    errors = []
+    builder.errorOccurred.connect(errors.append)
+
+    builder.reconcileDeployments()
+    deadline = time.monotonic() + 30
+    while builder._stop_workers and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+    assert [m["code_name"] for m in builder.deployedModels] == ["flux-1-dev"]
+    assert errors == []
+    assert manifest.get("flux-1-schnell") is None and manifest.get("mochi-1") is None